@@ -1,11 +1,20 @@
 import streamlit as st
-import hashlib
-from cryptography.fernet import Fernet
+import io
 import json
 import os
-from datetime import datetime, timedelta
+import re
+from datetime import datetime
+import threading
 import time
-import pandas as pd
+from vault.bulk import bulk_decrypt, bulk_encrypt, read_rows
+from vault.core import BUSY_MESSAGE, Vault
+from vault.kdf import KdfBusy
+from vault.metrics import METRICS, timed
+from vault.search import PAGE_SIZE
+from vault.stream import StreamError
+
+# Each interaction re-runs this script; the whole run is timed as the 'rerun' span.
+RERUN_STARTED = time.perf_counter()
 
 # --- Enhanced GUI Config ---
 st.set_page_config(
@@ -15,133 +24,171 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# --- Generate or Load Encryption Key ---
-def get_fernet_key():
-    if 'fernet_key' not in st.session_state:
-        if os.path.exists('fernet_key.key'):
-            with open('fernet_key.key', 'rb') as key_file:
-                st.session_state.fernet_key = key_file.read()
-        else:
-            st.session_state.fernet_key = Fernet.generate_key()
-            with open('fernet_key.key', 'wb') as key_file:
-                key_file.write(st.session_state.fernet_key)
-    return st.session_state.fernet_key
-
-cipher = Fernet(get_fernet_key())
+# --- Shared Vault ---
+# One Vault per server process, shared by every browser session. It owns the
+# encryption key, the storage backend and the KDF pool; this file is the UI.
+@st.cache_resource
+def get_vault():
+    return Vault('.')
 
-# --- File Paths ---
-USERS_FILE = 'users.json'
-DATA_FILE = 'encrypted_data.json'
+def get_kdf():
+    return get_vault().kdf
 
 # --- Initialize Data Storage ---
+@timed('init_data')
 def init_data():
-    if 'stored_data' not in st.session_state:
-        if os.path.exists(DATA_FILE):
-            with open(DATA_FILE, 'r') as f:
-                try:
-                    st.session_state.stored_data = json.load(f)
-                except json.JSONDecodeError:
-                    st.session_state.stored_data = {}
-        else:
-            st.session_state.stored_data = {}
-    
-    if 'users' not in st.session_state:
-        if os.path.exists(USERS_FILE):
-            with open(USERS_FILE, 'r') as f:
-                try:
-                    st.session_state.users = json.load(f)
-                except json.JSONDecodeError:
-                    st.session_state.users = {}
-        else:
-            st.session_state.users = {}
+    # Pick up writes made by other server processes since the last rerun.
+    get_vault().refresh()
 
 # --- Save Data to File ---
-def save_data():
-    with open(DATA_FILE, 'w') as f:
-        json.dump(st.session_state.stored_data, f)
-    with open(USERS_FILE, 'w') as f:
-        json.dump(st.session_state.users, f)
+@timed('save_data')
+def save_data(users=None, records=None):
+    # Only the given users/records are written, straight through to the store.
+    get_vault().commit(users=users, records=records)
 
 # --- Security Functions ---
 def hash_passkey(passkey, salt=None):
-    if salt is None:
-        salt = os.urandom(16).hex()
-    hashed = hashlib.pbkdf2_hmac('sha256', passkey.encode(), salt.encode(), 100000)
-    return f"{salt}${hashed.hex()}"
+    return get_vault().hash_passkey(passkey, salt)
 
 def verify_password(stored_password, provided_password):
-    if not stored_password or '$' not in stored_password:
-        return False
-    salt, hashed = stored_password.split('$')
-    new_hash = hash_passkey(provided_password, salt)
-    return new_hash == stored_password
+    return get_vault().verify_password(stored_password, provided_password)
 
 def encrypt_data(text):
-    return cipher.encrypt(text.encode()).decode()
+    return get_vault().encrypt_data(text)
 
 def decrypt_data(encrypted_text):
-    try:
-        return cipher.decrypt(encrypted_text.encode()).decode()
-    except:
+    return get_vault().decrypt_data(encrypted_text)
+
+def decrypt_record(record):
+    return get_vault().decrypt_record(record)
+
+def decrypt_file(record):
+    return get_vault().decrypt_file(record)
+
+def describe_storage(record):
+    # Stored token size against the original text, e.g. "1.2 KB → 640 B (0.53×, zlib)".
+    if 'plain_size' not in record:
         return None
+    ratio = record['stored_size'] / record['plain_size'] if record['plain_size'] else 0
+    return (f"{format_bytes(record['plain_size'])} → {format_bytes(record['stored_size'])} "
+            f"({ratio:.2f}×, {record.get('compression') or 'uncompressed'})")
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+# --- UX Delay ---
+# Spinners used to sleep a fixed second so feedback does not flash past.
+# VAULT_UX_DELAY scales every pause (0 turns them off), and the time spent is
+# its own span so it never hides inside a page's latency.
+UX_DELAY = float(os.environ.get('VAULT_UX_DELAY', '1'))
+
+def ux_delay(seconds=1.0):
+    if UX_DELAY > 0:
+        with METRICS.span('ux_delay'):
+            time.sleep(seconds * UX_DELAY)
 
 # --- Authentication Functions ---
 def register_user(username, password):
-    if username in st.session_state.users:
-        return False, "Username already exists"
-    if len(password) < 6:
-        return False, "Password must be at least 6 characters"
-    
-    st.session_state.users[username] = {
-        'password_hash': hash_passkey(password),
-        'registered_at': datetime.now().isoformat(),
-        'last_login': None,
-        'failed_attempts': 0,
-        'locked_until': None
-    }
-    save_data()
-    return True, "Registration successful"
+    return get_vault().register_user(username, password)
+
+def client_address():
+    # st.context.ip_address needs Streamlit 1.45+; older versions throttle per user only.
+    return getattr(getattr(st, 'context', None), 'ip_address', None)
 
 def login_user(username, password):
-    if username not in st.session_state.users:
-        return False, "Invalid username or password"
-    
-    user = st.session_state.users[username]
-    
-    if user.get('locked_until'):
-        if datetime.now() < datetime.fromisoformat(user['locked_until']):
-            remaining = (datetime.fromisoformat(user['locked_until']) - datetime.now()).seconds // 60
-            return False, f"Account locked. Try again in {remaining} minutes"
-        else:
-            user['locked_until'] = None
-    
-    if verify_password(user['password_hash'], password):
-        user['failed_attempts'] = 0
-        user['last_login'] = datetime.now().isoformat()
+    success, message = get_vault().login_user(username, password, client_address())
+    if success:
         st.session_state.current_user = username
         st.session_state.user_stats = {
             'encrypted_items': 0,
             'retrieved_items': 0,
             'last_activity': datetime.now().isoformat()
         }
-        save_data()
-        return True, "Login successful"
-    else:
-        user['failed_attempts'] += 1
-        if user['failed_attempts'] >= 3:
-            lock_time = datetime.now() + timedelta(minutes=5)
-            user['locked_until'] = lock_time.isoformat()
-            save_data()
-            return False, "Too many failed attempts. Account locked for 5 minutes."
-        save_data()
-        return False, f"Invalid username or password. {3 - user['failed_attempts']} attempts remaining"
+    return success, message
+
+# --- Pagination ---
+ACTIVITY_PAGE_SIZE = 10
+
+def paged_records(key, query='', page_size=PAGE_SIZE):
+    """Fetch the page stored under `key` in session state; returns (records, total, pages).
+
+    Only this page is copied out of the vault and sent to the browser, so a
+    rerun costs the same for ten records or ten thousand.
+    """
+    user = st.session_state.current_user
+    page = st.session_state.get(key, 1)
+    records, total = get_vault().search_records(user, query, page, page_size)
+    pages = max(1, -(-total // page_size))
+    if page > pages:
+        # The result set shrank (new search, fewer items); show its last page.
+        page = st.session_state[key] = pages
+        records, total = get_vault().search_records(user, query, page, page_size)
+    return records, total, pages
+
+def show_pager(key, total, pages, page_size=PAGE_SIZE):
+    if pages > 1:
+        st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key=key)
+    first = (st.session_state.get(key, 1) - 1) * page_size
+    st.caption(f"Showing {first + 1}–{min(first + page_size, total)} of {total}, newest first")
+
+# --- Dashboard Frame ---
+ACTIVITY_STYLE = {
+    'background-color': '#ffffff',
+    'border': '1px solid #e2e8f0',
+    'border-radius': '12px'
+}
+
+@st.cache_resource
+def activity_cache():
+    """Per-user dashboard columns shared by every session."""
+    return {'lock': threading.Lock(), 'users': {}}
+
+def activity_entry(username):
+    """Return the user's activity columns, keyed on Vault.records_version.
+
+    An unchanged vault costs one lookup; new records are appended and
+    formatted once each, and only edits or deletions rebuild the columns.
+    """
+    vault = get_vault()
+    cache = activity_cache()
+    with cache['lock']:
+        version = vault.records_version(username)
+        entry = cache['users'].get(username)
+        if entry is not None and entry['version'] == version:
+            return entry
+        added = vault.records_since(username, entry['version']) if entry is not None else None
+        if added is None:
+            entry = {'ids': [], 'names': [], 'created': []}
+            added = vault.user_records(username)
+        for data_id, record in added.items():
+            entry['ids'].append(data_id)
+            entry['names'].append(record['data_name'])
+            entry['created'].append(datetime.fromisoformat(record['created_at']).strftime('%Y-%m-%d %H:%M'))
+        # Styled pages are cached per version, so a rerun restyles nothing.
+        entry = cache['users'][username] = dict(entry, version=version, pages={})
+        return entry
+
+def activity_page(entry, page, page_size):
+    styled = entry['pages'].get(page)
+    if styled is None:
+        end = max(len(entry['ids']) - (page - 1) * page_size, 0)
+        start = max(end - page_size, 0)
+        import pandas as pd  # only the dashboard needs it; keep it out of cold start
+        df = pd.DataFrame({'data_name': entry['names'][start:end][::-1],
+                           'created_at': entry['created'][start:end][::-1]},
+                          index=entry['ids'][start:end][::-1])
+        styled = entry['pages'][page] = df.style.set_properties(**ACTIVITY_STYLE)
+    return styled
 
 # --- Initialize App ---
 init_data()
 
 # --- Modern Glass UI CSS ---
-st.markdown("""
-<style>
+APP_CSS = """
     :root {
         --primary: #6366f1;
         --primary-dark: #4f46e5;
@@ -353,8 +400,109 @@ st.markdown("""
     ::-webkit-scrollbar-thumb:hover {
         background: rgba(99, 102, 241, 0.7);
     }
-</style>
-""", unsafe_allow_html=True)
+"""
+
+# --- Card Templates ---
+METRIC_CARD = """
+<div class="glass-card">
+    <div class="metric-icon">{icon}</div>
+    <div class="metric-title">{title}</div>
+    <div class="metric-value"{value_style}>{value}</div>
+    <div style="font-size: 0.9rem; color: #64748b;">{caption}</div>
+</div>
+"""
+
+EMPTY_VAULT_CARD = """
+<div class="glass-card">
+    <div style="text-align: center; padding: 2rem;">
+        <img src="https://cdn-icons-png.flaticon.com/512/4076/4076478.png" width="140" style="opacity: 0.7; margin-bottom: 1rem;">
+        <h3 style="color: #4b5563; margin-bottom: 0.5rem;">No encrypted data yet</h3>
+        <p style="color: #64748b;">Get started by encrypting your first piece of data</p>
+        <button onclick="window.location.href='#encrypt-data'" style="
+            background: linear-gradient(to right, var(--primary), var(--primary-dark));
+            color: white;
+            border: none;
+            padding: 0.75rem 1.5rem;
+            border-radius: 12px;
+            font-weight: 600;
+            margin-top: 1rem;
+            cursor: pointer;
+            transition: all 0.3s ease;
+        ">Encrypt First Data</button>
+    </div>
+</div>
+"""
+
+ACCOUNT_INFO_CARD = """
+<div class="glass-card">
+    <h3 style="color: #334155; margin-top: 0;">Account Information</h3>
+    <div style="margin-bottom: 1.5rem;">
+        <div style="font-size: 0.9rem; color: #64748b;">Username</div>
+        <div style="font-size: 1.2rem; font-weight: 500; color: #1e293b;">{username}</div>
+    </div>
+    <div style="margin-bottom: 1.5rem;">
+        <div style="font-size: 0.9rem; color: #64748b;">Registered</div>
+        <div style="font-size: 1.2rem; font-weight: 500; color: #1e293b;">{registered}</div>
+    </div>
+    <div>
+        <div style="font-size: 0.9rem; color: #64748b;">Last Login</div>
+        <div style="font-size: 1.2rem; font-weight: 500; color: #1e293b;">{last_login}</div>
+    </div>
+</div>
+"""
+
+SECURITY_STATUS_CARD = """
+<div class="glass-card">
+    <h3 style="color: #334155; margin-top: 0;">Security Status</h3>
+    <div style="display: flex; align-items: center; gap: 15px; margin-bottom: 1.5rem;">
+        <span style="font-size: 2rem; background: linear-gradient(to right, var(--primary), var(--primary-dark)); -webkit-background-clip: text; -webkit-text-fill-color: transparent;">🔒</span>
+        <div>
+            <div style="font-size: 0.9rem; color: #64748b;">Encryption</div>
+            <div style="font-size: 1.2rem; font-weight: 500; color: #1e293b;">AES-256 (Military Grade)</div>
+        </div>
+    </div>
+    <div style="display: flex; align-items: center; gap: 15px; margin-bottom: 1.5rem;">
+        <span style="font-size: 2rem; background: linear-gradient(to right, var(--primary), var(--primary-dark)); -webkit-background-clip: text; -webkit-text-fill-color: transparent;">🛡️</span>
+        <div>
+            <div style="font-size: 0.9rem; color: #64748b;">Password Hashing</div>
+            <div style="font-size: 1.2rem; font-weight: 500; color: #1e293b;">PBKDF2 with SHA-256</div>
+        </div>
+    </div>
+    <div style="display: flex; align-items: center; gap: 15px;">
+        <span style="font-size: 2rem; background: linear-gradient(to right, var(--primary), var(--primary-dark)); -webkit-background-clip: text; -webkit-text-fill-color: transparent;">🔐</span>
+        <div>
+            <div style="font-size: 0.9rem; color: #64748b;">Data Protection</div>
+            <div style="font-size: 1.2rem; font-weight: 500; color: #1e293b;">End-to-End Encryption</div>
+        </div>
+    </div>
+</div>
+"""
+
+# --- Static Assets ---
+# app.py re-runs top to bottom on every interaction, but cache_resource
+# outlives reruns: the stylesheet and card templates are compacted once per
+# server process and every rerun sends the prebuilt, smaller fragments.
+def compact_html(html):
+    """Join lines and drop whitespace between tags."""
+    return re.sub(r'>\s+<', '><', re.sub(r'\s*\n\s*', ' ', html)).strip()
+
+def compact_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,])\s*', r'\1', css)
+    return re.sub(r':\s+', ':', css).strip()
+
+@st.cache_resource
+def page_assets():
+    return {
+        'style': f"<style>{compact_css(APP_CSS)}</style>",
+        'metric_card': compact_html(METRIC_CARD),
+        'empty_vault': compact_html(EMPTY_VAULT_CARD),
+        'account_info': compact_html(ACCOUNT_INFO_CARD),
+        'security_status': compact_html(SECURITY_STATUS_CARD),
+    }
+
+st.markdown(page_assets()['style'], unsafe_allow_html=True)
 
 # --- App State Management ---
 if 'current_user' not in st.session_state:
@@ -371,6 +519,7 @@ def main():
     else:
         show_dashboard()
 
+@timed('show_auth_pages')
 def show_auth_pages():
     st.sidebar.markdown('<div class="logo">SecureVault Pro</div>', unsafe_allow_html=True)
     auth_choice = st.sidebar.radio("Menu", ["Login", "Register"], label_visibility="collapsed")
@@ -391,11 +540,11 @@ def show_auth_pages():
             
             if submit:
                 with st.spinner("Authenticating..."):
-                    time.sleep(1)
+                    ux_delay()
                     success, message = login_user(username, password)
                     if success:
                         st.markdown(f'<div class="success-message">✅ {message}</div>', unsafe_allow_html=True)
-                        time.sleep(1)
+                        ux_delay()
                         st.rerun()
                     else:
                         st.markdown(f'<div class="error-message">❌ {message}</div>', unsafe_allow_html=True)
@@ -420,11 +569,11 @@ def show_auth_pages():
                     st.markdown('<div class="error-message">❌ Passwords do not match!</div>', unsafe_allow_html=True)
                 else:
                     with st.spinner("Creating your account..."):
-                        time.sleep(1)
+                        ux_delay()
                         success, message = register_user(username, password)
                         if success:
                             st.markdown(f'<div class="success-message">✨ {message}</div>', unsafe_allow_html=True)
-                            time.sleep(1)
+                            ux_delay()
                             st.session_state.current_user = username
                             st.session_state.user_stats = {
                                 'encrypted_items': 0,
@@ -446,6 +595,8 @@ def show_dashboard():
     """, unsafe_allow_html=True)
     
     menu = ["Dashboard", "🔐 Encrypt Data", "🔍 Retrieve Data", "⚙️ Account", "🚪 Logout"]
+    if st.session_state.current_user in ADMINS:
+        menu.insert(-1, "📈 Performance")
     choice = st.sidebar.selectbox("Navigation", menu, label_visibility="collapsed")
     
     if choice == "Dashboard":
@@ -456,96 +607,68 @@ def show_dashboard():
         show_retrieve_page()
     elif choice == "⚙️ Account":
         show_account_page()
+    elif choice == "📈 Performance":
+        show_performance_page()
     elif choice == "🚪 Logout":
         st.session_state.current_user = None
         st.session_state.user_stats = None
         st.rerun()
 
+@timed('show_home_page')
 def show_home_page():
     st.title(f"📊 Dashboard")
     st.markdown(f'<div class="user-greeting">Welcome back, {st.session_state.current_user}!</div>', unsafe_allow_html=True)
     
     # Metrics
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.markdown(f"""
-        <div class="glass-card">
-            <div class="metric-icon">🔐</div>
-            <div class="metric-title">Encrypted Items</div>
-            <div class="metric-value">{st.session_state.user_stats['encrypted_items']}</div>
-            <div style="font-size: 0.9rem; color: #64748b;">Total secured data</div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown(f"""
-        <div class="glass-card">
-            <div class="metric-icon">🔍</div>
-            <div class="metric-title">Retrieved Items</div>
-            <div class="metric-value">{st.session_state.user_stats['retrieved_items']}</div>
-            <div style="font-size: 0.9rem; color: #64748b;">Total access events</div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        last_active = datetime.fromisoformat(st.session_state.user_stats['last_activity']).strftime('%b %d, %H:%M')
-        st.markdown(f"""
-        <div class="glass-card">
-            <div class="metric-icon">⏱️</div>
-            <div class="metric-title">Last Active</div>
-            <div class="metric-value" style="font-size: 2rem;">{last_active}</div>
-            <div style="font-size: 0.9rem; color: #64748b;">Your recent activity</div>
-        </div>
-        """, unsafe_allow_html=True)
+    assets = page_assets()
+    stats = st.session_state.user_stats
+    last_active = datetime.fromisoformat(stats['last_activity']).strftime('%b %d, %H:%M')
+    cards = [("🔐", "Encrypted Items", stats['encrypted_items'], "", "Total secured data"),
+             ("🔍", "Retrieved Items", stats['retrieved_items'], "", "Total access events"),
+             ("⏱️", "Last Active", last_active, ' style="font-size: 2rem;"', "Your recent activity")]
+    for col, (icon, title, value, value_style, caption) in zip(st.columns(3), cards):
+        col.markdown(assets['metric_card'].format(icon=icon, title=title, value=value,
+                                                  value_style=value_style, caption=caption),
+                     unsafe_allow_html=True)
     
     # Recent Activity
     st.subheader("📈 Recent Activity")
-    user_data = {k: v for k, v in st.session_state.stored_data.items() 
-                if 'username' in v and v['username'] == st.session_state.current_user}
-    
-    if user_data:
-        df = pd.DataFrame.from_dict(user_data, orient='index')
-        df = df[['data_name', 'created_at']]
-        df['created_at'] = pd.to_datetime(df['created_at']).dt.strftime('%Y-%m-%d %H:%M')
+    activity = activity_entry(st.session_state.current_user)
+    total = len(activity['ids'])
+    
+    if total:
+        pages = max(1, -(-total // ACTIVITY_PAGE_SIZE))
+        if st.session_state.get('activity_page', 1) > pages:
+            st.session_state.activity_page = pages
+        styled = activity_page(activity, st.session_state.get('activity_page', 1), ACTIVITY_PAGE_SIZE)
         st.dataframe(
-            df.style.set_properties(**{
-                'background-color': '#ffffff',
-                'border': '1px solid #e2e8f0',
-                'border-radius': '12px'
-            }),
+            styled,
             use_container_width=True,
-            height=min(len(df) * 35 + 35, 400)
+            height=min(len(styled.data) * 35 + 35, 400)
         )
+        show_pager('activity_page', total, pages, ACTIVITY_PAGE_SIZE)
     else:
-        st.markdown("""
-        <div class="glass-card">
-            <div style="text-align: center; padding: 2rem;">
-                <img src="https://cdn-icons-png.flaticon.com/512/4076/4076478.png" width="140" style="opacity: 0.7; margin-bottom: 1rem;">
-                <h3 style="color: #4b5563; margin-bottom: 0.5rem;">No encrypted data yet</h3>
-                <p style="color: #64748b;">Get started by encrypting your first piece of data</p>
-                <button onclick="window.location.href='#encrypt-data'" style="
-                    background: linear-gradient(to right, var(--primary), var(--primary-dark));
-                    color: white;
-                    border: none;
-                    padding: 0.75rem 1.5rem;
-                    border-radius: 12px;
-                    font-weight: 600;
-                    margin-top: 1rem;
-                    cursor: pointer;
-                    transition: all 0.3s ease;
-                ">Encrypt First Data</button>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(page_assets()['empty_vault'], unsafe_allow_html=True)
 
+@timed('show_encrypt_page')
 def show_encrypt_page():
     st.title("🔐 Encrypt New Data")
     st.markdown("Protect your sensitive information with military-grade encryption.")
     
+    source = st.radio("What do you want to encrypt?", ["📝 Text", "📁 File", "📦 Bulk Import"], horizontal=True)
+    if source == "📦 Bulk Import":
+        show_bulk_import()
+        return
+    
     with st.form("encrypt_form", clear_on_submit=True):
         st.markdown("### 📝 Data Details")
         data_name = st.text_input("Data Name", placeholder="What's this data about?")
-        secret_data = st.text_area("Data to Encrypt", height=200, placeholder="Enter your sensitive data here...")
+        if source == "📁 File":
+            uploaded_file = st.file_uploader("File to Encrypt")
+            secret_data = None
+        else:
+            uploaded_file = None
+            secret_data = st.text_area("Data to Encrypt", height=200, placeholder="Enter your sensitive data here...")
         
         st.markdown("### 🔑 Security Settings")
         passkey = st.text_input("Encryption Passkey", type="password", placeholder="Create a strong passkey")
@@ -553,31 +676,28 @@ def show_encrypt_page():
         submit = st.form_submit_button("🔒 Encrypt & Store →", type="primary")
         
         if submit:
-            if not all([data_name, secret_data, passkey]):
+            if not all([data_name, secret_data or uploaded_file, passkey]):
                 st.markdown('<div class="error-message">⚠️ All fields are required!</div>', unsafe_allow_html=True)
             else:
                 with st.spinner("Encrypting your data securely..."):
-                    time.sleep(1)
-                    # Generate unique ID for this data
-                    data_id = f"{st.session_state.current_user}_{data_name}_{datetime.now().timestamp()}"
-                    
-                    # Encrypt the data
-                    encrypted_data = encrypt_data(secret_data)
-                    hashed_passkey = hash_passkey(passkey)
+                    ux_delay()
+                    try:
+                        data_id, record = get_vault().add_record(
+                            st.session_state.current_user, data_name, passkey,
+                            secret=secret_data, file=uploaded_file,
+                            file_name=uploaded_file.name if uploaded_file is not None else None)
+                    except KdfBusy:
+                        st.markdown(f'<div class="error-message">⏳ {BUSY_MESSAGE}</div>', unsafe_allow_html=True)
+                        return
                     
-                    # Store the data
-                    st.session_state.stored_data[data_id] = {
-                        'username': st.session_state.current_user,
-                        'data_name': data_name,
-                        'encrypted_text': encrypted_data,
-                        'passkey_hash': hashed_passkey,
-                        'created_at': datetime.now().isoformat()
-                    }
+                    if record.get('kind') == 'file':
+                        encrypted_data = f"{record['blob']} ({record['size']:,} bytes, chunked AES-GCM)"
+                    else:
+                        encrypted_data = record['encrypted_text']
                     
                     # Update stats
                     st.session_state.user_stats['encrypted_items'] += 1
                     st.session_state.user_stats['last_activity'] = datetime.now().isoformat()
-                    save_data()
                     
                     st.markdown("""
                     <div class="success-message">
@@ -593,6 +713,8 @@ def show_encrypt_page():
                     
                     st.markdown("### Your Encrypted Data")
                     st.code(encrypted_data, language="text")
+                    if describe_storage(record):
+                        st.caption(f"Stored size: {describe_storage(record)}")
                     
                     st.markdown("""
                     <div class="warning-message">
@@ -606,15 +728,68 @@ def show_encrypt_page():
                     </div>
                     """, unsafe_allow_html=True)
 
+@timed('show_bulk_import')
+def show_bulk_import():
+    with st.form("bulk_import_form", clear_on_submit=True):
+        st.markdown("### 📦 Import Many Secrets")
+        st.markdown("Upload a CSV or JSONL file with `data_name`, `secret` and `passkey` for each row.")
+        upload = st.file_uploader("Secrets File", type=["csv", "jsonl"])
+        submit = st.form_submit_button("🔒 Encrypt & Store All →", type="primary")
+        
+        if submit:
+            if upload is None:
+                st.markdown('<div class="error-message">⚠️ Please choose a file to import!</div>', unsafe_allow_html=True)
+                return
+            with st.spinner("Encrypting your data securely..."):
+                try:
+                    records, report = bulk_encrypt(read_rows(upload, upload.name), get_vault(),
+                                                   st.session_state.current_user)
+                except (ValueError, KeyError) as e:
+                    st.markdown(f'<div class="error-message">❌ Invalid file: {e}</div>', unsafe_allow_html=True)
+                    return
+                # One store transaction for the whole batch.
+                save_data(records=records)
+                st.session_state.user_stats['encrypted_items'] += len(records)
+                st.session_state.user_stats['last_activity'] = datetime.now().isoformat()
+            st.markdown(f'<div class="success-message">✅ Imported {report["records"]} items in {report["seconds"]:.2f}s ({report["records_per_sec"]:.1f} records/sec)</div>', unsafe_allow_html=True)
+
+@timed('show_bulk_export')
+def show_bulk_export():
+    with st.expander("📦 Bulk Export"):
+        st.markdown("Upload a CSV or JSONL file of `data_name` and `passkey`, or enter one passkey for every item.")
+        with st.form("bulk_export_form"):
+            upload = st.file_uploader("Passkeys File", type=["csv", "jsonl"])
+            passkey = st.text_input("Shared Passkey", type="password")
+            submit = st.form_submit_button("🔓 Decrypt All →")
+        
+        if submit and (upload is not None or passkey):
+            if upload is not None:
+                try:
+                    passkeys = {row['data_name']: row['passkey'] for row in read_rows(upload, upload.name)}
+                except (ValueError, KeyError, TypeError) as e:
+                    # TypeError: a JSONL line that is not an object.
+                    st.markdown(f'<div class="error-message">❌ Invalid file: {e}</div>', unsafe_allow_html=True)
+                    return
+            else:
+                passkeys = passkey
+            with st.spinner("Decrypting your data securely..."):
+                user_items = get_vault().user_records(st.session_state.current_user)
+                rows, report = bulk_decrypt(user_items, passkeys, get_vault())
+            st.session_state.user_stats['retrieved_items'] += len(rows)
+            st.session_state.user_stats['last_activity'] = datetime.now().isoformat()
+            st.markdown(f'<div class="success-message">✅ Decrypted {report["records"]} items in {report["seconds"]:.2f}s ({report["records_per_sec"]:.1f} records/sec); {report["skipped"]} skipped</div>', unsafe_allow_html=True)
+            st.download_button("⬇️ Download JSONL", data=''.join(json.dumps(row) + '\n' for row in rows),
+                               file_name="vault_export.jsonl")
+
+@timed('show_retrieve_page')
 def show_retrieve_page():
     st.title("🔍 Retrieve Encrypted Data")
     st.markdown("Access your protected information using your passkey.")
     
-    # Show user's encrypted items
-    user_items = {k: v for k, v in st.session_state.stored_data.items() 
-                 if 'username' in v and v['username'] == st.session_state.current_user}
+    # Show user's encrypted items, one page at a time
+    _, item_count = get_vault().search_records(st.session_state.current_user, page_size=0)
     
-    if not user_items:
+    if not item_count:
         st.markdown("""
         <div class="glass-card">
             <div style="text-align: center; padding: 2rem;">
@@ -637,17 +812,29 @@ def show_retrieve_page():
         """, unsafe_allow_html=True)
         return
     
+    show_bulk_export()
+    
+    query = st.text_input("🔎 Search by name", placeholder="Type part of a name")
+    user_items, total, pages = paged_records('retrieve_page', query.strip())
+    if not user_items:
+        st.info(f"No items match “{query}”")
+        return
+    
     selected_item = st.selectbox("Select data to retrieve", 
                                 options=list(user_items.keys()),
                                 format_func=lambda x: user_items[x]['data_name'])
+    show_pager('retrieve_page', total, pages)
     
     if selected_item:
         item = user_items[selected_item]
+        download_ready = False
         
         with st.form("retrieve_form"):
             st.markdown("### 🔎 Selected Data")
             st.markdown(f"**Name:** {item['data_name']}")
             st.markdown(f"**Encrypted on:** {datetime.fromisoformat(item['created_at']).strftime('%B %d, %Y at %H:%M')}")
+            if describe_storage(item):
+                st.markdown(f"**Stored size:** {describe_storage(item)}")
             
             st.markdown("### 🔑 Enter Passkey")
             passkey = st.text_input("Decryption Passkey", type="password", placeholder="Enter the passkey used for encryption")
@@ -655,14 +842,25 @@ def show_retrieve_page():
             submit = st.form_submit_button("🔓 Decrypt Data →", type="primary")
             
             if submit:
-                if verify_password(item['passkey_hash'], passkey):
+                try:
+                    valid = verify_password(item['passkey_hash'], passkey)
+                except KdfBusy:
+                    st.markdown(f'<div class="error-message">⏳ {BUSY_MESSAGE}</div>', unsafe_allow_html=True)
+                    return
+                
+                if valid and item.get('kind') == 'file':
+                    # The download button cannot live inside a form; it is
+                    # rendered below once the passkey has been accepted.
+                    download_ready = True
+                    st.session_state.user_stats['retrieved_items'] += 1
+                    st.session_state.user_stats['last_activity'] = datetime.now().isoformat()
+                elif valid:
                     with st.spinner("Decrypting your data securely..."):
-                        time.sleep(1)
-                        decrypted_data = decrypt_data(item['encrypted_text'])
+                        ux_delay()
+                        decrypted_data = decrypt_record(item)
                         if decrypted_data:
                             st.session_state.user_stats['retrieved_items'] += 1
                             st.session_state.user_stats['last_activity'] = datetime.now().isoformat()
-                            save_data()
                             
                             st.markdown("""
                             <div class="success-message">
@@ -708,70 +906,99 @@ def show_retrieve_page():
                             </div>
                         </div>
                         """, unsafe_allow_html=True)
-                        time.sleep(2)
+                        ux_delay(2)
                         st.session_state.current_user = None
                         st.session_state.user_stats = None
                         st.session_state.failed_attempts = 0
                         st.rerun()
+        
+        if download_ready:
+            # Built in memory: st.download_button takes bytes or BytesIO, and
+            # the plaintext must not land unencrypted in a temp file on disk.
+            plain_file = io.BytesIO()
+            try:
+                for chunk in decrypt_file(item):
+                    plain_file.write(chunk)
+            except (OSError, StreamError):
+                st.markdown('<div class="error-message">❌ Decryption failed! Please try again.</div>', unsafe_allow_html=True)
+                return
+            st.markdown(f'<div class="success-message">✅ {item["file_name"]} decrypted ({item["size"]:,} bytes)</div>', unsafe_allow_html=True)
+            st.download_button("⬇️ Download Decrypted File", data=plain_file.getvalue(),
+                               file_name=item['file_name'], type="primary")
 
+@timed('show_account_page')
 def show_account_page():
     st.title("⚙️ Account Settings")
     st.markdown("Manage your SecureVault Pro account and security settings.")
     
-    user = st.session_state.users[st.session_state.current_user]
+    user = get_vault().get_user(st.session_state.current_user)
     
     col1, col2 = st.columns(2)
     
+    assets = page_assets()
     with col1:
-        st.markdown("""
-        <div class="glass-card">
-            <h3 style="color: #334155; margin-top: 0;">Account Information</h3>
-            <div style="margin-bottom: 1.5rem;">
-                <div style="font-size: 0.9rem; color: #64748b;">Username</div>
-                <div style="font-size: 1.2rem; font-weight: 500; color: #1e293b;">{}</div>
-            </div>
-            <div style="margin-bottom: 1.5rem;">
-                <div style="font-size: 0.9rem; color: #64748b;">Registered</div>
-                <div style="font-size: 1.2rem; font-weight: 500; color: #1e293b;">{}</div>
-            </div>
-            <div>
-                <div style="font-size: 0.9rem; color: #64748b;">Last Login</div>
-                <div style="font-size: 1.2rem; font-weight: 500; color: #1e293b;">{}</div>
-            </div>
-        </div>
-        """.format(
-            st.session_state.current_user,
-            datetime.fromisoformat(user['registered_at']).strftime('%B %d, %Y'),
-            datetime.fromisoformat(user['last_login']).strftime('%B %d, %Y at %H:%M') if user['last_login'] else "Never"
+        st.markdown(assets['account_info'].format(
+            username=st.session_state.current_user,
+            registered=datetime.fromisoformat(user['registered_at']).strftime('%B %d, %Y'),
+            last_login=datetime.fromisoformat(user['last_login']).strftime('%B %d, %Y at %H:%M') if user['last_login'] else "Never"
         ), unsafe_allow_html=True)
     
     with col2:
-        st.markdown("""
-        <div class="glass-card">
-            <h3 style="color: #334155; margin-top: 0;">Security Status</h3>
-            <div style="display: flex; align-items: center; gap: 15px; margin-bottom: 1.5rem;">
-                <span style="font-size: 2rem; background: linear-gradient(to right, var(--primary), var(--primary-dark)); -webkit-background-clip: text; -webkit-text-fill-color: transparent;">🔒</span>
-                <div>
-                    <div style="font-size: 0.9rem; color: #64748b;">Encryption</div>
-                    <div style="font-size: 1.2rem; font-weight: 500; color: #1e293b;">AES-256 (Military Grade)</div>
-                </div>
-            </div>
-            <div style="display: flex; align-items: center; gap: 15px; margin-bottom: 1.5rem;">
-                <span style="font-size: 2rem; background: linear-gradient(to right, var(--primary), var(--primary-dark)); -webkit-background-clip: text; -webkit-text-fill-color: transparent;">🛡️</span>
-                <div>
-                    <div style="font-size: 0.9rem; color: #64748b;">Password Hashing</div>
-                    <div style="font-size: 1.2rem; font-weight: 500; color: #1e293b;">PBKDF2 with SHA-256</div>
-                </div>
-            </div>
-            <div style="display: flex; align-items: center; gap: 15px;">
-                <span style="font-size: 2rem; background: linear-gradient(to right, var(--primary), var(--primary-dark)); -webkit-background-clip: text; -webkit-text-fill-color: transparent;">🔐</span>
-                <div>
-                    <div style="font-size: 0.9rem; color: #64748b;">Data Protection</div>
-                    <div style="font-size: 1.2rem; font-weight: 500; color: #1e293b;">End-to-End Encryption</div>
-                </div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(assets['security_status'], unsafe_allow_html=True)
+
+    kdf_stats = get_kdf().stats()
+    with st.expander("🧮 Password Hashing Load"):
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Queue Depth", f"{kdf_stats['queue_depth']}/{kdf_stats['capacity']}")
+        col2.metric("p50 Latency", f"{kdf_stats['p50_ms']:.0f} ms")
+        col3.metric("p99 Latency", f"{kdf_stats['p99_ms']:.0f} ms")
+        st.caption(f"{kdf_stats['workers']} workers · {kdf_stats['completed']} completed · {kdf_stats['rejected']} rejected")
+
+# --- Performance Panel ---
+# Usernames allowed to see the panel, comma separated.
+ADMINS = {name.strip() for name in os.environ.get('VAULT_ADMINS', '').split(',') if name.strip()}
+
+@timed('show_performance_page')
+def show_performance_page():
+    if st.session_state.current_user not in ADMINS:
+        return
+    st.title("📈 Performance")
+    st.markdown("Timings for this server process since it started (or since the last reset).")
+
+    counters = METRICS.counters()
+    if counters:
+        cols = st.columns(min(len(counters), 5))
+        for i, (name, value) in enumerate(counters.items()):
+            cols[i % len(cols)].metric(name.replace('_', ' ').title(), f"{value:,}")
+
+    spans = METRICS.spans()
+    if spans:
+        st.markdown("### Spans")
+        import pandas as pd
+        df = pd.DataFrame.from_dict(spans, orient='index')
+        st.dataframe(df.style.format({col: '{:.1f}' for col in df.columns if col.endswith('_ms')}),
+                     use_container_width=True)
+    else:
+        st.info("No timings recorded yet.")
+
+    gauges = get_vault().gauges()
+    if gauges:
+        st.markdown("### Load")
+        cols = st.columns(min(len(gauges), 5))
+        for i, (name, value) in enumerate(gauges.items()):
+            cols[i % len(cols)].metric(name.replace('_', ' ').title(), f"{value:,}")
+
+    text = get_vault().metrics_text()
+    with st.expander("Prometheus export"):
+        st.caption("The API server serves the same text at GET /metrics for scraping.")
+        st.code(text, language="text")
+        st.download_button("⬇️ Download metrics.txt", data=text, file_name="metrics.txt")
+    if st.button("Reset timings"):
+        METRICS.reset()
+        st.rerun()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        main()
+    finally:
+        METRICS.observe('rerun', time.perf_counter() - RERUN_STARTED)
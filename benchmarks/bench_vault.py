@@ -0,0 +1,284 @@
+"""Benchmarks for the auth, crypto and persistence hot paths.
+
+Usage:
+    python benchmarks/bench_vault.py                       # quick run, JSON to stdout
+    python benchmarks/bench_vault.py --sizes 1000 100000 1000000 -o results.json
+    python benchmarks/bench_vault.py --compare old.json new.json
+
+Every case reports p50/p99 latency, throughput and the tracemalloc
+high-water mark. Results are plain JSON keyed by case name, so two runs can
+be diffed with --compare.
+"""
+import argparse
+import base64
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vault.core import Vault  # noqa: E402
+from vault.kdf import (DEFAULT_PARAMS, KdfExecutor, available, derive_hex, format_hash,  # noqa: E402
+                       new_salt, pbkdf2_hex)
+from vault.metrics import percentile  # noqa: E402
+from vault.model import Record, compact_rows  # noqa: E402
+from vault.shared import SharedVault  # noqa: E402
+from vault.storage import open_store  # noqa: E402
+
+DEFAULT_SIZES = [1000, 100000]
+DEFAULT_PAYLOADS = [100, 10 * 1024, 1024 * 1024, 10 * 1024 * 1024]
+USERS_PER_VAULT = 100
+
+
+# --- Measurement ---
+def measure(fn, repeat, setup=None, units=1):
+    """Run fn `repeat` times; returns latency percentiles, throughput and peak memory.
+
+    Timings are taken without tracemalloc (it slows allocation-heavy code a
+    lot); one extra traced run records the memory high-water mark.
+    """
+    def run():
+        if setup:
+            arg = setup()
+            started = time.perf_counter()
+            fn(arg)
+        else:
+            started = time.perf_counter()
+            fn()
+        return time.perf_counter() - started
+
+    samples = [run() for _ in range(repeat)]
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    total = sum(samples)
+    return {
+        'repeat': repeat,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'ops_per_sec': repeat * units / total if total else 0.0,
+        'peak_mem_bytes': peak,
+    }
+
+
+# --- Synthetic Vaults ---
+def synthetic_token(payload_size, rng):
+    # Same length as a Fernet token for `payload_size` bytes of plaintext,
+    # without paying for real encryption of a million records.
+    raw = 57 + (payload_size // 16 + 1) * 16
+    return base64.urlsafe_b64encode(rng.randbytes(raw)).decode()
+
+def synthetic_vault(count, payload_size=100, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    passkey_hash = format_hash(new_salt(), '0' * 64)
+    users = {f"user{i}": {'password_hash': passkey_hash, 'registered_at': start.isoformat(),
+                          'last_login': None, 'failed_attempts': 0, 'locked_until': None}
+             for i in range(USERS_PER_VAULT)}
+    records = {}
+    for i in range(count):
+        username = f"user{i % USERS_PER_VAULT}"
+        created = start + timedelta(seconds=i)
+        data_name = ''.join(rng.choices(string.ascii_lowercase, k=12))
+        records[f"{username}_{data_name}_{created.timestamp()}"] = {
+            'username': username,
+            'data_name': data_name,
+            'encrypted_text': synthetic_token(payload_size, rng),
+            'passkey_hash': passkey_hash,
+            'created_at': created.isoformat()
+        }
+    return users, records
+
+def build_store(backend, directory, users, records):
+    store = open_store(backend, directory)
+    # Copies: a store may rewrite committed records in place (see LazyStore).
+    store.commit(users=users, records={k: dict(v) for k, v in records.items()})
+    if hasattr(store, 'compact'):
+        store.compact()
+    return store
+
+
+# --- Cases ---
+def bench_auth(results, repeat):
+    salt = new_salt()
+    stored = format_hash(salt, pbkdf2_hex('correct horse', salt))
+    results['hash_passkey/inline'] = measure(lambda: pbkdf2_hex('correct horse', new_salt()), repeat)
+    results['verify_password/inline'] = measure(
+        lambda: format_hash(salt, pbkdf2_hex('correct horse', salt)) == stored, repeat)
+    for algorithm in available():
+        results[f"hash_passkey/{algorithm}"] = measure(
+            lambda: derive_hex('correct horse', new_salt(), algorithm, DEFAULT_PARAMS[algorithm]), repeat)
+
+    kdf = KdfExecutor()
+    try:
+        kdf.derive('warm up', salt, timeout=None)
+        results['hash_passkey/pool'] = measure(
+            lambda: kdf.derive('correct horse', new_salt(), timeout=None), repeat)
+        batch = kdf.max_workers * 4
+        results['hash_passkey/pool_burst'] = measure(
+            lambda: [f.result() for f in [kdf.submit('correct horse', new_salt(), timeout=None)
+                                          for _ in range(batch)]],
+            max(repeat // 4, 1), units=batch)
+    finally:
+        kdf.shutdown()
+
+def bench_crypto(results, payloads, repeat):
+    """Vault.seal_text and Vault.decrypt_record, the paths add_record and the
+    retrieve page take: compression, a data key wrapped under the master
+    key, then Fernet.
+    """
+    rng = random.Random(3)
+    directory = tempfile.mkdtemp(prefix='vault-bench-')
+    vault = Vault(directory)
+    try:
+        for size in payloads:
+            # Mixed-case text compresses about as well as typical secrets; 'x' * size
+            # would make compression look free.
+            text = ''.join(rng.choices(string.ascii_letters + string.digits + ' \n', k=size))
+            token, fields = vault.seal_text(text)
+            record = dict(fields, encrypted_text=token)
+            if vault.decrypt_record(record) != text:
+                raise RuntimeError("seal_text/decrypt_record round trip failed")
+            runs = repeat if size <= 1024 * 1024 else max(repeat // 10, 3)
+            results[f"encrypt_data/{size}B"] = measure(lambda: vault.seal_text(text), runs)
+            results[f"decrypt_data/{size}B"] = measure(lambda: vault.decrypt_record(record), runs)
+    finally:
+        vault.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+def bench_persistence(results, sizes, backends, repeat):
+    rng = random.Random(1)
+    for count in sizes:
+        users, records = synthetic_vault(count)
+        for backend in backends:
+            directory = tempfile.mkdtemp(prefix='vault-bench-')
+            try:
+                store = build_store(backend, directory, users, records)
+                results[f"init_data/{backend}/{count}"] = measure(store.load, max(repeat // 10, 3))
+
+                def one_record():
+                    record = dict(next(iter(records.values())))
+                    record['encrypted_text'] = synthetic_token(100, rng)
+                    return {f"bench_{rng.random()}": record}
+                results[f"save_data/{backend}/{count}"] = measure(
+                    lambda changed: store.commit(records=changed), repeat, setup=one_record)
+
+                shared = SharedVault(store)
+                results[f"user_records/{backend}/{count}"] = measure(
+                    lambda: shared.user_records('user7'), repeat)
+                store.close()
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+        results[f"user_records/scan/{count}"] = measure(
+            lambda: {k: v for k, v in records.items()
+                     if 'username' in v and v['username'] == 'user7'}, repeat)
+
+def bench_model(results, sizes):
+    """Memory of the cached records: plain dicts, as the old st.session_state.stored_data
+    held them, against the slotted Record objects SharedVault now keeps.
+
+    'v1' records have the original five fields; 'current' ones also carry
+    what add_record writes today (sizes, compression, key version, wrapped key).
+    """
+    rng = random.Random(2)
+    for count in sizes:
+        _, records = synthetic_vault(count)
+        shapes = {'v1': records, 'current': {
+            data_id: dict(record, compression=None, plain_size=100,
+                          stored_size=len(record['encrypted_text']), key_version=1,
+                          wrapped_key=synthetic_token(44, rng))
+            for data_id, record in records.items()}}
+        for shape, shaped in shapes.items():
+            # Decode from JSON so every field is its own object, as after a load.
+            blob = json.dumps(shaped)
+            builders = {'dict': lambda: json.loads(blob),
+                        'record': lambda: compact_rows(Record, json.loads(blob))}
+            for name, build in builders.items():
+                started = time.perf_counter()
+                build()
+                elapsed = time.perf_counter() - started
+                gc.collect()
+                tracemalloc.start()
+                built = build()
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                del built
+                results[f"model/{shape}/{name}/{count}"] = {
+                    'repeat': 1, 'p50_ms': elapsed * 1000, 'p99_ms': elapsed * 1000,
+                    'bytes': current, 'bytes_per_record': current / count, 'peak_mem_bytes': peak,
+                }
+
+
+# --- Comparison ---
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)['results']
+    with open(new_path) as f:
+        new = json.load(f)['results']
+    print(f"{'case':45} {'old p50':>10} {'new p50':>10} {'change':>8}")
+    for case in sorted(set(old) | set(new)):
+        if case not in old or case not in new:
+            print(f"{case:45} {'only in ' + ('new' if case in new else 'old'):>30}")
+            continue
+        before, after = old[case]['p50_ms'], new[case]['p50_ms']
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{case:45} {before:10.3f} {after:10.3f} {change:+7.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Vault sizes in records")
+    parser.add_argument('--payloads', type=int, nargs='+', default=DEFAULT_PAYLOADS,
+                        help="Payload sizes in bytes for encrypt/decrypt")
+    parser.add_argument('--backends', nargs='+', default=['sqlite', 'journal'])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--only', choices=['auth', 'crypto', 'persistence', 'model'], nargs='+')
+    parser.add_argument('-o', '--output', help="Write JSON results here (default: stdout)")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    groups = args.only or ['auth', 'crypto', 'persistence', 'model']
+    results = {}
+    if 'auth' in groups:
+        bench_auth(results, max(args.repeat // 5, 3))
+    if 'crypto' in groups:
+        bench_crypto(results, args.payloads, args.repeat)
+    if 'persistence' in groups:
+        bench_persistence(results, args.sizes, args.backends, args.repeat)
+    if 'model' in groups:
+        bench_model(results, args.sizes)
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,443 @@
+"""Concurrent-user load test of the Streamlit app, against one `streamlit run` server.
+
+Usage:
+    python benchmarks/load_app.py                                  # 1, 2, 4, 8 users, 20 s each
+    python benchmarks/load_app.py --users 1 4 16 32 --duration 60 -o load.json
+    python benchmarks/load_app.py --users 8 --think 0.5 2 --mix encrypt=1 retrieve=4
+
+The harness starts app.py under `streamlit run`, as it is deployed: a single
+server process with one cached Vault, store and KDF pool. Each virtual user
+is a browser session on that server, a websocket client speaking the
+frontend's protocol (BackMsg/ForwardMsg protobufs), so the saturation point
+is that of one server. All clients run on one asyncio loop in this process;
+they only encode widget states and decode the page, but on a small machine
+they still share the CPU with the server.
+
+A user registers, logs in from a fresh session, then encrypts or retrieves
+per --mix with a random think time between actions, until the step's
+--duration runs out. Written against streamlit 1.43.2; the websocket
+protocol is Streamlit's own and may change between versions.
+
+For every user count the report has throughput and, per page, p50/p95/p99
+latency and error rate. The saturation point is the last user count that
+still raised throughput by at least --min-gain; past it, more users only
+add latency. Runs use a throwaway data directory unless --data-dir is given,
+and the app's UX delay is off unless --ux-delay is set.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from vault.metrics import percentile  # noqa: E402
+
+APP = os.path.join(ROOT, 'app.py')
+STREAMLIT_VERSION = '1.43.2'
+PASSWORD = 'load-test-password'
+PASSKEY = 'load-test-passkey'
+SECRET = 'load test secret ' * 16
+RUN_TIMEOUT = 120
+
+
+# --- Per-Page Stats ---
+class PageStats:
+    """Latency samples and error counts per page, shared by every virtual user."""
+
+    def __init__(self):
+        self._samples = {}
+        self._errors = {}
+
+    def record(self, page, seconds, ok):
+        self._samples.setdefault(page, []).append(seconds)
+        self._errors[page] = self._errors.get(page, 0) + (not ok)
+
+    def actions(self):
+        return sum(len(samples) for page, samples in self._samples.items() if page != 'navigate')
+
+    def summary(self):
+        return {page: {'count': len(samples), 'errors': self._errors[page],
+                       'error_rate': self._errors[page] / len(samples),
+                       'p50_ms': percentile(samples, 50) * 1000,
+                       'p95_ms': percentile(samples, 95) * 1000,
+                       'p99_ms': percentile(samples, 99) * 1000}
+                for page, samples in sorted(self._samples.items())}
+
+
+# --- Browser Session ---
+class BrowserSession:
+    """One browser tab: a websocket session with the server.
+
+    Like the frontend it keeps the values it has given widgets and sends
+    them with every rerun, and it keeps the elements of the last run by
+    their place on the page.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.ws = None
+        self.elements = {}
+        self.values = {}
+        self._cache = {}
+
+    async def open(self):
+        from tornado.websocket import websocket_connect
+
+        self.ws = await websocket_connect(self.url, subprotocols=['streamlit'])
+        await self.rerun()
+
+    def close(self):
+        if self.ws is not None:
+            self.ws.close()
+
+    async def rerun(self, trigger=None):
+        """Rerun the script with the current widget values (and a click); wait for it to finish."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ''
+        present = {getattr(self._widget(element), 'id', None) for element in self.elements.values()}
+        for widget_id, (field, value) in self.values.items():
+            if widget_id in present:
+                state = msg.rerun_script.widget_states.widgets.add()
+                state.id = widget_id
+                setattr(state, field, value)
+        if trigger:
+            state = msg.rerun_script.widget_states.widgets.add()
+            state.id = trigger
+            state.trigger_value = True
+        await self.ws.write_message(msg.SerializeToString(), binary=True)
+        await asyncio.wait_for(self._until_finished(), RUN_TIMEOUT)
+
+    async def _until_finished(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        while True:
+            msg = await self._read()
+            kind = msg.WhichOneof('type')
+            if kind == 'new_session':
+                self.elements = {}
+            elif kind == 'delta' and msg.delta.WhichOneof('type') == 'new_element':
+                self.elements[tuple(msg.metadata.delta_path)] = msg.delta.new_element
+            elif kind == 'script_finished':
+                if msg.script_finished == ForwardMsg.FINISHED_SUCCESSFULLY:
+                    return
+                if msg.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("app.py failed to compile")
+                # FINISHED_EARLY_FOR_RERUN: st.rerun() started the next run.
+
+    async def _read(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        data = await self.ws.read_message()
+        if data is None:
+            raise ConnectionError("The server closed the session")
+        msg = ForwardMsg.FromString(data)
+        if msg.WhichOneof('type') == 'ref_hash':
+            # A large message this session was already sent: the content is
+            # cached, the place on the page comes with the reference.
+            cached = ForwardMsg()
+            cached.CopyFrom(self._cache[msg.ref_hash])
+            cached.metadata.CopyFrom(msg.metadata)
+            return cached
+        if msg.metadata.cacheable:
+            self._cache[msg.hash] = msg
+        return msg
+
+    @staticmethod
+    def _widget(element):
+        return getattr(element, element.WhichOneof('type'))
+
+    def find(self, kind, label):
+        for element in self.elements.values():
+            if element.WhichOneof('type') == kind and element_label(element) == label:
+                return self._widget(element)
+        raise LookupError(f"No {kind} labelled {label!r}")
+
+    def has(self, kind, label):
+        try:
+            self.find(kind, label)
+        except LookupError:
+            return False
+        return True
+
+    def type(self, kind, label, text):
+        self.values[self.find(kind, label).id] = ('string_value', text)
+
+    def select(self, kind, label, option):
+        widget = self.find(kind, label)
+        self.values[widget.id] = ('int_value', list(widget.options).index(option))
+
+    def click(self, label):
+        return self.find('button', label).id
+
+    def exception(self):
+        return any(element.WhichOneof('type') == 'exception' for element in self.elements.values())
+
+    def text(self):
+        return ' '.join(element.markdown.body for element in self.elements.values()
+                        if element.WhichOneof('type') == 'markdown')
+
+
+def element_label(element):
+    kind = element.WhichOneof('type')
+    return getattr(getattr(element, kind), 'label', None) if kind else None
+
+
+# --- Virtual User ---
+class VirtualUser:
+    """One simulated person: register, log in, then a loop of encrypts and retrieves."""
+
+    def __init__(self, name, url, stats, deadline, think, mix, seed):
+        self.name = name
+        self.url = url
+        self.stats = stats
+        self.deadline = deadline
+        self.think = think
+        self.mix = mix
+        self.rng = random.Random(seed)
+        self.stored = 0
+        self.session = None
+
+    async def run(self):
+        try:
+            await self._run()
+        finally:
+            if self.session:
+                self.session.close()
+
+    async def _run(self):
+        # Stagger the start so users do not move in lockstep.
+        await asyncio.sleep(self.rng.uniform(0, self.think[1]))
+        if not await self.step('register', self.register):
+            return
+        self.session.close()
+        if not await self.step('login', self.login):
+            return
+        actions, weights = zip(*self.mix.items())
+        while time.monotonic() < self.deadline:
+            action = self.rng.choices(actions, weights)[0]
+            if action == 'retrieve' and not self.stored:
+                action = 'encrypt'
+            await self.step(action, getattr(self, action))
+            await asyncio.sleep(self.rng.uniform(*self.think))
+
+    async def step(self, page, action):
+        started = time.perf_counter()
+        try:
+            return await action(page)
+        except Exception:
+            # A missing widget, a dropped connection or a timed-out run: the page failed outright.
+            self.stats.record(page, time.perf_counter() - started, False)
+            return False
+
+    async def submit(self, page, trigger, check):
+        # Only the run that submits the form counts towards the page latency.
+        started = time.perf_counter()
+        await self.session.rerun(trigger)
+        elapsed = time.perf_counter() - started
+        ok = not self.session.exception() and check()
+        self.stats.record(page, elapsed, ok)
+        return ok
+
+    async def navigate(self, run):
+        started = time.perf_counter()
+        await run()
+        self.stats.record('navigate', time.perf_counter() - started, not self.session.exception())
+
+    def logged_in(self):
+        return self.session.has('selectbox', "Navigation")
+
+    async def register(self, page):
+        self.session = BrowserSession(self.url)
+        await self.navigate(self.session.open)
+        self.session.select('radio', "Menu", "Register")
+        await self.navigate(self.session.rerun)
+        self.session.type('text_input', "Choose Username", self.name)
+        self.session.type('text_input', "Create Password", PASSWORD)
+        self.session.type('text_input', "Confirm Password", PASSWORD)
+        return await self.submit(page, self.session.click("Create Account →"), self.logged_in)
+
+    async def login(self, page):
+        self.session = BrowserSession(self.url)
+        await self.navigate(self.session.open)
+        self.session.type('text_input', "Username", self.name)
+        self.session.type('text_input', "Password", PASSWORD)
+        return await self.submit(page, self.session.click("Sign In →"), self.logged_in)
+
+    async def encrypt(self, page):
+        self.session.select('selectbox', "Navigation", "🔐 Encrypt Data")
+        await self.navigate(self.session.rerun)
+        self.session.type('text_input', "Data Name", f"item-{self.stored}")
+        self.session.type('text_area', "Data to Encrypt", SECRET)
+        self.session.type('text_input', "Encryption Passkey", PASSKEY)
+        ok = await self.submit(page, self.session.click("🔒 Encrypt & Store →"),
+                               lambda: 'Data encrypted successfully' in self.session.text())
+        self.stored += ok
+        return ok
+
+    async def retrieve(self, page):
+        self.session.select('selectbox', "Navigation", "🔍 Retrieve Data")
+        await self.navigate(self.session.rerun)
+        self.session.type('text_input', "Decryption Passkey", PASSKEY)
+
+        def decrypted():
+            area = self.session.find('text_area', "Your Data")
+            return SECRET in (area.value, area.default)
+        return await self.submit(page, self.session.click("🔓 Decrypt Data →"), decrypted)
+
+
+# --- App Server ---
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+@contextlib.contextmanager
+def app_server(data_dir, env, startup_timeout=60):
+    """Run app.py under `streamlit run` in `data_dir`; yields its websocket URL."""
+    port = free_port()
+    log_path = os.path.join(data_dir, 'streamlit.log')
+    with open(log_path, 'w') as log:
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'streamlit', 'run', APP,
+             '--server.headless', 'true', '--server.address', '127.0.0.1',
+             '--server.port', str(port), '--server.fileWatcherType', 'none',
+             '--browser.gatherUsageStats', 'false'],
+            cwd=data_dir, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            deadline = time.monotonic() + startup_timeout
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"streamlit run exited with {server.returncode}; see {log_path}")
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                        break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"streamlit run did not come up; see {log_path}")
+                    time.sleep(0.2)
+            yield f"ws://127.0.0.1:{port}/_stcore/stream"
+        finally:
+            server.terminate()
+            try:
+                server.wait(10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+
+
+# --- Load Steps ---
+async def run_users(url, users, stats, deadline, think, mix, seed):
+    tag = f"{users}-{int(time.time() * 1000) % 100000}"
+    await asyncio.gather(*(VirtualUser(f"load-{tag}-{i}", url, stats, deadline, think, mix, seed + i).run()
+                           for i in range(users)))
+
+def run_level(url, users, duration, think, mix, seed):
+    """Run `users` virtual users for `duration` seconds; returns the step's report."""
+    stats = PageStats()
+    started = time.perf_counter()
+    asyncio.run(run_users(url, users, stats, time.monotonic() + duration, think, mix, seed))
+    wall = time.perf_counter() - started
+    pages = stats.summary()
+    actions = stats.actions()
+    errors = sum(page['errors'] for name, page in pages.items() if name != 'navigate')
+    return {'users': users, 'seconds': wall, 'actions': actions,
+            'throughput_per_sec': actions / wall if wall else 0.0,
+            'error_rate': errors / actions if actions else 0.0,
+            'pages': pages}
+
+def saturation_point(levels, min_gain):
+    """The last user count whose throughput beat the previous count by `min_gain`."""
+    best = levels[0]['users'] if levels else None
+    for previous, current in zip(levels, levels[1:]):
+        if current['throughput_per_sec'] < previous['throughput_per_sec'] * (1 + min_gain):
+            break
+        best = current['users']
+    return best
+
+def parse_mix(items):
+    mix = {}
+    for item in items:
+        action, _, weight = item.partition('=')
+        if action not in ('encrypt', 'retrieve'):
+            raise argparse.ArgumentTypeError(f"Unknown action {action!r}")
+        mix[action] = float(weight or 1)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="Concurrent user counts to step through")
+    parser.add_argument('--duration', type=float, default=20, help="Seconds per user count")
+    parser.add_argument('--think', type=float, nargs=2, default=[0.2, 1.0], metavar=('MIN', 'MAX'),
+                        help="Think time between actions, seconds")
+    parser.add_argument('--mix', nargs='+', default=['encrypt=1', 'retrieve=3'],
+                        help="Action weights, e.g. encrypt=1 retrieve=3")
+    parser.add_argument('--min-gain', type=float, default=0.1,
+                        help="Throughput gain that still counts as scaling (0.1 = 10%%)")
+    parser.add_argument('--ux-delay', default='0', help="VAULT_UX_DELAY for the app")
+    parser.add_argument('--backend', default=None, help="VAULT_BACKEND for the app")
+    parser.add_argument('--data-dir', help="Vault data directory (default: a temporary one)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help="Write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+    mix = parse_mix(args.mix)
+    try:
+        import streamlit
+        import tornado  # noqa: F401
+    except ImportError:
+        parser.error("streamlit is required")
+    if streamlit.__version__ != STREAMLIT_VERSION:
+        print(f"warning: written against streamlit {STREAMLIT_VERSION}, running {streamlit.__version__}",
+              file=sys.stderr)
+
+    env = {'VAULT_UX_DELAY': args.ux_delay}
+    if args.backend:
+        env['VAULT_BACKEND'] = args.backend
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='vault-load-')
+    levels = []
+    # app.py opens Vault('.'), so the server runs in the data directory.
+    with app_server(data_dir, env) as url:
+        for users in args.users:
+            level = run_level(url, users, args.duration, args.think, mix, args.seed)
+            levels.append(level)
+            print(f"{users:4} users: {level['throughput_per_sec']:7.2f} actions/s, "
+                  f"{level['error_rate'] * 100:5.1f}% errors", file=sys.stderr)
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'streamlit': streamlit.__version__,
+        'settings': {'duration': args.duration, 'think': args.think, 'mix': mix,
+                     'backend': args.backend or os.environ.get('VAULT_BACKEND', 'sqlite'),
+                     'data_dir': data_dir},
+        'saturation_users': saturation_point(levels, args.min_gain),
+        'results': levels,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""Startup and rerun profile of the Streamlit app.
+
+Usage:
+    python benchmarks/profile_app.py                  # JSON report to stdout
+    python benchmarks/profile_app.py --reruns 50 -o startup.json
+    python benchmarks/profile_app.py --cprofile 25    # also print the hottest functions
+
+Three parts:
+  imports  `python -X importtime` over the modules app.py imports at the top,
+           with the slowest ones by cumulative time (cold start of a process).
+  runs     app.py driven headlessly with streamlit.testing's AppTest against a
+           throwaway data directory: the first run, then reruns of the login
+           page and of a logged-in dashboard, as p50/p99 milliseconds. Runs
+           share one compiled app.py, as they do under `streamlit run`, and
+           --cprofile profiles the script thread that executes it.
+  spans    the app's own timing spans (vault.metrics) collected during those runs.
+
+Results are plain JSON, like bench_vault.py's. Sharing the compiled script
+and profiling the script thread both patch private Streamlit attributes
+(local_script_runner.ScriptCache, ScriptRunner._run_script). Written against
+streamlit 1.43.2; if those attributes are gone the script stops and names them
+instead of timing something else.
+"""
+import argparse
+import contextlib
+import cProfile
+import importlib
+import json
+import os
+import platform
+import pstats
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from vault.metrics import percentile  # noqa: E402
+
+APP = os.path.join(ROOT, 'app.py')
+STREAMLIT_VERSION = '1.43.2'
+# Private Streamlit attributes the runs patch, as (module, attribute path).
+INTERNALS = [('streamlit.testing.v1.local_script_runner', 'ScriptCache'),
+             ('streamlit.runtime.scriptrunner.script_runner', 'ScriptRunner._run_script')]
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+
+# --- Import Time ---
+def top_level_imports(path=APP):
+    """Modules imported at the top of app.py, in order."""
+    modules = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            match = re.match(r'(?:from (\S+) import|import (\S+))', line)
+            if match:
+                modules.append(match.group(1) or match.group(2))
+    return modules
+
+def import_times(modules, top=15):
+    """Run `python -X importtime` in a fresh interpreter and summarize it."""
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {', '.join(modules)}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        return {'error': proc.stderr.strip().splitlines()[-1] if proc.stderr else 'failed'}
+    entries = []
+    for line in proc.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    roots = [entry for entry in entries if entry[3] == 0]
+    return {
+        'process_wall_ms': wall * 1000,
+        'imports_ms': sum(cumulative for _, _, cumulative, _ in roots) / 1000,
+        'modules_loaded': len(entries),
+        'slowest': [{'module': name, 'cumulative_ms': cumulative / 1000, 'self_ms': self_us / 1000}
+                    for name, self_us, cumulative, _ in
+                    sorted(roots, key=lambda entry: entry[2], reverse=True)[:top]],
+    }
+
+
+# --- App Runs ---
+class StreamlitChanged(RuntimeError):
+    """A private Streamlit attribute this script patches is missing."""
+
+
+def internal(module, path):
+    """The private Streamlit attribute `module`.`path`, or StreamlitChanged naming it."""
+    import streamlit
+
+    owner = importlib.import_module(module)
+    for name in path.split('.'):
+        if not hasattr(owner, name):
+            raise StreamlitChanged(f"{module}.{path} not found in streamlit {streamlit.__version__}; "
+                                   f"profile_app.py patches it and was written against "
+                                   f"streamlit {STREAMLIT_VERSION}")
+        owner = getattr(owner, name)
+    return owner
+
+def timed_run(app_test):
+    started = time.perf_counter()
+    app_test.run()
+    elapsed = time.perf_counter() - started
+    if app_test.exception:
+        raise RuntimeError(f"app.py raised: {app_test.exception[0].message}")
+    return elapsed
+
+@contextlib.contextmanager
+def server_script_cache():
+    """Share one compiled app.py across AppTest runs, as a server's Runtime does.
+
+    AppTest gives every run a new ScriptCache, so each rerun would also pay
+    for compiling app.py (with Streamlit's magic rewrite), which `streamlit
+    run` does once per process.
+    """
+    from streamlit.testing.v1 import local_script_runner
+
+    ScriptCache = internal(*INTERNALS[0])
+    cache = ScriptCache()
+    local_script_runner.ScriptCache = lambda: cache
+    try:
+        yield
+    finally:
+        local_script_runner.ScriptCache = ScriptCache
+
+@contextlib.contextmanager
+def profiling(profiler):
+    """Enable `profiler` around every script run.
+
+    AppTest executes app.py on a ScriptRunner thread of its own, and a
+    profiler enabled on the calling thread only sees it polling for the
+    run to end.
+    """
+    from streamlit.runtime.scriptrunner.script_runner import ScriptRunner
+
+    run_script = internal(*INTERNALS[1])
+
+    def profiled(self, rerun_data):
+        profiler.enable()
+        try:
+            return run_script(self, rerun_data)
+        finally:
+            profiler.disable()
+
+    ScriptRunner._run_script = profiled
+    try:
+        yield
+    finally:
+        ScriptRunner._run_script = run_script
+
+def summarize(samples):
+    return {'runs': len(samples), 'p50_ms': percentile(samples, 50) * 1000,
+            'p99_ms': percentile(samples, 99) * 1000}
+
+def profile_runs(reruns, profiler=None):
+    from streamlit.testing.v1 import AppTest
+
+    from vault.core import Vault
+    from vault.metrics import METRICS
+
+    # Check every patched internal before spending time on the runs.
+    for module, path in INTERNALS:
+        internal(module, path)
+    results = {}
+    data_dir = tempfile.mkdtemp(prefix='vault-profile-')
+    cwd = os.getcwd()
+    os.chdir(data_dir)  # app.py opens Vault('.')
+    try:
+        vault = Vault('.')
+        vault.register_user('profile', 'profile-password')
+        for i in range(50):
+            vault.add_record('profile', f"secret-{i}", 'passkey', secret='x' * 200)
+        vault.close()
+        METRICS.reset()
+
+        with server_script_cache():
+            login = AppTest.from_file(APP, default_timeout=60)
+            results['first_run'] = {'ms': timed_run(login) * 1000,
+                                    'pandas_loaded': 'pandas' in sys.modules}
+            with profiling(profiler) if profiler else contextlib.nullcontext():
+                results['rerun/login'] = summarize([timed_run(login) for _ in range(reruns)])
+
+                dashboard = AppTest.from_file(APP, default_timeout=60)
+                dashboard.session_state['current_user'] = 'profile'
+                dashboard.session_state['user_stats'] = {'encrypted_items': 0, 'retrieved_items': 0,
+                                                         'last_activity': datetime.now().isoformat()}
+                results['first_run/dashboard'] = {'ms': timed_run(dashboard) * 1000}
+                if not any(element.label == "Navigation" for element in dashboard.selectbox):
+                    raise RuntimeError("app.py did not render the dashboard for a logged-in session")
+                results['rerun/dashboard'] = summarize([timed_run(dashboard) for _ in range(reruns)])
+        results['spans'] = METRICS.spans()
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reruns', type=int, default=20)
+    parser.add_argument('--top', type=int, default=15, help="Slowest imports to list")
+    parser.add_argument('--cprofile', type=int, metavar='N',
+                        help="Print the N hottest functions of the reruns to stderr")
+    parser.add_argument('-o', '--output', help="Write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    modules = top_level_imports()
+    results = {'imports': import_times(modules, args.top),
+               # What the dashboard pulls in on first use instead of at startup.
+               'imports/deferred': import_times(['pandas'], args.top)}
+    profiler = cProfile.Profile() if args.cprofile else None
+    try:
+        results.update(profile_runs(args.reruns, profiler))
+    except ImportError as e:
+        results['runs'] = {'error': f"AppTest unavailable: {e}"}
+    except StreamlitChanged as e:
+        parser.error(str(e))
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if profiler:
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(args.cprofile)
+
+
+if __name__ == '__main__':
+    main()
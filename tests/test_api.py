@@ -0,0 +1,62 @@
+import asyncio
+import json
+
+import pytest
+
+from vault.api import VaultApi
+from vault.core import Vault
+
+
+@pytest.fixture
+def api(tmp_path):
+    api = VaultApi(str(tmp_path), 'journal')
+    vault = api._vault = Vault(str(tmp_path), 'journal')
+    # Cheap hashes: these tests are about routing and throttling, not the KDF.
+    vault.hash_passkey = lambda passkey, salt=None: f"plain${passkey}"
+    vault.verify_password = lambda stored, provided: stored == f"plain${provided}"
+    yield api
+    vault.close()
+
+def call(api, method, path, body=None, token=None, query=b''):
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query,
+             'headers': [(b'authorization', f"Bearer {token}".encode())] if token else []}
+    messages = [{'type': 'http.request', 'body': json.dumps(body).encode() if body is not None else b''}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(api(scope, receive, send))
+    return sent[0]['status'], json.loads(b''.join(message.get('body', b'') for message in sent[1:]))
+
+def login(api, username='alice'):
+    assert call(api, 'POST', '/register', {'username': username, 'password': 'password'})[0] == 201
+    return call(api, 'POST', '/login', {'username': username, 'password': 'password'})[1]['token']
+
+
+def test_decrypt_round_trip(api):
+    token = login(api)
+    status, created = call(api, 'POST', '/records', {'data_name': 'a/b', 'secret': 's3', 'passkey': 'pk'}, token)
+    assert status == 201
+    assert call(api, 'POST', f"/records/{created['id']}/decrypt", {'passkey': 'pk'}, token) == (200, {'secret': 's3'})
+
+def test_wrong_passkeys_lock_the_record(api):
+    token = login(api)
+    data_id = call(api, 'POST', '/records', {'data_name': 'n', 'secret': 's', 'passkey': 'pk'}, token)[1]['id']
+    for _ in range(3):
+        assert call(api, 'POST', f"/records/{data_id}/decrypt", {'passkey': 'guess'}, token)[0] == 403
+    # Locked now, even for the right passkey and on the passkey route.
+    assert call(api, 'POST', f"/records/{data_id}/decrypt", {'passkey': 'pk'}, token)[0] == 429
+    status, _ = call(api, 'POST', f"/records/{data_id}/passkey", {'passkey': 'pk', 'new_passkey': 'x'}, token)
+    assert status == 429
+    # Other users are not affected by the lock.
+    other = login(api, 'bob')
+    assert call(api, 'POST', f"/records/{data_id}/decrypt", {'passkey': 'pk'}, other)[0] == 403
+
+@pytest.mark.parametrize('query', [b'page_size=0', b'page_size=-5', b'page=0'])
+def test_page_bounds_rejected(api, query):
+    token = login(api)
+    assert call(api, 'GET', '/records', token=token, query=query)[0] == 400
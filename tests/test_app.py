@@ -0,0 +1,53 @@
+import io
+import os
+from datetime import datetime
+
+import pytest
+
+from vault.core import Vault
+
+AppTest = pytest.importorskip('streamlit.testing.v1').AppTest
+st = pytest.importorskip('streamlit')
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # app.py opens Vault('.') and caches it for the process.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('VAULT_UX_DELAY', '0')
+    st.cache_resource.clear()
+    yield tmp_path
+    st.cache_resource.clear()
+
+def logged_in(username):
+    app = AppTest.from_file(APP, default_timeout=60)
+    app.session_state['current_user'] = username
+    app.session_state['user_stats'] = {'encrypted_items': 0, 'retrieved_items': 0,
+                                       'last_activity': datetime.now().isoformat()}
+    app.run()
+    return app
+
+def widget(elements, label):
+    return next(element for element in elements if element.label == label)
+
+
+def test_file_record_downloads(data_dir):
+    data = os.urandom(300_000)
+    vault = Vault('.')
+    vault.register_user('alice', 'alice-password')
+    # What the encrypt page does with an upload; AppTest cannot drive st.file_uploader.
+    vault.add_record('alice', 'report.bin', 'file-passkey', file=io.BytesIO(data), file_name='report.bin')
+    vault.close()
+
+    app = logged_in('alice')
+    widget(app.selectbox, "Navigation").set_value("🔍 Retrieve Data").run()
+    widget(app.text_input, "Decryption Passkey").input('file-passkey')
+    widget(app.button, "🔓 Decrypt Data →").click().run()
+
+    assert not app.exception
+    assert any(f"report.bin decrypted ({len(data):,} bytes)" in element.value for element in app.markdown)
+    buttons = app.get('download_button')
+    assert [button.proto.label for button in buttons] == ["⬇️ Download Decrypted File"]
+    assert buttons[0].proto.url.endswith('.bin')
@@ -0,0 +1,52 @@
+import pytest
+
+from vault.ratelimit import RateLimiter
+
+
+@pytest.fixture
+def limiters(tmp_path):
+    # Each limiter stands for one server process sharing the checkpoint file;
+    # checkpoints are driven by hand.
+    opened = []
+
+    def open_limiter():
+        limiter = RateLimiter(str(tmp_path / 'ratelimit.json'), checkpoint_interval=3600)
+        opened.append(limiter)
+        return limiter
+
+    yield open_limiter
+    for limiter in opened:
+        limiter.close()
+
+
+def test_cleared_failures_stay_cleared(limiters):
+    limiter = limiters()
+    limiter.record_failure('alice')
+    limiter.record_failure('alice')
+    limiter.checkpoint()
+    limiter.record_success('alice')
+    limiter.close()
+
+    restarted = limiters()
+    assert restarted.stats()['users_with_failures'] == 0
+    assert restarted.record_failure('alice') == (2, 0)
+
+def test_lockout_applies_in_other_processes(limiters):
+    first, second = limiters(), limiters()
+    assert second.check('alice')[0]
+    for _ in range(3):
+        first.record_failure('alice')
+    first.checkpoint()
+    second.checkpoint()
+
+    allowed, locked, retry_after = second.check('alice')
+    assert (allowed, locked) == (False, True)
+    assert retry_after > 0
+
+def test_failures_from_other_processes_count(limiters):
+    first, second = limiters(), limiters()
+    first.record_failure('alice')
+    first.record_failure('alice')
+    first.checkpoint()
+    second.checkpoint()
+    assert second.record_failure('alice') == (0, 300)
@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from vault.core import Vault
+from vault.rotate import RotationJob
+from vault.storage import read_json
+
+
+@pytest.fixture
+def vault(tmp_path):
+    vault = Vault(str(tmp_path), 'journal')
+    records = {}
+    for i in range(7):
+        token, fields = vault.seal_text(f"secret {i}")
+        records[f"u_s{i}"] = dict(username='u', data_name=f"s{i}", created_at='2025-01-01T00:00:00',
+                                  encrypted_text=token, **fields)
+    # From before envelope encryption: encrypted directly under key 1.
+    records['u_legacy'] = dict(username='u', data_name='legacy', created_at='2025-01-01T00:00:00',
+                               encrypted_text=vault.encrypt_data("legacy secret"))
+    vault.commit(records=records)
+    yield vault
+    vault.close()
+
+def secrets(vault):
+    return {data_id: vault.decrypt_record(record) for data_id, record in vault.user_records('u').items()}
+
+
+def test_rotation_moves_every_record(vault):
+    before = secrets(vault)
+    vault.keyring.rotate()
+    progress = RotationJob(vault, batch_size=3, rate=1e6).run()
+
+    assert progress['finished'] and progress['failed'] == {}
+    assert {record['key_version'] for record in vault.user_records('u').values()} == {2}
+    vault.keyring.retire(1)
+    assert secrets(vault) == before
+
+def test_interrupted_rotation_resumes(vault):
+    before = secrets(vault)
+    vault.keyring.rotate()
+    first = RotationJob(vault, batch_size=3, rate=1e6)
+    rotate_batch = first._rotate_batch
+
+    def one_batch_then_stop(batch):
+        rotate_batch(batch)
+        first._stop.set()
+
+    first._rotate_batch = one_batch_then_stop
+    assert not first.run()['finished']
+    assert read_json(first.checkpoint_file)['done'] == 3
+
+    second = RotationJob(vault, batch_size=3, rate=1e6)
+    assert len(second.pending()) == 5
+    progress = second.run()
+    assert progress['finished'] and progress['done'] == 8
+    assert {record['key_version'] for record in vault.user_records('u').values()} == {2}
+    assert secrets(vault) == before
+
+def test_unreadable_record_is_reported_and_skipped(vault):
+    broken = vault.get_record('u_legacy')
+    broken['encrypted_text'] = vault.encrypt_data("x")[:-8] + 'AAAAAAAA'
+    vault.commit(records={'u_legacy': broken})
+    vault.keyring.rotate()
+
+    progress = RotationJob(vault, rate=1e6).run()
+    assert progress['finished']
+    assert list(progress['failed']) == ['u_legacy']
+    assert vault.get_record('u_legacy').get('key_version', 1) == 1
+
+    resumed = RotationJob(vault, rate=1e6)
+    assert resumed.pending() == []
+    assert list(resumed.run()['failed']) == ['u_legacy']
+
+def test_failed_file_rekey_leaves_no_blob(vault, tmp_path):
+    blob_dir = tmp_path / 'vault_blobs'
+    blob_dir.mkdir(exist_ok=True)
+    (blob_dir / 'bad.svs').write_bytes(b'not a stream')
+    vault.commit(records={'u_file': dict(username='u', data_name='f', created_at='2025-01-01T00:00:00',
+                                         kind='file', file_name='f', blob='bad.svs', size=3)})
+    vault.keyring.rotate()
+
+    progress = RotationJob(vault, rate=1e6).run()
+    assert 'u_file' in progress['failed']
+    assert os.listdir(blob_dir) == ['bad.svs']
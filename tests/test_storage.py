@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+
+import pytest
+
+from vault.shared import SharedVault
+from vault.storage import GroupCommitter, JournalStore, StorageError, open_store
+
+
+def journal_store(tmp_path, **kwargs):
+    return JournalStore(str(tmp_path / 'users.json'), str(tmp_path / 'data.json'),
+                        str(tmp_path / 'vault.journal'), **kwargs)
+
+def record(username, name):
+    return {'username': username, 'data_name': name, 'created_at': '2025-01-01T00:00:00',
+            'encrypted_text': 'eA=='}
+
+
+# --- Journal ---
+def test_replay_stops_at_torn_last_line(tmp_path):
+    store = journal_store(tmp_path)
+    store.commit(records={'a': record('u', 'a'), 'b': record('u', 'b')})
+    store.close()
+    with open(store.journal_file, 'a') as f:
+        f.write('{"t": "records", "k": "c", "v": {"userna')
+
+    _, records = journal_store(tmp_path).load()
+    assert sorted(records) == ['a', 'b']
+
+def test_commit_after_torn_line_survives(tmp_path):
+    store = journal_store(tmp_path)
+    store.commit(records={'a': record('u', 'a')})
+    # Torn by another process while this one still has the journal open.
+    with open(store.journal_file, 'a') as f:
+        f.write('{"t": "records", "k": "torn", "v": "' + 'x' * 100000)
+    store.commit(records={'b': record('u', 'b')})
+    store.close()
+
+    _, records = journal_store(tmp_path).load()
+    assert sorted(records) == ['a', 'b']
+
+def test_load_finishes_interrupted_rotation(tmp_path):
+    store = journal_store(tmp_path)
+    store.commit(users={'u': {'password_hash': 'h'}}, records={'a': record('u', 'a')})
+    store.close()
+    # Rotated, but the process died before folding it into the snapshot.
+    os.replace(store.journal_file, store.rotated_file)
+    store = journal_store(tmp_path)
+    store.commit(records={'b': record('u', 'b')})
+    store.close()
+
+    users, records = journal_store(tmp_path).load()
+    assert users == {'u': {'password_hash': 'h'}}
+    assert sorted(records) == ['a', 'b']
+    assert not os.path.exists(store.rotated_file)
+    with open(store.data_file) as f:
+        assert 'a' in json.load(f)
+
+def test_compaction_keeps_everything(tmp_path):
+    store = journal_store(tmp_path, compact_every=5)
+    for i in range(12):
+        store.commit(records={f"r{i}": record('u', str(i))})
+    store.commit(records={'r3': None})
+    store.compact()
+    store.close()
+
+    _, records = journal_store(tmp_path).load()
+    assert sorted(records) == sorted(f"r{i}" for i in range(12) if i != 3)
+
+def test_corrupt_snapshot_raises(tmp_path):
+    store = journal_store(tmp_path)
+    with open(store.data_file, 'w') as f:
+        f.write('{"a": {"username": ')
+    with pytest.raises(StorageError):
+        store.load()
+
+
+# --- Group Commit ---
+def test_group_commit_error_reaches_every_waiter():
+    calls = []
+
+    def flush(items):
+        calls.append(list(items))
+        if len(calls) == 1:
+            raise OSError("disk full")
+
+    committer = GroupCommitter(flush, window=0.05)
+    errors = []
+    start = threading.Barrier(5)
+
+    def submit(i):
+        start.wait()
+        try:
+            committer.submit([i])
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every caller whose items were in the failed batch saw its error...
+    assert len(errors) == len(calls[0])
+    assert all(str(e) == "disk full" for e in errors)
+    # ...and the rest were written by later batches.
+    assert sorted(i for batch in calls[1:] for i in batch) == sorted(
+        set(range(5)) - set(calls[0]))
+    committer.submit(['after'])
+    assert calls[-1] == ['after']
+
+
+# --- Backends ---
+@pytest.mark.parametrize('backend', ['journal', 'sqlite'])
+def test_legacy_records_migrate(tmp_path, backend):
+    legacy = {'python': {'encrypted_text': 'eA==', 'passkey': 'x', 'timestamp': 1.0},
+              'u_a_1': record('u', 'a')}
+    with open(tmp_path / 'encrypted_data.json', 'w') as f:
+        json.dump(legacy, f)
+
+    store = open_store(backend, str(tmp_path))
+    try:
+        _, records = store.load()
+        assert records == legacy
+    finally:
+        store.close()
+
+@pytest.mark.parametrize('backend', ['journal', 'sqlite', 'sharded'])
+def test_cache_sees_writes_racing_its_own(tmp_path, backend):
+    caches = [SharedVault(open_store(backend, str(tmp_path))) for _ in range(2)]
+
+    def write(i, cache):
+        for n in range(100):
+            cache.commit(records={f"{i}-{n}": record('u', f"{i}-{n}")})
+
+    threads = [threading.Thread(target=write, args=item) for item in enumerate(caches)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    try:
+        for cache in caches:
+            cache.refresh()
+            assert len(cache.user_records('u')) == 200
+    finally:
+        for cache in caches:
+            cache.store.close()
+
+@pytest.mark.parametrize('backend', ['journal', 'sqlite', 'sharded', 'binary', 'lazy'])
+def test_edit_keeps_record_order(tmp_path, backend):
+    cache = SharedVault(open_store(backend, str(tmp_path)))
+    try:
+        for n in range(3):
+            cache.commit(records={f"u_{n}": dict(record('u', f"n{n}"), created_at=f"2025-01-0{n + 1}T00:00:00")})
+        edited = dict(cache.get_record('u_0', 'u'), data_name='renamed')
+        cache.commit(records={'u_0': edited})
+        assert list(cache.user_records('u')) == ['u_0', 'u_1', 'u_2']
+        assert cache.get_record('u_0', 'u')['data_name'] == 'renamed'
+    finally:
+        cache.store.close()
+    # And once reloaded from disk.
+    cache = SharedVault(open_store(backend, str(tmp_path)))
+    try:
+        assert list(cache.user_records('u')) == ['u_0', 'u_1', 'u_2']
+    finally:
+        cache.store.close()
@@ -0,0 +1,80 @@
+import io
+
+import pytest
+from cryptography.fernet import Fernet
+
+from vault.stream import (HEADER_SIZE, TAG_SIZE, StreamError, decrypt_stream, encrypt_stream,
+                          read_range, rekey_stream)
+
+CHUNK = 64
+
+
+def sealed(data, key):
+    out = io.BytesIO()
+    encrypt_stream(key, io.BytesIO(data), out, chunk_size=CHUNK)
+    return out.getvalue()
+
+def chunks(blob):
+    size = CHUNK + TAG_SIZE
+    body = blob[HEADER_SIZE:]
+    return blob[:HEADER_SIZE], [body[i:i + size] for i in range(0, len(body), size)]
+
+def decrypt(blob, key):
+    return b''.join(decrypt_stream(key, io.BytesIO(blob)))
+
+
+@pytest.fixture
+def key():
+    return Fernet.generate_key()
+
+@pytest.fixture
+def data():
+    return bytes(range(256)) * 2  # 8 chunks
+
+
+@pytest.mark.parametrize('size', [0, 1, CHUNK, CHUNK + 1, 5 * CHUNK])
+def test_round_trip(key, size):
+    data = b'x' * size
+    assert decrypt(sealed(data, key), key) == data
+
+def test_dropping_last_chunk_is_detected(key, data):
+    header, parts = chunks(sealed(data, key))
+    with pytest.raises(StreamError):
+        decrypt(header + b''.join(parts[:-1]), key)
+
+def test_cutting_inside_a_chunk_is_detected(key, data):
+    blob = sealed(data, key)
+    with pytest.raises(StreamError):
+        decrypt(blob[:-5], key)
+
+def test_truncated_header_is_detected(key, data):
+    with pytest.raises(StreamError):
+        decrypt(sealed(data, key)[:HEADER_SIZE - 1], key)
+
+def test_reordered_chunks_are_detected(key, data):
+    header, parts = chunks(sealed(data, key))
+    parts[1], parts[2] = parts[2], parts[1]
+    with pytest.raises(StreamError):
+        decrypt(header + b''.join(parts), key)
+
+def test_appended_chunk_is_detected(key, data):
+    header, parts = chunks(sealed(data, key))
+    with pytest.raises(StreamError):
+        decrypt(header + b''.join(parts + [parts[0]]), key)
+
+def test_wrong_key_is_detected(key, data):
+    with pytest.raises(StreamError):
+        decrypt(sealed(data, key), Fernet.generate_key())
+
+def test_rekey(key, data):
+    new_key = Fernet.generate_key()
+    out = io.BytesIO()
+    rekey_stream(key, new_key, io.BytesIO(sealed(data, key)), out)
+    assert decrypt(out.getvalue(), new_key) == data
+    with pytest.raises(StreamError):
+        decrypt(out.getvalue(), key)
+
+def test_read_range(key, data):
+    blob = io.BytesIO(sealed(data, key))
+    assert read_range(key, blob, 60, 200) == data[60:260]
+    assert read_range(key, blob, len(data) - 3, 100) == data[-3:]
@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from vault import tree
+from vault.core import BLOB_DIR, Vault
+
+
+@pytest.fixture
+def vault(tmp_path):
+    (tmp_path / 'data').mkdir()
+    vault = Vault(str(tmp_path / 'data'), 'journal')
+    # Cheap hashes: these tests are about files, not the KDF.
+    vault.hash_passkey = lambda passkey, salt=None: f"plain${passkey}"
+    vault.verify_password = lambda stored, provided: stored == f"plain${provided}"
+    yield vault
+    vault.close()
+
+@pytest.fixture
+def src(tmp_path):
+    root = tmp_path / 'src'
+    (root / 'a' / 'b').mkdir(parents=True)
+    for i, name in enumerate(['x.pem', 'a/y.conf', 'a/b/z.key']):
+        (root / name).write_bytes(os.urandom(1000 * (i + 1)))
+    return root
+
+def blobs(vault):
+    return sorted(os.listdir(vault.path(BLOB_DIR)))
+
+
+def test_encrypt_and_restore(vault, src, tmp_path):
+    report = tree.TreeImport(vault, 'ops', str(src), 'etc/', batch_size=2, workers=2).run('pk')
+    assert (report['files'], report['failed']) == (3, 0)
+    names = sorted(record['data_name'] for record in vault.user_records('ops').values())
+    assert names == ['etc/a/b/z.key', 'etc/a/y.conf', 'etc/x.pem']
+
+    out = tmp_path / 'out'
+    report = tree.restore_tree(vault, 'ops', 'pk', str(out), 'etc/', workers=2)
+    assert (report['files'], report['failed']) == (3, 0)
+    for name in ['x.pem', 'a/y.conf', 'a/b/z.key']:
+        assert (out / name).read_bytes() == (src / name).read_bytes()
+
+    # Both resume: nothing is redone.
+    assert tree.TreeImport(vault, 'ops', str(src), 'etc/').run('pk')['skipped'] == 3
+    assert tree.restore_tree(vault, 'ops', 'pk', str(out), 'etc/')['skipped'] == 3
+
+def test_wrong_passkey_restores_nothing(vault, src, tmp_path):
+    tree.TreeImport(vault, 'ops', str(src)).run('pk')
+    report = tree.restore_tree(vault, 'ops', 'nope', str(tmp_path / 'out'))
+    assert (report['files'], report['failed']) == (0, 3)
+
+def test_failed_file_leaves_no_blob(vault, src, monkeypatch):
+    encrypt_stream = tree.encrypt_stream
+
+    def fail_on_key(key, source, dst, *args):
+        if source.name.endswith('z.key'):
+            dst.write(b'partial')
+            raise OSError("read error")
+        return encrypt_stream(key, source, dst, *args)
+
+    # Workers are forked, so they see the patch.
+    monkeypatch.setattr(tree, 'encrypt_stream', fail_on_key)
+    report = tree.TreeImport(vault, 'ops', str(src), workers=2).run('pk')
+    assert (report['files'], report['failed']) == (2, 1)
+    assert blobs(vault) == sorted(record['blob'] for record in vault.user_records('ops').values())
+
+def test_interrupted_batch_is_cleared(vault, src):
+    tree.TreeImport(vault, 'ops', str(src)).run('pk')
+    stray = os.path.join(vault.path(BLOB_DIR), 'stray.svs')
+    with open(stray, 'wb') as f:
+        f.write(b'x')
+    tree.write_json(vault.path(tree.CHECKPOINT_FILE), {'blobs': ['stray.svs']})
+
+    tree.TreeImport(vault, 'ops', str(src)).run('pk')
+    assert not os.path.exists(stray)
+    assert len(blobs(vault)) == 3
+
+def test_restore_refuses_escaping_names(vault, src, tmp_path):
+    tree.TreeImport(vault, 'ops', str(src)).run('pk')
+    data_id, record = next(iter(vault.user_records('ops').items()))
+    record['data_name'] = '../escaped'
+    vault.commit(records={data_id: record})
+    report = tree.restore_tree(vault, 'ops', 'pk', str(tmp_path / 'out'))
+    assert report['failed'] == 1
+    assert not (tmp_path / 'escaped').exists()
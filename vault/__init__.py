@@ -0,0 +1,12 @@
+"""Storage and crypto helpers for SecureVault Pro that do not depend on Streamlit."""
+
+__all__ = ['Vault']
+
+
+def __getattr__(name):
+    # Lazy, so `import vault.kdf` (and `python -m vault.kdf`) does not load
+    # the whole core first.
+    if name == 'Vault':
+        from vault.core import Vault
+        return Vault
+    raise AttributeError(f"module 'vault' has no attribute {name!r}")
@@ -0,0 +1,270 @@
+"""JSON API for the vault, as a plain ASGI application.
+
+Run with any ASGI server, e.g.:
+    VAULT_DATA_DIR=. uvicorn vault.api:app --workers 1
+
+Routes:
+    GET  /health
+    GET  /metrics                 Prometheus text format
+    POST /register                {"username", "password"}
+    POST /login                   {"username", "password"} -> {"token"}
+    GET  /records                 (Bearer token) -> [{"id", "data_name", "created_at", "kind"}]
+                                  ?q=&page=&page_size= for one page of name matches, newest first
+    POST /records                 (Bearer token) {"data_name", "secret", "passkey"} -> {"id"}
+    POST /records/{id}/decrypt    (Bearer token) {"passkey"} -> {"secret"} or the file, streamed
+    POST /records/{id}/passkey    (Bearer token) {"passkey", "new_passkey"}
+
+Record ids embed the data name, which may contain '/' (tree imports name
+records by relative path); the action is always the last path segment.
+Passkey attempts on a record are throttled per user and record like logins,
+and refused ones get a 429 before any hashing.
+"""
+import asyncio
+import json
+import os
+import secrets
+import threading
+import time
+from urllib.parse import parse_qs
+
+from vault.core import BUSY_MESSAGE, THROTTLED_MESSAGE, Vault
+from vault.kdf import KdfBusy
+from vault.ratelimit import Throttled
+from vault.search import PAGE_SIZE
+
+SESSION_TTL = 60 * 60
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# --- Sessions ---
+class Sessions:
+    """Bearer tokens for logged-in users, held in memory."""
+
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._tokens = {}
+
+    def create(self, username):
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self._tokens[token] = (username, time.monotonic() + self.ttl)
+        return token
+
+    def user_for(self, token):
+        with self._lock:
+            entry = self._tokens.get(token)
+            if entry is None:
+                return None
+            username, expires = entry
+            if time.monotonic() > expires:
+                del self._tokens[token]
+                return None
+            return username
+
+
+# --- Application ---
+class VaultApi:
+    """ASGI app; the Vault is opened on the first request, not at import time.
+
+    Handlers are coroutines, and every call that can block on the KDF pool or
+    the store runs in a worker thread, so slow logins do not hold up other
+    requests on the event loop.
+    """
+
+    def __init__(self, data_dir=None, backend=None):
+        self.data_dir = data_dir or os.environ.get('VAULT_DATA_DIR', '.')
+        self.backend = backend
+        self.sessions = Sessions()
+        self._vault = None
+        self._vault_lock = threading.Lock()
+
+    @property
+    def vault(self):
+        with self._vault_lock:
+            if self._vault is None:
+                self._vault = Vault(self.data_dir, self.backend)
+            return self._vault
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        try:
+            body = await self._read_body(receive)
+            result = await self._dispatch(scope, body)
+        except ApiError as e:
+            await self._send_json(send, e.status, {'error': e.message})
+            return
+        except KdfBusy:
+            await self._send_json(send, 429, {'error': BUSY_MESSAGE})
+            return
+        except Throttled as e:
+            await self._send_json(send, 429, {'error': str(e)})
+            return
+
+        if isinstance(result, tuple):
+            status, payload = result
+            await self._send_json(send, status, payload)
+        elif isinstance(result, str):
+            await self._send_text(send, result)
+        else:
+            await self._send_stream(send, result)
+
+    async def _dispatch(self, scope, body):
+        method = scope['method']
+        parts = [part for part in scope['path'].split('/') if part]
+        data_id, action = self._record_action(scope['path'])
+
+        if parts == ['health'] and method == 'GET':
+            return 200, {'status': 'ok'}
+        if parts == ['metrics'] and method == 'GET':
+            return self.vault.metrics_text()
+        if parts == ['register'] and method == 'POST':
+            data = self._json(body, 'username', 'password')
+            ok, message = await asyncio.to_thread(self.vault.register_user, data['username'], data['password'])
+            return (201 if ok else 400), {'ok': ok, 'message': message}
+        if parts == ['login'] and method == 'POST':
+            data = self._json(body, 'username', 'password')
+            client = (scope.get('client') or [None])[0]
+            ok, message = await asyncio.to_thread(self.vault.login_user, data['username'],
+                                                  data['password'], client)
+            if not ok:
+                status = 429 if message in (BUSY_MESSAGE, THROTTLED_MESSAGE) else 401
+                return status, {'ok': False, 'message': message}
+            return 200, {'ok': True, 'message': message, 'token': self.sessions.create(data['username'])}
+
+        username = self._authenticate(scope)
+        if parts == ['records'] and method == 'GET':
+            query = parse_qs(scope.get('query_string', b'').decode())
+            if query.keys() & {'q', 'page', 'page_size'}:
+                try:
+                    page = int(query.get('page', ['1'])[0])
+                    page_size = min(int(query.get('page_size', [PAGE_SIZE])[0]), 500)
+                except ValueError:
+                    raise ApiError(400, "page and page_size must be integers")
+                if page < 1 or page_size < 1:
+                    raise ApiError(400, "page and page_size must be at least 1")
+                records, _ = await asyncio.to_thread(self.vault.search_records, username,
+                                                     query.get('q', [''])[0], page, page_size)
+            else:
+                records = await asyncio.to_thread(self.vault.user_records, username)
+            return 200, [{'id': data_id, 'data_name': record['data_name'],
+                          'created_at': record['created_at'], 'kind': record.get('kind', 'text')}
+                         for data_id, record in records.items()]
+        if parts == ['records'] and method == 'POST':
+            data = self._json(body, 'data_name', 'secret', 'passkey')
+            data_id, _ = await asyncio.to_thread(self.vault.add_record, username, data['data_name'],
+                                                 data['passkey'], secret=data['secret'])
+            return 201, {'id': data_id}
+        if action == 'decrypt' and method == 'POST':
+            data = self._json(body, 'passkey')
+            record = await asyncio.to_thread(self.vault.unlock_record, username, data_id, data['passkey'])
+            if record is None:
+                raise ApiError(403, "Unknown record or incorrect passkey")
+            if record.get('kind') == 'file':
+                return self.vault.decrypt_file(record)
+            secret = await asyncio.to_thread(self.vault.decrypt_record, record)
+            if secret is None:
+                raise ApiError(500, "Decryption failed")
+            return 200, {'secret': secret}
+        if action == 'passkey' and method == 'POST':
+            data = self._json(body, 'passkey', 'new_passkey')
+            record = await asyncio.to_thread(self.vault.change_passkey, username, data_id,
+                                             data['passkey'], data['new_passkey'])
+            if record is None:
+                raise ApiError(403, "Unknown record or incorrect passkey")
+            return 200, {'ok': True}
+
+        raise ApiError(404, "Not found")
+
+    @staticmethod
+    def _record_action(path):
+        """(data_id, action) for /records/{id}/{action}, else (None, None)."""
+        if not path.startswith('/records/'):
+            return None, None
+        data_id, _, action = path[len('/records/'):].rpartition('/')
+        return (data_id, action) if data_id else (None, None)
+
+    def _authenticate(self, scope):
+        for name, value in scope.get('headers', []):
+            if name == b'authorization' and value.startswith(b'Bearer '):
+                username = self.sessions.user_for(value[7:].decode())
+                if username is not None:
+                    return username
+        raise ApiError(401, "Login required")
+
+    @staticmethod
+    def _json(body, *fields):
+        try:
+            data = json.loads(body or b'{}')
+        except json.JSONDecodeError:
+            raise ApiError(400, "Body must be JSON") from None
+        if not isinstance(data, dict):
+            raise ApiError(400, "Body must be a JSON object")
+        missing = [field for field in fields if not isinstance(data.get(field), str) or not data[field]]
+        if missing:
+            raise ApiError(400, f"Missing fields: {', '.join(missing)}")
+        return data
+
+    @staticmethod
+    async def _read_body(receive):
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                return body
+
+    @staticmethod
+    async def _send_json(send, status, payload):
+        body = json.dumps(payload).encode()
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json'),
+                                (b'content-length', str(len(body)).encode())]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    async def _send_text(send, text):
+        body = text.encode()
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'text/plain; version=0.0.4'),
+                                (b'content-length', str(len(body)).encode())]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    async def _send_stream(send, chunks):
+        # Decrypted file chunks go out one at a time; the plaintext is never
+        # assembled in memory.
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'application/octet-stream')]})
+        iterator = iter(chunks)
+        while True:
+            chunk = await asyncio.to_thread(next, iterator, None)
+            if chunk is None:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._vault is not None:
+                    self._vault.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+app = VaultApi()
@@ -0,0 +1,185 @@
+"""Compact binary vault format.
+
+Layout (all integers big-endian):
+    header   magic 'SVB1', version u16, users offset u64, records offset u64,
+             index offset u64, record count u32
+    users    one msgpack map {username: user}
+    records  per record: u32 length + msgpack [data_id, record map], with
+             encrypted_text as raw ciphertext bytes
+    index    u64 offset of each record, in record order
+
+Fernet tokens are stored, and kept in memory after loading, as raw bytes
+instead of base64 text (a quarter smaller), and loading decodes each record
+with msgpack instead of parsing one large JSON document.
+
+Convert an existing vault with:
+    python -m vault.binfmt to-binary [--data-dir .]
+    python -m vault.binfmt to-json   [--data-dir .]
+"""
+import argparse
+import base64
+import gc
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+
+from vault.storage import (BINARY_FILE, DATA_FILE, JOURNAL_FILE, USERS_FILE, JournalStore,
+                           StorageError, fsync_dir)
+
+try:
+    import msgpack
+except ImportError:  # optional: pip install msgpack
+    msgpack = None
+
+MAGIC = b'SVB1'
+VERSION = 1
+HEADER = struct.Struct('>4sHQQQI')
+LENGTH = struct.Struct('>I')
+
+
+def _require_msgpack():
+    if msgpack is None:
+        raise StorageError("The binary vault format needs msgpack: pip install msgpack")
+
+
+# --- Records ---
+def encode_record(data_id, record):
+    token = record.get('encrypted_text')
+    if isinstance(token, str):
+        record = dict(record, encrypted_text=base64.urlsafe_b64decode(token))
+    return msgpack.packb([data_id, record], use_bin_type=True)
+
+def decode_record(buf):
+    # encrypted_text stays as raw ciphertext bytes; Vault.decrypt_data and
+    # storage.json_default turn it back into a Fernet token when needed.
+    data_id, record = msgpack.unpackb(buf, raw=False)
+    return data_id, record
+
+
+# --- Files ---
+def write_vault(path, users, records):
+    """Write a complete binary vault atomically (temp file, fsync, rename)."""
+    _require_msgpack()
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    offsets = array('Q')
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\0' * HEADER.size)
+        users_offset = f.tell()
+        f.write(msgpack.packb(users, use_bin_type=True))
+        records_offset = f.tell()
+        for data_id, record in records.items():
+            body = encode_record(data_id, record)
+            offsets.append(f.tell())
+            f.write(LENGTH.pack(len(body)))
+            f.write(body)
+        index_offset = f.tell()
+        if sys.byteorder == 'little':
+            offsets.byteswap()
+        f.write(offsets.tobytes())
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, users_offset, records_offset, index_offset, len(offsets)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(path)
+
+def read_header(buf, path=''):
+    if len(buf) < HEADER.size:
+        raise StorageError(f"{path} is truncated")
+    magic, version, users_offset, records_offset, index_offset, count = HEADER.unpack_from(buf)
+    if magic != MAGIC or version != VERSION:
+        raise StorageError(f"{path} is not a version {VERSION} binary vault")
+    return users_offset, records_offset, index_offset, count
+
+def read_vault(path):
+    if not os.path.exists(path):
+        return {}, {}
+    _require_msgpack()
+    with open(path, 'rb') as f:
+        buf = memoryview(f.read())
+    users_offset, records_offset, index_offset, count = read_header(buf, path)
+    # Nothing decoded here can form a reference cycle, so skip the cyclic GC
+    # passes that would otherwise run repeatedly while the records are built.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        users = msgpack.unpackb(buf[users_offset:records_offset], raw=False)
+        records = {}
+        offset = records_offset
+        for _ in range(count):
+            (length,) = LENGTH.unpack_from(buf, offset)
+            data_id, record = decode_record(buf[offset + LENGTH.size:offset + LENGTH.size + length])
+            records[data_id] = record
+            offset += LENGTH.size + length
+    except (ValueError, struct.error, msgpack.UnpackException) as e:
+        raise StorageError(f"{path} is corrupt: {e}") from e
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return users, records
+
+
+# --- Binary Store ---
+class BinaryStore(JournalStore):
+    """JournalStore whose snapshot is a single binary vault file."""
+
+    def __init__(self, binary_file, journal_file, **kwargs):
+        _require_msgpack()
+        super().__init__(None, None, journal_file, **kwargs)
+        self.binary_file = binary_file
+
+    def read_snapshot(self):
+        return read_vault(self.binary_file)
+
+    def write_snapshot(self, users, records):
+        write_vault(self.binary_file, users, records)
+
+    def snapshot_files(self):
+        return [self.binary_file]
+
+    def migrate_from(self, other):
+        """Build the binary snapshot from another store if it does not exist yet."""
+        if not os.path.exists(self.binary_file):
+            self.write_snapshot(*other.load())
+
+
+# --- Converter ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m vault.binfmt', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('direction', choices=['to-binary', 'to-json'])
+    parser.add_argument('--data-dir', default='.')
+    args = parser.parse_args(argv)
+
+    def path(name):
+        return os.path.join(args.data_dir, name)
+
+    json_store = JournalStore(path(USERS_FILE), path(DATA_FILE), path(JOURNAL_FILE))
+    binary_store = BinaryStore(path(BINARY_FILE), path(f"{BINARY_FILE}.journal"))
+    source, target = ((json_store, binary_store) if args.direction == 'to-binary'
+                      else (binary_store, json_store))
+
+    started = time.perf_counter()
+    users, records = source.load()
+    source_seconds = time.perf_counter() - started
+    target.write_snapshot(users, records)
+    # The target's journal is superseded by the snapshot just written.
+    for stale in (target.journal_file, target.rotated_file):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    started = time.perf_counter()
+    target.load()
+    target_seconds = time.perf_counter() - started
+    sizes = [sum(os.path.getsize(p) for p in store.snapshot_files() if os.path.exists(p))
+             for store in (source, target)]
+    print(f"{len(users)} users, {len(records)} records converted {args.direction}")
+    print(f"load: {source_seconds * 1000:.1f} ms -> {target_seconds * 1000:.1f} ms; "
+          f"size: {sizes[0]:,} -> {sizes[1]:,} bytes")
+
+
+if __name__ == '__main__':
+    main()
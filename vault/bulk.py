@@ -0,0 +1,163 @@
+"""Bulk import/export of secrets from CSV or JSONL.
+
+Usage:
+    python -m vault.bulk import --user alice secrets.csv
+    python -m vault.bulk export --user alice --passkeys passkeys.csv -o secrets.jsonl
+
+Import rows need `data_name`, `secret` and `passkey` columns. Export takes
+rows with `data_name` and `passkey` (or a single --passkey for everything)
+and writes the decrypted secrets as JSONL.
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from vault.core import Vault
+from vault.kdf import digests_match, format_hash, new_salt, parse_hash
+
+
+# --- Row Parsing ---
+def read_rows(source, name=''):
+    """Parse CSV or JSONL rows from a path or a binary/text file object."""
+    if isinstance(source, str):
+        name = source
+        with open(source, 'rb') as f:
+            return read_rows(f, name)
+    text = source.read()
+    if isinstance(text, bytes):
+        text = text.decode('utf-8-sig')
+    if name.lower().endswith(('.jsonl', '.ndjson', '.json')):
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+# --- Bulk Encrypt ---
+def bulk_encrypt(rows, vault, username, workers=None):
+    """Encrypt rows into new records; returns ({data_id: record}, report).
+
+    Passkeys are hashed in parallel on the KDF pool while the secrets are
+    encrypted on a thread pool. Nothing is persisted: the caller commits the
+    returned records in a single transaction.
+    """
+    started = time.perf_counter()
+    for row in rows:
+        missing = [field for field in ('data_name', 'secret', 'passkey') if not row.get(field)]
+        if missing:
+            raise ValueError(f"Row {row.get('data_name')!r} is missing {', '.join(missing)}")
+
+    salts = [new_salt() for _ in rows]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        sealed = pool.map(lambda row: vault.seal_text(row['secret']), rows)
+        # timeout=None waits for pool slots: a batch applies backpressure to
+        # itself instead of being rejected halfway through.
+        hash_futures = [vault.kdf.submit(row['passkey'], salt, timeout=None, **vault.kdf_policy)
+                        for row, salt in zip(rows, salts)]
+        sealed = list(sealed)
+
+    records = {}
+    for index, (row, salt, future, (token, sizes)) in enumerate(zip(rows, salts, hash_futures, sealed)):
+        now = datetime.now()
+        data_id = f"{username}_{row['data_name']}_{now.timestamp()}_{index}"
+        records[data_id] = {
+            'username': username,
+            'data_name': row['data_name'],
+            'encrypted_text': token,
+            'passkey_hash': format_hash(salt, future.result(), **vault.kdf_policy),
+            'created_at': now.isoformat(),
+            **sizes
+        }
+    return records, _report(len(records), started)
+
+
+# --- Bulk Decrypt ---
+def bulk_decrypt(records, passkeys, vault, workers=None):
+    """Decrypt every record whose passkey is supplied and verifies.
+
+    `passkeys` maps data_name to passkey, or is a single passkey for all
+    records. Returns (rows, report); rows hold data_id, data_name, secret.
+    """
+    started = time.perf_counter()
+    candidates = []
+    for data_id, record in records.items():
+        passkey = passkeys if isinstance(passkeys, str) else passkeys.get(record['data_name'])
+        parsed = parse_hash(record.get('passkey_hash'))
+        if passkey and record.get('kind') != 'file' and parsed is not None:
+            algorithm, params, salt, expected = parsed
+            future = vault.kdf.submit(passkey, salt, timeout=None, algorithm=algorithm, params=params)
+            candidates.append((data_id, record, expected, future))
+
+    def decrypt(candidate):
+        data_id, record, expected, future = candidate
+        if not digests_match(expected, future.result()):
+            return None
+        secret = vault.decrypt_record(record)
+        if secret is None:
+            return None
+        return {'data_id': data_id, 'data_name': record['data_name'], 'secret': secret}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        rows = [row for row in pool.map(decrypt, candidates) if row is not None]
+    report = _report(len(rows), started)
+    report['skipped'] = len(records) - len(rows)
+    return rows, report
+
+def _report(count, started):
+    seconds = time.perf_counter() - started
+    return {'records': count, 'seconds': seconds,
+            'records_per_sec': count / seconds if seconds else 0.0}
+
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m vault.bulk', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['import', 'export'])
+    parser.add_argument('source', nargs='?', help="CSV/JSONL file to import")
+    parser.add_argument('--user', required=True)
+    parser.add_argument('--passkeys', help="CSV/JSONL of data_name,passkey for export")
+    parser.add_argument('--passkey', help="Single passkey for every exported record")
+    parser.add_argument('-o', '--output', help="Export destination (default: stdout)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--backend', default=None, help="sqlite or journal (default: $VAULT_BACKEND)")
+    parser.add_argument('--data-dir', default='.')
+    args = parser.parse_intermixed_args(argv)
+
+    vault = Vault(args.data_dir, args.backend)
+    if not vault.has_user(args.user):
+        parser.error(f"Unknown user {args.user!r}")
+
+    try:
+        if args.command == 'import':
+            if not args.source:
+                parser.error("import needs a source file")
+            new_records, report = bulk_encrypt(read_rows(args.source), vault, args.user, args.workers)
+            vault.commit(records=new_records)
+        else:
+            if args.passkey:
+                passkeys = args.passkey
+            elif args.passkeys:
+                passkeys = {row['data_name']: row['passkey'] for row in read_rows(args.passkeys)}
+            else:
+                parser.error("export needs --passkeys or --passkey")
+            rows, report = bulk_decrypt(vault.user_records(args.user), passkeys, vault, args.workers)
+            out = open(args.output, 'w') if args.output else sys.stdout
+            try:
+                for row in rows:
+                    out.write(json.dumps(row) + '\n')
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+    finally:
+        vault.close()
+
+    print(f"{args.command}: {report['records']} records in {report['seconds']:.2f}s "
+          f"({report['records_per_sec']:.1f} records/sec)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
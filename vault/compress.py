@@ -0,0 +1,56 @@
+import lzma
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional: pip install zstandard
+    zstandard = None
+
+# Compressed plaintexts start with MAGIC, a format version byte and an
+# algorithm byte. Records written before compression existed are bare UTF-8
+# text, which never starts with a NUL byte, so both decode side by side.
+MAGIC = b'\x00SV'
+FORMAT_VERSION = 1
+DEFAULT_THRESHOLD = 512
+
+
+def _zstd_compress(data):
+    return zstandard.ZstdCompressor(level=10).compress(data)
+
+def _zstd_decompress(data):
+    return zstandard.ZstdDecompressor().decompress(data)
+
+CODECS = {
+    'zlib': (1, lambda data: zlib.compress(data, 6), zlib.decompress),
+    'lzma': (2, lzma.compress, lzma.decompress),
+    'zstd': (3, _zstd_compress, _zstd_decompress),
+}
+CODEC_IDS = {codec_id: name for name, (codec_id, _, _) in CODECS.items()}
+
+
+def available():
+    return [name for name in CODECS if name != 'zstd' or zstandard is not None]
+
+def pack(data, algorithm='zlib', threshold=DEFAULT_THRESHOLD):
+    """Compress `data` ahead of encryption; returns (payload, algorithm or None).
+
+    Payloads under `threshold` bytes, or that do not shrink, are returned as is.
+    """
+    if not algorithm or algorithm == 'none' or len(data) < threshold:
+        return data, None
+    if algorithm not in available():
+        raise ValueError(f"Compression {algorithm!r} is not available")
+    codec_id, compress, _ = CODECS[algorithm]
+    packed = MAGIC + bytes([FORMAT_VERSION, codec_id]) + compress(data)
+    if len(packed) >= len(data):
+        return data, None
+    return packed, algorithm
+
+def unpack(payload):
+    if not payload.startswith(MAGIC):
+        return payload
+    version, codec_id = payload[len(MAGIC)], payload[len(MAGIC) + 1]
+    if version != FORMAT_VERSION or codec_id not in CODEC_IDS:
+        raise ValueError(f"Unknown payload format {version}/{codec_id}")
+    _, _, decompress = CODECS[CODEC_IDS[codec_id]]
+    return decompress(payload[len(MAGIC) + 2:])
@@ -0,0 +1,426 @@
+import base64
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from cryptography.fernet import Fernet
+
+from vault import compress
+from vault.kdf import (KDF_FILE, KdfBusy, KdfExecutor, digests_match, format_hash, load_policy,
+                       new_salt, parse_hash)
+from vault.keys import KeyRing
+from vault.metrics import METRICS, timed
+from vault.ratelimit import RateLimiter, Throttled
+from vault.search import PAGE_SIZE
+from vault.shared import ShardedVault, SharedVault
+from vault.storage import open_store
+from vault.stream import decrypt_stream, encrypt_stream
+from vault.writebehind import MAX_LOSS_WINDOW, WriteBehindStore
+
+# --- File Paths ---
+RATELIMIT_FILE = 'ratelimit.json'
+PASSKEY_RATELIMIT_FILE = 'passkey_ratelimit.json'
+BLOB_DIR = 'vault_blobs'
+
+# --- Policy ---
+MAX_FAILED_ATTEMPTS = 3
+LOCKOUT_PERIOD = timedelta(minutes=5)
+MIN_PASSWORD_LENGTH = 6
+# When the KDF queue stays full for this long the request is rejected with
+# BUSY_MESSAGE instead of queueing forever.
+KDF_QUEUE_TIMEOUT = 0.5
+BUSY_MESSAGE = "Server is busy, please try again in a moment"
+THROTTLED_MESSAGE = "Too many login attempts, please try again later"
+PASSKEY_THROTTLED_MESSAGE = "Too many passkey attempts, please try again later"
+# Text payloads are compressed before encryption once they reach the
+# threshold; 'none' turns this off. zstd needs the optional zstandard package.
+COMPRESSION = os.environ.get('VAULT_COMPRESSION', 'zlib')
+COMPRESSION_THRESHOLD = int(os.environ.get('VAULT_COMPRESSION_MIN_BYTES', compress.DEFAULT_THRESHOLD))
+# Write-behind acknowledges saves from memory and flushes them in the
+# background; at most WRITE_BEHIND_MAX_LOSS seconds of changes are at risk.
+WRITE_BEHIND = os.environ.get('VAULT_WRITE_BEHIND', '0') == '1'
+WRITE_BEHIND_MAX_LOSS = float(os.environ.get('VAULT_WRITE_BEHIND_MAX_LOSS', MAX_LOSS_WINDOW))
+
+
+# --- Vault ---
+class Vault:
+    """Users, records, crypto and storage for one data directory.
+
+    Nothing here imports Streamlit, so the UI, the API server, the bulk CLI
+    and benchmarks all share this class. The store, the in-memory cache and
+    the KDF process pool are created on first use to keep startup cheap.
+    """
+
+    def __init__(self, data_dir='.', backend=None, kdf_timeout=KDF_QUEUE_TIMEOUT, kdf_workers=None,
+                 compression=COMPRESSION, compression_threshold=COMPRESSION_THRESHOLD,
+                 write_behind=WRITE_BEHIND, write_behind_max_loss=WRITE_BEHIND_MAX_LOSS):
+        self.data_dir = data_dir
+        self.backend = backend or os.environ.get('VAULT_BACKEND', 'sqlite')
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        self.kdf_timeout = kdf_timeout
+        self.kdf_workers = kdf_workers
+        self.write_behind = write_behind
+        self.write_behind_max_loss = write_behind_max_loss
+        self.keyring = KeyRing(data_dir)
+        # Parameters for new hashes; older ones are upgraded on login.
+        self.kdf_algorithm, self.kdf_params = load_policy(self.path(KDF_FILE))
+        self._lock = threading.Lock()
+        self._store = None
+        self._data = None
+        self._kdf = None
+        self._limiter = None
+        self._passkey_limiter = None
+
+    def path(self, name):
+        return os.path.join(self.data_dir, name)
+
+    @property
+    def cipher(self):
+        # MultiFernet: encrypts under the primary key, decrypts under any.
+        return self.keyring.cipher
+
+    @property
+    def fernet_key(self):
+        return self.keyring.primary_key
+
+    @property
+    def store(self):
+        with self._lock:
+            if self._store is None:
+                self._store = open_store(self.backend, self.data_dir)
+                if self.write_behind:
+                    self._store = WriteBehindStore(
+                        self._store, max_loss_window=self.write_behind_max_loss)
+            return self._store
+
+    @property
+    def data(self):
+        store = self.store
+        with self._lock:
+            if self._data is None:
+                # Sharded stores load record shards per user, on first use.
+                cache = ShardedVault if hasattr(store, 'shard_for') else SharedVault
+                self._data = cache(store)
+            return self._data
+
+    @property
+    def kdf(self):
+        with self._lock:
+            if self._kdf is None:
+                self._kdf = KdfExecutor(max_workers=self.kdf_workers)
+            return self._kdf
+
+    @property
+    def limiter(self):
+        with self._lock:
+            if self._limiter is None:
+                self._limiter = RateLimiter(self.path(RATELIMIT_FILE), max_failures=MAX_FAILED_ATTEMPTS,
+                                            window=LOCKOUT_PERIOD.total_seconds(),
+                                            lockout=LOCKOUT_PERIOD.total_seconds())
+            return self._limiter
+
+    @property
+    def passkey_limiter(self):
+        # Record passkeys are throttled like logins, in a limiter of their own
+        # keyed on user and record, so they never lock the account itself.
+        with self._lock:
+            if self._passkey_limiter is None:
+                self._passkey_limiter = RateLimiter(self.path(PASSKEY_RATELIMIT_FILE),
+                                                    max_failures=MAX_FAILED_ATTEMPTS,
+                                                    window=LOCKOUT_PERIOD.total_seconds(),
+                                                    lockout=LOCKOUT_PERIOD.total_seconds())
+            return self._passkey_limiter
+
+    def close(self):
+        with self._lock:
+            for limiter in (self._limiter, self._passkey_limiter):
+                if limiter is not None:
+                    limiter.close()
+            if self._kdf is not None:
+                self._kdf.shutdown()
+            if self._store is not None:
+                self._store.close()
+
+    # --- Metrics ---
+    def gauges(self):
+        """Current load of the components started so far, for the metrics export."""
+        gauges = {}
+        if self._kdf is not None:
+            stats = self._kdf.stats()
+            gauges.update({'kdf_queue_depth': stats['queue_depth'], 'kdf_capacity': stats['capacity'],
+                           'kdf_rejected': stats['rejected']})
+        if self._limiter is not None:
+            stats = self._limiter.stats()
+            gauges.update({'ratelimit_locked_accounts': stats['locked_accounts'],
+                           'ratelimit_throttled': stats['throttled']})
+        if isinstance(self._store, WriteBehindStore):
+            gauges['write_behind_pending'] = self._store.stats()['pending']
+        return gauges
+
+    def metrics_text(self):
+        return METRICS.prometheus(self.gauges())
+
+    # --- Storage ---
+    @timed('refresh')
+    def refresh(self):
+        self.keyring.refresh()
+        self.data.refresh()
+
+    @timed('commit')
+    def commit(self, users=None, records=None):
+        self.data.commit(users=users, records=records)
+
+    def get_user(self, username):
+        return self.data.get_user(username)
+
+    def has_user(self, username):
+        return self.data.has_user(username)
+
+    def get_record(self, data_id, username=None):
+        return self.data.get_record(data_id, username)
+
+    def user_records(self, username):
+        return self.data.user_records(username)
+
+    def records_version(self, username):
+        return self.data.records_version(username)
+
+    def records_since(self, username, version):
+        return self.data.records_since(username, version)
+
+    def search_records(self, username, query='', page=1, page_size=PAGE_SIZE, newest_first=True):
+        """One page of a user's records matching `query`, by created_at; returns (records, total)."""
+        return self.data.search(username, query, page, page_size, newest_first)
+
+    # --- Crypto ---
+    @property
+    def kdf_policy(self):
+        return {'algorithm': self.kdf_algorithm, 'params': self.kdf_params}
+
+    @timed('hash_passkey')
+    def hash_passkey(self, passkey, salt=None):
+        if salt is None:
+            salt = new_salt()
+        hashed = self.kdf.derive(passkey, salt, timeout=self.kdf_timeout, **self.kdf_policy)
+        return format_hash(salt, hashed, **self.kdf_policy)
+
+    @timed('verify_password')
+    def verify_password(self, stored_password, provided_password):
+        parsed = parse_hash(stored_password)
+        if parsed is None:
+            return False
+        algorithm, params, salt, expected = parsed
+        actual = self.kdf.derive(provided_password, salt, timeout=self.kdf_timeout,
+                                 algorithm=algorithm, params=params)
+        return digests_match(expected, actual)
+
+    def needs_rehash(self, stored_password):
+        """True when a hash is in the legacy format or uses other than the current parameters."""
+        parsed = parse_hash(stored_password)
+        return (parsed is None or not stored_password.startswith('$')
+                or parsed[:2] != (self.kdf_algorithm, self.kdf_params))
+
+    @timed('encrypt_data')
+    def encrypt_data(self, text):
+        """Encrypt directly under the primary key (no data key); pairs with decrypt_data."""
+        payload, _ = compress.pack(text.encode(), self.compression, self.compression_threshold)
+        return self.cipher.encrypt(payload).decode()
+
+    @timed('seal_text')
+    def seal_text(self, text):
+        """Compress (when worthwhile) and encrypt under a new data key; returns (token, record fields).
+
+        The fields include the wrapped data key, so rotating the master key
+        only has to re-wrap that, never the payload.
+        """
+        data = text.encode()
+        payload, algorithm = compress.pack(data, self.compression, self.compression_threshold)
+        data_key, wrapped_key = self.keyring.new_data_key()
+        token = Fernet(data_key).encrypt(payload).decode()
+        return token, {'compression': algorithm, 'plain_size': len(data), 'stored_size': len(token),
+                       'key_version': self.keyring.primary, 'wrapped_key': wrapped_key}
+
+    @timed('decrypt_data')
+    def decrypt_data(self, encrypted_text, cipher=None):
+        # Binary vaults hold raw ciphertext bytes rather than the base64 token.
+        if isinstance(encrypted_text, bytes):
+            token = base64.urlsafe_b64encode(encrypted_text)
+        else:
+            token = encrypted_text.encode()
+        try:
+            return compress.unpack((cipher or self.cipher).decrypt(token)).decode()
+        except Exception:
+            return None
+
+    def record_ciphertext(self, record):
+        """A text record's ciphertext, fetched from the store if load() left it out."""
+        if 'encrypted_text' in record:
+            return record['encrypted_text']
+        return self.store.fetch_ciphertext(record)
+
+    def record_key(self, record):
+        """The key a record's payload is encrypted under.
+
+        Records from before envelope encryption have no wrapped_key and were
+        encrypted directly under their master key.
+        """
+        if 'wrapped_key' in record:
+            return self.keyring.unwrap(record['wrapped_key'])
+        return self.keyring.key(record.get('key_version'))
+
+    @timed('decrypt_record')
+    def decrypt_record(self, record):
+        try:
+            cipher = Fernet(self.record_key(record))
+        except Exception:
+            return None
+        return self.decrypt_data(self.record_ciphertext(record), cipher)
+
+    def encrypt_file(self, src):
+        """Encrypt a file object chunk by chunk into the blob directory.
+
+        Returns (blob_name, size, wrapped data key).
+        """
+        blob_dir = self.path(BLOB_DIR)
+        os.makedirs(blob_dir, exist_ok=True)
+        blob_name = f"{uuid.uuid4().hex}.svs"
+        data_key, wrapped_key = self.keyring.new_data_key()
+        with open(os.path.join(blob_dir, blob_name), 'wb') as dst:
+            size = encrypt_stream(data_key, src, dst)
+        return blob_name, size, wrapped_key
+
+    def decrypt_file(self, record):
+        """Yield a file record's plaintext chunk by chunk."""
+        data_key = self.record_key(record)
+        with open(os.path.join(self.path(BLOB_DIR), record['blob']), 'rb') as src:
+            yield from decrypt_stream(data_key, src)
+
+    # --- Authentication ---
+    @timed('register_user')
+    def register_user(self, username, password):
+        if self.has_user(username):
+            return False, "Username already exists"
+        if len(password) < MIN_PASSWORD_LENGTH:
+            return False, f"Password must be at least {MIN_PASSWORD_LENGTH} characters"
+
+        try:
+            password_hash = self.hash_passkey(password)
+        except KdfBusy:
+            return False, BUSY_MESSAGE
+
+        user = {
+            'password_hash': password_hash,
+            'registered_at': datetime.now().isoformat(),
+            'last_login': None
+        }
+        self.commit(users={username: user})
+        return True, "Registration successful"
+
+    @timed('login_user')
+    def login_user(self, username, password, client=None):
+        """Check a password; `client` (an address) is throttled along with the username.
+
+        Throttling and lockouts live in self.limiter, so failed attempts never
+        write to the users table and rejected ones never reach the KDF.
+        """
+        allowed, locked, retry_after = self.limiter.check(username, client)
+        if locked:
+            METRICS.incr('login_locked')
+            return False, f"Account locked. Try again in {int(retry_after) // 60} minutes"
+        if not allowed:
+            METRICS.incr('login_throttled')
+            return False, THROTTLED_MESSAGE
+
+        user = self.get_user(username)
+        try:
+            # Unknown usernames fail like wrong passwords, lockout included.
+            valid = user is not None and self.verify_password(user['password_hash'], password)
+        except KdfBusy:
+            METRICS.incr('kdf_busy')
+            return False, BUSY_MESSAGE
+
+        if valid:
+            METRICS.incr('login_success')
+            self.limiter.record_success(username)
+            if self.needs_rehash(user['password_hash']):
+                try:
+                    user['password_hash'] = self.hash_passkey(password)
+                except KdfBusy:
+                    pass  # keep the old hash; the upgrade is retried next login
+            user['last_login'] = datetime.now().isoformat()
+            self.commit(users={username: user})
+            return True, "Login successful"
+
+        METRICS.incr('login_failure')
+        attempts_left, locked_for = self.limiter.record_failure(username)
+        if locked_for:
+            return False, f"Too many failed attempts. Account locked for {int(locked_for) // 60} minutes."
+        return False, f"Invalid username or password. {attempts_left} attempts remaining"
+
+    # --- Records ---
+    @timed('add_record')
+    def add_record(self, username, data_name, passkey, secret=None, file=None, file_name=None):
+        """Encrypt and store a text secret or a file object; returns (data_id, record).
+
+        Raises KdfBusy when the passkey cannot be hashed right now.
+        """
+        record = {
+            'username': username,
+            'data_name': data_name,
+            'passkey_hash': self.hash_passkey(passkey),
+            'created_at': datetime.now().isoformat()
+        }
+        if file is not None:
+            blob_name, size, wrapped_key = self.encrypt_file(file)
+            record.update({'kind': 'file', 'file_name': file_name or data_name,
+                           'blob': blob_name, 'size': size, 'key_version': self.keyring.primary,
+                           'wrapped_key': wrapped_key})
+        else:
+            record['encrypted_text'], sizes = self.seal_text(secret)
+            record.update(sizes)
+
+        data_id = f"{username}_{data_name}_{datetime.now().timestamp()}"
+        self.commit(records={data_id: record})
+        return data_id, record
+
+    @timed('unlock_record')
+    def unlock_record(self, username, data_id, passkey):
+        """Check the passkey of one of the user's records; returns the record or None.
+
+        Attempts go through self.passkey_limiter first, per user and record:
+        raises Throttled when one is refused (too fast, or locked after
+        repeated wrong passkeys), KdfBusy when the passkey cannot be checked
+        right now.
+        """
+        key = f"{username}:{data_id}"
+        allowed, locked, retry_after = self.passkey_limiter.check(key)
+        if locked:
+            METRICS.incr('unlock_locked')
+            raise Throttled(f"Record locked. Try again in {int(retry_after) // 60} minutes", retry_after)
+        if not allowed:
+            METRICS.incr('unlock_throttled')
+            raise Throttled(PASSKEY_THROTTLED_MESSAGE, retry_after)
+        record = self.get_record(data_id, username)
+        # Unknown ids count as failures too, so probing for them is throttled.
+        if (record is None or record.get('username') != username
+                or not self.verify_password(record['passkey_hash'], passkey)):
+            self.passkey_limiter.record_failure(key)
+            return None
+        self.passkey_limiter.record_success(key)
+        return record
+
+    def change_passkey(self, username, data_id, passkey, new_passkey):
+        """Replace a record's passkey; returns the updated record, or None if the old one is wrong.
+
+        Only the passkey hash is rewritten: the payload stays encrypted under
+        its data key, whatever its size. Raises Throttled and KdfBusy like
+        unlock_record.
+        """
+        record = self.unlock_record(username, data_id, passkey)
+        if record is None:
+            return None
+        record['passkey_hash'] = self.hash_passkey(new_passkey)
+        self.commit(records={data_id: record})
+        return record
@@ -0,0 +1,245 @@
+"""Password hashing: pluggable KDFs, a self-describing hash format and a process pool.
+
+Hashes are stored as `$<algorithm>$<k=v,...>$<salt>$<hex digest>`, e.g.
+    $pbkdf2-sha256$i=100000$9f2c...$4be1...
+    $scrypt$n=16384,r=8,p=1$9f2c...$77a0...
+Hashes from before this format (`<salt>$<hex>`) are PBKDF2-SHA256 with
+100,000 iterations and keep verifying; they are upgraded on the next login.
+
+Pick parameters for this hardware with:
+    python -m vault.kdf calibrate [--algorithm scrypt] [--target-ms 250] [--data-dir .]
+which writes them to kdf.json in the data directory.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from vault.metrics import percentile
+
+try:
+    from argon2.low_level import Type as Argon2Type
+    from argon2.low_level import hash_secret_raw
+except ImportError:  # optional: pip install argon2-cffi
+    hash_secret_raw = None
+
+ITERATIONS = 100000
+KDF_FILE = 'kdf.json'
+DEFAULT_ALGORITHM = os.environ.get('VAULT_KDF', 'pbkdf2-sha256')
+DEFAULT_PARAMS = {
+    'pbkdf2-sha256': {'i': ITERATIONS},
+    'scrypt': {'n': 2 ** 14, 'r': 8, 'p': 1},
+    'argon2id': {'t': 3, 'm': 65536, 'p': 1},
+}
+DEFAULT_TARGET_MS = 250
+
+
+class KdfBusy(Exception):
+    """Raised when the KDF queue is full and the caller should retry later."""
+
+
+# --- Algorithms ---
+def pbkdf2_hex(passkey, salt, iterations=ITERATIONS):
+    return hashlib.pbkdf2_hmac('sha256', passkey.encode(), salt.encode(), iterations).hex()
+
+def scrypt_hex(passkey, salt, n, r, p):
+    # OpenSSL refuses anything above maxmem; allow what these parameters need.
+    maxmem = 2 * 128 * r * (n + p + 2)
+    return hashlib.scrypt(passkey.encode(), salt=salt.encode(), n=n, r=r, p=p,
+                          maxmem=maxmem, dklen=32).hex()
+
+def argon2_hex(passkey, salt, t, m, p):
+    if hash_secret_raw is None:
+        raise ValueError("argon2id needs the argon2-cffi package")
+    return hash_secret_raw(passkey.encode(), salt.encode(), time_cost=t, memory_cost=m,
+                           parallelism=p, hash_len=32, type=Argon2Type.ID).hex()
+
+ALGORITHMS = {
+    'pbkdf2-sha256': lambda passkey, salt, params: pbkdf2_hex(passkey, salt, params['i']),
+    'scrypt': lambda passkey, salt, params: scrypt_hex(passkey, salt, params['n'], params['r'], params['p']),
+    'argon2id': lambda passkey, salt, params: argon2_hex(passkey, salt, params['t'], params['m'], params['p']),
+}
+
+
+def available():
+    return [name for name in ALGORITHMS if name != 'argon2id' or hash_secret_raw is not None]
+
+def derive_hex(passkey, salt, algorithm=DEFAULT_ALGORITHM, params=None):
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown KDF {algorithm!r}")
+    return ALGORITHMS[algorithm](passkey, salt, params or DEFAULT_PARAMS[algorithm])
+
+
+# --- Hash Format ---
+def new_salt():
+    return os.urandom(16).hex()
+
+def format_hash(salt, digest, algorithm=DEFAULT_ALGORITHM, params=None):
+    params = params or DEFAULT_PARAMS[algorithm]
+    encoded = ','.join(f"{key}={value}" for key, value in params.items())
+    return f"${algorithm}${encoded}${salt}${digest}"
+
+def parse_hash(stored):
+    """Split a stored hash into (algorithm, params, salt, digest); None if unreadable."""
+    if not stored or '$' not in stored:
+        return None
+    parts = stored.split('$')
+    if len(parts) == 2:
+        salt, digest = parts
+        return 'pbkdf2-sha256', {'i': ITERATIONS}, salt, digest
+    if len(parts) != 5 or parts[0] or parts[1] not in ALGORITHMS:
+        return None
+    try:
+        params = {key: int(value) for key, value in
+                  (item.split('=') for item in parts[2].split(','))}
+    except ValueError:
+        return None
+    return parts[1], params, parts[3], parts[4]
+
+def digests_match(expected, actual):
+    return hmac.compare_digest(expected.encode(), actual.encode())
+
+def load_policy(path):
+    """(algorithm, params) for new hashes: calibrated kdf.json, else the defaults."""
+    if os.path.exists(path):
+        with open(path) as f:
+            policy = json.load(f)
+        return policy['algorithm'], policy['params']
+    return DEFAULT_ALGORITHM, dict(DEFAULT_PARAMS[DEFAULT_ALGORITHM])
+
+
+# --- KDF Executor ---
+class KdfExecutor:
+    """Runs key derivations in a process pool behind a bounded queue.
+
+    At most `max_pending` derivations may be queued or running; further
+    submissions wait up to `timeout` seconds for a slot and then raise KdfBusy,
+    so a burst of logins is shed instead of stalling every session.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, latency_window=1000):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 4
+        self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def submit(self, passkey, salt, timeout=0, algorithm=DEFAULT_ALGORITHM, params=None):
+        """Queue one derivation and return a Future for its hex digest.
+
+        `timeout=None` waits for a free slot instead of raising KdfBusy.
+        """
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self.rejected += 1
+            raise KdfBusy("Too many password checks in progress")
+        started = time.perf_counter()
+        try:
+            future = self._pool.submit(derive_hex, passkey, salt, algorithm, params)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._pending += 1
+        future.add_done_callback(lambda _: self._finished(started))
+        return future
+
+    def derive(self, passkey, salt, timeout=0, algorithm=DEFAULT_ALGORITHM, params=None):
+        return self.submit(passkey, salt, timeout, algorithm, params).result()
+
+    def stats(self):
+        with self._lock:
+            latencies = list(self._latencies)
+            return {
+                'workers': self.max_workers,
+                'capacity': self.max_pending,
+                'queue_depth': self._pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+    def _finished(self, started):
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+            self._latencies.append(time.perf_counter() - started)
+        self._slots.release()
+
+
+# --- Calibration ---
+def time_derivation(algorithm, params, rounds=3):
+    """Best-of-`rounds` seconds for one derivation with these parameters."""
+    salt = new_salt()
+    best = float('inf')
+    for _ in range(rounds):
+        started = time.perf_counter()
+        derive_hex('calibration passkey', salt, algorithm, params)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def calibrate(algorithm, target_ms=DEFAULT_TARGET_MS):
+    """Find parameters whose derivation takes about `target_ms` on this machine."""
+    target = target_ms / 1000
+    if algorithm == 'pbkdf2-sha256':
+        # Cost is linear in the iteration count; scale a short probe.
+        probe = time_derivation(algorithm, {'i': 20000})
+        params = {'i': max(10000, int(20000 * target / probe) // 1000 * 1000)}
+    elif algorithm == 'scrypt':
+        # n must be a power of two: take the largest one that stays on target.
+        params = {'n': 2 ** 12, 'r': 8, 'p': 1}
+        while time_derivation(algorithm, dict(params, n=params['n'] * 2), rounds=1) <= target:
+            params['n'] *= 2
+    elif algorithm == 'argon2id':
+        # Keep 64 MiB of memory hardness and raise the pass count.
+        params = {'t': 1, 'm': 65536, 'p': 1}
+        while time_derivation(algorithm, dict(params, t=params['t'] + 1), rounds=1) <= target:
+            params['t'] += 1
+    else:
+        raise ValueError(f"Unknown KDF {algorithm!r}")
+    return params, time_derivation(algorithm, params)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m vault.kdf', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['calibrate'])
+    parser.add_argument('--algorithm', choices=list(ALGORITHMS), default=DEFAULT_ALGORITHM)
+    parser.add_argument('--target-ms', type=float, default=DEFAULT_TARGET_MS,
+                        help="Time one login may spend hashing on one core")
+    parser.add_argument('--data-dir', default='.')
+    parser.add_argument('--dry-run', action='store_true', help="Report without writing kdf.json")
+    args = parser.parse_args(argv)
+
+    if args.algorithm not in available():
+        parser.error(f"{args.algorithm} is not available here (missing optional package)")
+    params, seconds = calibrate(args.algorithm, args.target_ms)
+    workers = os.cpu_count() or 1
+    print(f"{args.algorithm} {params}: {seconds * 1000:.0f} ms per hash, "
+          f"about {workers / seconds:.0f} logins/s on {workers} cores")
+    if args.dry_run:
+        return
+    path = os.path.join(args.data_dir, KDF_FILE)
+    with open(path, 'w') as f:
+        json.dump({'algorithm': args.algorithm, 'params': params, 'target_ms': args.target_ms,
+                   'measured_ms': round(seconds * 1000, 1),
+                   'calibrated_at': datetime.now().isoformat()}, f, indent=2)
+    print(f"Wrote {path}; existing hashes are upgraded as users log in")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import os
+import threading
+
+from cryptography.fernet import Fernet, MultiFernet
+
+from vault.storage import file_lock, read_json, write_json
+
+KEYRING_FILE = 'vault_keys.json'
+LEGACY_KEY_FILE = 'fernet_key.key'
+
+
+def load_or_create_key(path):
+    if os.path.exists(path):
+        with open(path, 'rb') as key_file:
+            key = key_file.read().strip()
+        if key:
+            return key
+    key = Fernet.generate_key()
+    with open(path, 'wb') as key_file:
+        key_file.write(key)
+    return key
+
+
+# --- Key Ring ---
+class KeyRing:
+    """Versioned Fernet keys for one data directory.
+
+    `vault_keys.json` holds {"primary": n, "keys": {"1": key, ...}}. These are
+    key-encryption keys: each record's payload is encrypted under its own
+    random data key, and only that data key is wrapped under the primary
+    key, with the record noting its version. Unwrapping goes through a
+    MultiFernet over every key, so records wrapped under older keys stay
+    readable until the rotation job has re-wrapped them. A directory that
+    only has the old single `fernet_key.key` starts with that key as
+    version 1.
+    """
+
+    def __init__(self, data_dir):
+        self.path = os.path.join(data_dir, KEYRING_FILE)
+        self.legacy_path = os.path.join(data_dir, LEGACY_KEY_FILE)
+        self._lock = threading.Lock()
+        self._stamp = None
+        with file_lock(f"{self.path}.lock"):
+            if not os.path.exists(self.path):
+                key = load_or_create_key(self.legacy_path)
+                write_json(self.path, {'primary': 1, 'keys': {'1': key.decode()}})
+        self.reload()
+
+    def reload(self):
+        with self._lock:
+            state = read_json(self.path)
+            self.keys = {int(version): key.encode() for version, key in state['keys'].items()}
+            self.primary = state['primary']
+            # Primary first: MultiFernet encrypts with the first key only.
+            others = [Fernet(key) for version, key in sorted(self.keys.items(), reverse=True)
+                      if version != self.primary]
+            self.cipher = MultiFernet([Fernet(self.keys[self.primary])] + others)
+            self._stamp = self._file_stamp()
+
+    def refresh(self):
+        """Pick up keys added or retired by another process."""
+        if self._file_stamp() != self._stamp:
+            self.reload()
+
+    @property
+    def primary_key(self):
+        return self.keys[self.primary]
+
+    def key(self, version):
+        # Records from before key versioning were written under key 1.
+        return self.keys[version or 1]
+
+    # --- Data Keys ---
+    def new_data_key(self):
+        """A fresh per-record key and its copy wrapped under the primary key."""
+        data_key = Fernet.generate_key()
+        return data_key, self.cipher.encrypt(data_key).decode()
+
+    def unwrap(self, wrapped_key):
+        return self.cipher.decrypt(wrapped_key.encode())
+
+    def rewrap(self, wrapped_key):
+        """Re-wrap a data key under the primary key; the payload it protects is untouched."""
+        return self.cipher.rotate(wrapped_key.encode()).decode()
+
+    def rotate(self):
+        """Add a new key and make it primary; returns its version."""
+        with file_lock(f"{self.path}.lock"):
+            state = read_json(self.path)
+            version = max(int(v) for v in state['keys']) + 1
+            state['keys'][str(version)] = Fernet.generate_key().decode()
+            state['primary'] = version
+            write_json(self.path, state)
+        self.reload()
+        return version
+
+    def retire(self, version):
+        """Drop an old key once nothing is encrypted under it any more."""
+        with file_lock(f"{self.path}.lock"):
+            state = read_json(self.path)
+            if version == state['primary']:
+                raise ValueError("The primary key cannot be retired")
+            state['keys'].pop(str(version), None)
+            write_json(self.path, state)
+        self.reload()
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
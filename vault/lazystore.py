@@ -0,0 +1,94 @@
+import base64
+import mmap
+import os
+import threading
+
+from vault.binfmt import BinaryStore
+from vault.storage import file_lock
+
+
+# --- Lazy Store ---
+class LazyStore(BinaryStore):
+    """Metadata index loaded eagerly, ciphertexts fetched on demand.
+
+    Ciphertexts are appended to a separate blob file and records keep only a
+    `blob_ref` of [offset, length]. The index (a binary vault without
+    ciphertexts) plus its journal is all that load() reads, so resident memory
+    grows with the number of records rather than their payload bytes. The blob
+    file is memory-mapped and a record's ciphertext is read only when it is
+    actually decrypted.
+    """
+
+    def __init__(self, index_file, journal_file, blob_file, **kwargs):
+        super().__init__(index_file, journal_file, **kwargs)
+        self.blob_file = blob_file
+        self.blob_lock_file = f"{blob_file}.lock"
+        self._blob_lock = threading.Lock()
+        self._blob_writer = None
+        self._map = None
+
+    def commit(self, users=None, records=None):
+        # Records are rewritten in place to their stored form, so the caller
+        # (SharedVault) keeps only metadata in memory.
+        for record in (records or {}).values():
+            if record is not None and 'encrypted_text' in record:
+                record['blob_ref'] = self._append_blob(record.pop('encrypted_text'))
+        super().commit(users=users, records=records)
+
+    def fetch_ciphertext(self, record):
+        offset, length = record['blob_ref']
+        with self._blob_lock:
+            if self._map is None or offset + length > len(self._map):
+                self._remap()
+            return self._map[offset:offset + length]
+
+    def migrate_from(self, other):
+        if os.path.exists(self.binary_file):
+            return
+        users, records = other.load()
+        for record in records.values():
+            if 'encrypted_text' in record:
+                record['blob_ref'] = self._append_blob(record.pop('encrypted_text'))
+        self._sync_blobs()
+        self.write_snapshot(users, records)
+
+    def close(self):
+        super().close()
+        with self._blob_lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            if self._blob_writer is not None:
+                self._blob_writer.close()
+                self._blob_writer = None
+
+    def _append(self, lines):
+        # Ciphertexts must be durable before any journal entry points at them;
+        # one blob fsync per group-commit batch covers every record in it.
+        self._sync_blobs()
+        super()._append(lines)
+
+    def _append_blob(self, ciphertext):
+        if isinstance(ciphertext, str):
+            ciphertext = base64.urlsafe_b64decode(ciphertext)
+        with self._blob_lock, file_lock(self.blob_lock_file):
+            if self._blob_writer is None:
+                self._blob_writer = open(self.blob_file, 'ab')
+            # Other processes append too; the end of file is only stable
+            # while we hold the lock.
+            offset = self._blob_writer.seek(0, os.SEEK_END)
+            self._blob_writer.write(ciphertext)
+            self._blob_writer.flush()
+        return [offset, len(ciphertext)]
+
+    def _sync_blobs(self):
+        with self._blob_lock:
+            if self._blob_writer is not None:
+                os.fsync(self._blob_writer.fileno())
+
+    def _remap(self):
+        # Called with _blob_lock held, when a ref points past the mapped end.
+        if self._map is not None:
+            self._map.close()
+        with open(self.blob_file, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
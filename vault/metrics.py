@@ -0,0 +1,151 @@
+"""Timing spans and counters for the hot paths, exportable as Prometheus text.
+
+    with METRICS.span('hash_passkey'):
+        ...
+
+    @timed('show_home_page')
+    def show_home_page(): ...
+
+Each span keeps a rolling window of recent durations for percentiles plus
+cumulative histogram buckets for Prometheus. Everything is process-wide,
+like the vault itself: one registry per server process.
+"""
+import functools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+SPAN_WINDOW = 1000  # recent samples kept per span for percentiles
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PREFIX = 'vault'
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of `values` (0.0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# --- Histogram ---
+class Histogram:
+    """Durations of one span: cumulative buckets plus a rolling sample window."""
+
+    def __init__(self, window=SPAN_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds, error=False):
+        self.samples.append(seconds)
+        self.count += 1
+        self.errors += error
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+
+    def summary(self):
+        samples = list(self.samples)
+        return {'count': self.count, 'errors': self.errors,
+                'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+                'p50_ms': percentile(samples, 50) * 1000,
+                'p90_ms': percentile(samples, 90) * 1000,
+                'p99_ms': percentile(samples, 99) * 1000,
+                'max_ms': self.max * 1000}
+
+
+# --- Registry ---
+class Metrics:
+    def __init__(self, window=SPAN_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._spans = {}
+        self._counters = {}
+
+    @contextmanager
+    def span(self, name):
+        """Time the enclosed block; exceptions are counted as errors and re-raised."""
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - started, error)
+
+    def observe(self, name, seconds, error=False):
+        with self._lock:
+            histogram = self._spans.get(name)
+            if histogram is None:
+                histogram = self._spans[name] = Histogram(self.window)
+            histogram.observe(seconds, error)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def spans(self):
+        """{span name: count, errors and latency percentiles}, sorted by name."""
+        with self._lock:
+            return {name: self._spans[name].summary() for name in sorted(self._spans)}
+
+    def counters(self):
+        with self._lock:
+            return dict(sorted(self._counters.items()))
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+    def prometheus(self, gauges=None):
+        """Prometheus text exposition of every span, counter and the given gauges.
+
+        `gauges` maps names to numbers sampled by the caller (queue depths,
+        pending writes, ...).
+        """
+        lines = [f'# HELP {PREFIX}_span_seconds Time spent in instrumented code paths.',
+                 f'# TYPE {PREFIX}_span_seconds histogram']
+        with self._lock:
+            spans = [(name, list(h.buckets), h.count, h.total, h.errors)
+                     for name, h in sorted(self._spans.items())]
+            counters = sorted(self._counters.items())
+        for name, buckets, count, total, _ in spans:
+            for bound, hits in zip(BUCKETS, buckets):
+                lines.append(f'{PREFIX}_span_seconds_bucket{{span="{name}",le="{bound}"}} {hits}')
+            lines.append(f'{PREFIX}_span_seconds_bucket{{span="{name}",le="+Inf"}} {count}')
+            lines.append(f'{PREFIX}_span_seconds_sum{{span="{name}"}} {total:.6f}')
+            lines.append(f'{PREFIX}_span_seconds_count{{span="{name}"}} {count}')
+        lines += [f'# HELP {PREFIX}_span_errors_total Instrumented calls that raised.',
+                  f'# TYPE {PREFIX}_span_errors_total counter']
+        lines += [f'{PREFIX}_span_errors_total{{span="{name}"}} {errors}'
+                  for name, _, _, _, errors in spans]
+        for name, value in counters:
+            lines += [f'# TYPE {PREFIX}_{name}_total counter', f'{PREFIX}_{name}_total {value}']
+        for name, value in sorted((gauges or {}).items()):
+            lines += [f'# TYPE {PREFIX}_{name} gauge', f'{PREFIX}_{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+
+
+def timed(name):
+    """Decorator: run the function inside METRICS.span(name)."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with METRICS.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,214 @@
+"""Compact in-memory records and users for the shared cache.
+
+SharedVault holds every loaded record of a process in memory, and at a
+million records the per-dict overhead dominates. Record and User keep the
+same fields in __slots__, intern usernames and enum-like values, hold
+timestamps as integer microseconds instead of ISO strings, and keep Fernet
+tokens (ciphertext, wrapped keys) as raw bytes rather than base64 text.
+
+They read like the dicts they replace (record['data_name'],
+record.get('kind'), 'wrapped_key' in record, dict(record)), and packed
+values come back as exactly the strings that went in. The cache hands out plain dict copies,
+so nothing outside it needs to know. Unknown fields are kept in a small
+side dict rather than dropped.
+"""
+import base64
+import binascii
+import gc
+import sys
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def to_micros(iso):
+    """Microseconds since 1970 for a naive ISO timestamp, or None."""
+    try:
+        return (datetime.fromisoformat(iso) - EPOCH) // MICROSECOND
+    except (TypeError, ValueError):
+        return None  # not a string, not ISO, or timezone-aware
+
+def pack_micros(iso):
+    """to_micros for what datetime.isoformat() writes, else None.
+
+    Only 'YYYY-MM-DDTHH:MM:SS' and the same with non-zero '.ffffff' format
+    back to exactly the stored string; anything else is kept as text.
+    """
+    if len(iso) == 19 or (len(iso) == 26 and iso[19] == '.' and not iso.endswith('000000')):
+        if iso[10] == 'T':
+            return to_micros(iso)
+    return None
+
+def format_micros(micros):
+    return (EPOCH + micros * MICROSECOND).isoformat()
+
+def pack_token(token):
+    """Raw bytes for a url-safe base64 token (a quarter smaller), or None if it does not round-trip."""
+    try:
+        raw = base64.urlsafe_b64decode(token)
+    except (binascii.Error, ValueError):
+        return None
+    return raw if base64.urlsafe_b64encode(raw).decode() == token else None
+
+
+# --- Compact Mapping ---
+class Compact:
+    """Base for slotted, dict-like rows. Subclasses list FIELDS in __slots__."""
+
+    __slots__ = ('_extra',)
+    FIELDS = ()
+    _fields = frozenset()
+    TIMESTAMPS = frozenset()
+    INTERNED = frozenset()
+    TOKENS = frozenset()
+    _packed = frozenset()
+
+    def __init__(self, fields=None):
+        # __setitem__ with the lookups hoisted: this runs once per record on every load.
+        self._extra = None
+        if not fields:
+            return
+        known, packed = self._fields, self._packed
+        for key, value in fields.items():
+            if key not in known:
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[key] = value
+                continue
+            if key in packed and type(value) is str:
+                value = self._pack(key, value)
+            setattr(self, key, value)
+
+    def _pack(self, key, value):
+        if key in self.TIMESTAMPS:
+            return pack_micros(value) or value
+        if key in self.TOKENS:
+            raw = pack_token(value)
+            return value if raw is None else raw
+        return sys.intern(value)
+
+    @classmethod
+    def from_dict(cls, fields):
+        return fields if fields is None or isinstance(fields, cls) else cls(fields)
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+            return
+        if key in self._packed and type(value) is str:
+            value = self._pack(key, value)
+        setattr(self, key, value)
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            if self._extra is None:
+                raise KeyError(key)
+            return self._extra[key]
+        try:
+            value = getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+        if key in self._packed:
+            if key in self.TIMESTAMPS and isinstance(value, int):
+                return format_micros(value)
+            if key in self.TOKENS and isinstance(value, bytes):
+                # Binary stores hand in raw bytes too; copies always get text.
+                return base64.urlsafe_b64encode(value).decode()
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        if key in self._fields:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def pop(self, key, *default):
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        if key in self._fields:
+            delattr(self, key)
+        else:
+            del self._extra[key]
+        return value
+
+    def keys(self):
+        keys = [key for key in self.FIELDS if hasattr(self, key)]
+        if self._extra:
+            keys.extend(self._extra)
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def micros(self, key):
+        """A timestamp field as integer microseconds (0 when missing or unparseable)."""
+        value = getattr(self, key, None)
+        if isinstance(value, int):
+            return value
+        return to_micros(value) or 0
+
+    def to_dict(self):
+        return {key: self[key] for key in self.keys()}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Record(Compact):
+    FIELDS = ('username', 'data_name', 'created_at', 'passkey_hash', 'encrypted_text', 'kind',
+              'file_name', 'blob', 'size', 'blob_ref', 'compression', 'plain_size', 'stored_size',
+              'key_version', 'wrapped_key')
+    __slots__ = FIELDS
+    _fields = frozenset(FIELDS)
+    TIMESTAMPS = frozenset({'created_at'})
+    INTERNED = frozenset({'username', 'kind', 'compression'})
+    TOKENS = frozenset({'encrypted_text', 'wrapped_key'})
+    _packed = TIMESTAMPS | INTERNED | TOKENS
+
+
+class User(Compact):
+    FIELDS = ('password_hash', 'registered_at', 'last_login')
+    __slots__ = FIELDS
+    _fields = frozenset(FIELDS)
+    TIMESTAMPS = frozenset({'registered_at', 'last_login'})
+    _packed = TIMESTAMPS
+
+
+def compact_rows(cls, rows):
+    """Replace every dict in `rows` ({key: fields}) with a `cls` instance, in place."""
+    enabled = gc.isenabled()
+    # Nothing built here can form a cycle; collections triggered by a million
+    # new objects would only rescan the growing heap (about a third of the time).
+    gc.disable()
+    try:
+        for key, fields in rows.items():
+            rows[key] = cls(fields)
+    finally:
+        if enabled:
+            gc.enable()
+    return rows
+
+
+def created_key(record):
+    """Creation-time sort key for a Record or a plain record dict."""
+    if isinstance(record, Record):
+        return record.micros('created_at')
+    return to_micros(record.get('created_at')) or 0
@@ -0,0 +1,221 @@
+import atexit
+import threading
+import time
+from collections import deque
+
+from vault.storage import StorageError, file_lock, read_json, write_json
+
+# Token buckets: BURST attempts at once, refilled at RATE attempts per second.
+USER_BURST = 5
+USER_RATE = 10 / 60
+CLIENT_BURST = 20
+CLIENT_RATE = 1.0
+CHECKPOINT_INTERVAL = 5.0
+
+
+class Throttled(Exception):
+    """An attempt was refused by a RateLimiter before any password hashing."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# --- Token Bucket ---
+class TokenBucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, capacity, now):
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, capacity, rate, now):
+        """Spend one token; returns 0 on success or the seconds until one is available."""
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / rate
+
+
+# --- Rate Limiter ---
+class RateLimiter:
+    """Login throttling and account lockout, held in memory.
+
+    Every attempt spends a token from a per-username and a per-client bucket
+    before any password hashing happens. Failed attempts are kept in a
+    sliding window per username; `max_failures` inside `window` seconds
+    locks the account for `lockout` seconds.
+
+    Lockouts and failure windows are checkpointed to `checkpoint_file` every
+    few seconds so they survive a restart and are shared by every server
+    process: usernames this process changed since its last checkpoint are
+    written as they are here, everything else is loaded from the file.
+    Token buckets are short-lived and are not saved.
+    """
+
+    def __init__(self, checkpoint_file=None, max_failures=3, window=300, lockout=300,
+                 user_burst=USER_BURST, user_rate=USER_RATE, client_burst=CLIENT_BURST,
+                 client_rate=CLIENT_RATE, checkpoint_interval=CHECKPOINT_INTERVAL):
+        self.checkpoint_file = checkpoint_file
+        self.max_failures = max_failures
+        self.window = window
+        self.lockout = lockout
+        self.user_limit = (user_burst, user_rate)
+        self.client_limit = (client_burst, client_rate)
+        self.checkpoint_interval = checkpoint_interval
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._failures = {}
+        self._locked_until = {}
+        self._touched = set()  # usernames changed since the last checkpoint
+        self._closed = threading.Event()
+        if checkpoint_file:
+            try:
+                self._adopt(read_json(checkpoint_file), time.time())
+            except StorageError:
+                pass  # throttling state is disposable; start clean
+            threading.Thread(target=self._run, name='vault-ratelimit', daemon=True).start()
+            atexit.register(self.close)
+
+    def check(self, username, client=None):
+        """Admit one login attempt; returns (allowed, locked, retry_after_seconds)."""
+        now = time.time()
+        with self._lock:
+            locked_until = self._locked_until.get(username)
+            if locked_until is not None:
+                if now < locked_until:
+                    return False, True, locked_until - now
+                del self._locked_until[username]
+                self._touched.add(username)
+            keys = [(('user', username), self.user_limit)]
+            if client:
+                keys.append((('client', client), self.client_limit))
+            for key, (capacity, rate) in keys:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = TokenBucket(capacity, now)
+                wait = bucket.take(capacity, rate, now)
+                if wait:
+                    self.throttled += 1
+                    return False, False, wait
+            return True, False, 0
+
+    def record_failure(self, username):
+        """Count a failed attempt; returns (attempts_left, locked_for_seconds)."""
+        now = time.time()
+        with self._lock:
+            failures = self._failures.setdefault(username, deque())
+            failures.append(now)
+            while failures and failures[0] <= now - self.window:
+                failures.popleft()
+            self._touched.add(username)
+            if len(failures) >= self.max_failures:
+                del self._failures[username]
+                self._locked_until[username] = now + self.lockout
+                return 0, self.lockout
+            return self.max_failures - len(failures), 0
+
+    def record_success(self, username):
+        with self._lock:
+            if self._failures.pop(username, None) is not None:
+                self._touched.add(username)
+
+    def stats(self):
+        with self._lock:
+            now = time.time()
+            return {'tracked_buckets': len(self._buckets), 'throttled': self.throttled,
+                    'locked_accounts': sum(1 for until in self._locked_until.values() if until > now),
+                    'users_with_failures': len(self._failures)}
+
+    def checkpoint(self):
+        """Prune expired state and sync it with the checkpoint file.
+
+        Usernames changed here since the last checkpoint overwrite the file's
+        entries (a cleared failure window stays cleared); the rest are loaded
+        from it, so a lockout recorded by another process applies here too.
+        """
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            if not self.checkpoint_file:
+                return
+            touched, self._touched = self._touched, set()
+            state = self._snapshot()
+        try:
+            with file_lock(f"{self.checkpoint_file}.lock"):
+                # Other server processes checkpoint into the same file.
+                try:
+                    saved = read_json(self.checkpoint_file)
+                except StorageError:
+                    saved = {}
+                merged = {}
+                for table in ('locked_until', 'failures'):
+                    merged[table] = {username: value for username, value in saved.get(table, {}).items()
+                                     if username not in touched}
+                    merged[table].update((username, state[table][username])
+                                         for username in touched if username in state[table])
+                merged['locked_until'] = {username: until for username, until in merged['locked_until'].items()
+                                          if until > now}
+                merged['failures'] = {username: times for username, times in merged['failures'].items()
+                                      if times and times[-1] > now - self.window}
+                if touched:
+                    write_json(self.checkpoint_file, merged)
+        except BaseException:
+            with self._lock:
+                self._touched |= touched
+            raise
+        with self._lock:
+            self._adopt(merged, now)
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self.checkpoint()
+        atexit.unregister(self.close)
+
+    def _snapshot(self):
+        return {'locked_until': dict(self._locked_until),
+                'failures': {username: list(times) for username, times in self._failures.items()}}
+
+    def _adopt(self, state, now):
+        # Called with _lock held (or from __init__): take the saved entries for
+        # every username not changed here since the last checkpoint.
+        saved_locks = state.get('locked_until', {})
+        for username in (set(saved_locks) | set(self._locked_until)) - self._touched:
+            until = saved_locks.get(username, 0)
+            if until > now:
+                self._locked_until[username] = until
+            else:
+                self._locked_until.pop(username, None)
+        saved_failures = state.get('failures', {})
+        for username in (set(saved_failures) | set(self._failures)) - self._touched:
+            recent = [t for t in saved_failures.get(username, ()) if t > now - self.window]
+            if recent:
+                self._failures[username] = deque(recent)
+            else:
+                self._failures.pop(username, None)
+
+    def _prune(self, now):
+        # Called with _lock held: forget buckets that have refilled, expired
+        # lockouts and failure windows, so memory tracks recent activity only.
+        for key, bucket in list(self._buckets.items()):
+            capacity, rate = self.user_limit if key[0] == 'user' else self.client_limit
+            if bucket.tokens + (now - bucket.updated) * rate >= capacity:
+                del self._buckets[key]
+        for username, until in list(self._locked_until.items()):
+            if until <= now:
+                del self._locked_until[username]
+        for username, times in list(self._failures.items()):
+            if times[-1] <= now - self.window:
+                del self._failures[username]
+
+    def _run(self):
+        while not self._closed.wait(self.checkpoint_interval):
+            try:
+                self.checkpoint()
+            except OSError:
+                pass  # best effort: the next interval tries again
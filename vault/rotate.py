@@ -0,0 +1,243 @@
+"""Key rotation: add a key, then re-wrap the vault's data keys under it in the background.
+
+    python -m vault.rotate new-key        [--data-dir .]
+    python -m vault.rotate run            [--batch-size 100] [--rate 200] [--data-dir .]
+    python -m vault.rotate status         [--data-dir .]
+    python -m vault.rotate retire VERSION [--data-dir .]
+
+`new-key` makes a fresh key primary; running servers pick it up on their next
+refresh and encrypt new data under it straight away. Older data stays
+readable through the key ring while `run` moves it over batch by batch,
+checkpointing to rotation.json so an interrupted run resumes where it
+stopped. A record that cannot be read (a corrupt token or blob, or one
+encrypted under a key the ring does not have) is listed as failed in
+rotation.json and skipped from then on; `status` shows the list.
+`retire` drops a key once no record needs it.
+
+Records only store their data key wrapped under a master key, so `run`
+rewrites a ~140-byte wrapped key per record however large the payload.
+Records from before envelope encryption are re-encrypted once, under a new
+data key, and are cheap to rotate from then on.
+"""
+import argparse
+import base64
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from vault.core import BLOB_DIR, Vault
+from vault.storage import StorageError, read_json, write_json
+from vault.stream import StreamError, rekey_stream
+
+CHECKPOINT_FILE = 'rotation.json'
+BATCH_SIZE = 100
+RATE = 200  # records per second
+
+
+# --- Rotation Job ---
+class RotationJob:
+    """Moves every record not yet under the primary key over to it.
+
+    Work is committed in batches of `batch_size` and paced to `rate` records
+    per second so the vault stays responsive. Progress is written to
+    rotation.json after each batch, and records already under the target
+    key are skipped, so a new job for the same key picks up where the last
+    one stopped. Records that fail to rotate are kept in the checkpoint's
+    `failed` map ({data_id: error}) and not retried by later runs.
+    """
+
+    def __init__(self, vault, batch_size=BATCH_SIZE, rate=RATE):
+        # The job targets whatever key is primary when it is created.
+        self.vault = vault
+        self.batch_size = batch_size
+        self.rate = rate
+        self.checkpoint_file = vault.path(CHECKPOINT_FILE)
+        self.target = vault.keyring.primary
+        self._stop = threading.Event()
+        self._thread = None
+        state = read_json(self.checkpoint_file)
+        if state.get('target') != self.target:
+            state = {'target': self.target, 'cursor': None, 'done': 0, 'total': None,
+                     'started_at': datetime.now().isoformat(), 'finished_at': None}
+        state.setdefault('failed', {})
+        self.state = state
+
+    def pending(self):
+        """(data_id, username) of records still under an older key, in id order.
+
+        Filtering on key_version is what makes a resumed run skip finished
+        work; it also catches records a server wrote under the old key after
+        an earlier pass went by. Records that already failed are left out.
+        """
+        _, records = self.vault.store.load()
+        failed = self.state['failed']
+        return sorted((data_id, record.get('username')) for data_id, record in records.items()
+                      if record.get('key_version', 1) != self.target and data_id not in failed)
+
+    def run(self):
+        todo = self.pending()
+        if self.state['total'] is None:
+            self.state['total'] = len(todo)
+        for start in range(0, len(todo), self.batch_size):
+            if self._stop.is_set():
+                break
+            started = time.monotonic()
+            batch = todo[start:start + self.batch_size]
+            self._rotate_batch(batch)
+            self.state['cursor'] = batch[-1][0]
+            self.state['done'] += len(batch)
+            self._checkpoint()
+            # Pace to `rate` records per second.
+            delay = len(batch) / self.rate - (time.monotonic() - started)
+            if delay > 0 and self._stop.wait(delay):
+                break
+        else:
+            self.state['finished_at'] = datetime.now().isoformat()
+            self._checkpoint()
+        return self.progress()
+
+    def start(self):
+        """Run in a daemon thread; poll progress() and call stop() to pause."""
+        self._thread = threading.Thread(target=self.run, name='vault-rotation', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def progress(self):
+        total = self.state['total'] or 0
+        return {'target': self.target, 'done': self.state['done'], 'total': total,
+                'percent': 100.0 * self.state['done'] / total if total else 100.0,
+                'finished': self.state['finished_at'] is not None,
+                'failed': dict(self.state['failed'])}
+
+    def _rotate_batch(self, batch):
+        changed = {}
+        old_blobs = []
+        for data_id, username in batch:
+            record = self.vault.get_record(data_id, username)
+            if record is None or record.get('key_version', 1) == self.target:
+                continue  # deleted, or rewritten under the new key meanwhile
+            try:
+                if 'wrapped_key' in record:
+                    record['wrapped_key'] = self.vault.keyring.rewrap(record['wrapped_key'])
+                elif record.get('kind') == 'file':
+                    old_blob = record['blob']
+                    record['blob'], record['wrapped_key'] = self._rekey_file(record)
+                    old_blobs.append(old_blob)
+                else:
+                    self._reseal_text(record)
+            except (InvalidToken, StreamError, StorageError, OSError, KeyError) as e:
+                # One unreadable record must not stall the job; it stays under
+                # its old key and is reported instead of retried forever.
+                self.state['failed'][data_id] = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+                continue
+            record['key_version'] = self.target
+            changed[data_id] = record
+        self.vault.commit(records=changed)
+        # Old blobs go only once the records pointing at the new ones are durable.
+        for blob_name in old_blobs:
+            try:
+                os.remove(os.path.join(self.vault.path(BLOB_DIR), blob_name))
+            except FileNotFoundError:
+                pass
+
+    def _reseal_text(self, record):
+        # A pre-envelope text record: move its payload under a new data key.
+        token = self.vault.record_ciphertext(record)
+        if isinstance(token, bytes):
+            token = base64.urlsafe_b64encode(token)
+        else:
+            token = token.encode()
+        data_key, record['wrapped_key'] = self.vault.keyring.new_data_key()
+        payload = Fernet(self.vault.keyring.key(record.get('key_version'))).decrypt(token)
+        record['encrypted_text'] = Fernet(data_key).encrypt(payload).decode()
+        record['stored_size'] = len(record['encrypted_text'])
+        record.pop('blob_ref', None)
+
+    def _rekey_file(self, record):
+        # A pre-envelope file: re-encrypt it under a new data key into a new blob.
+        blob_dir = self.vault.path(BLOB_DIR)
+        new_name = f"{uuid.uuid4().hex}.svs"
+        data_key, wrapped_key = self.vault.keyring.new_data_key()
+        try:
+            with open(os.path.join(blob_dir, record['blob']), 'rb') as src, \
+                    open(os.path.join(blob_dir, new_name), 'wb') as dst:
+                rekey_stream(self.vault.keyring.key(record.get('key_version')), data_key, src, dst)
+                dst.flush()
+                os.fsync(dst.fileno())
+        except BaseException:
+            try:
+                os.remove(os.path.join(blob_dir, new_name))
+            except FileNotFoundError:
+                pass
+            raise
+        return new_name, wrapped_key
+
+    def _checkpoint(self):
+        write_json(self.checkpoint_file, self.state)
+
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m vault.rotate', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['new-key', 'run', 'status', 'retire'])
+    parser.add_argument('version', nargs='?', type=int, help="Key version to retire")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--rate', type=float, default=RATE, help="Records per second")
+    parser.add_argument('--backend', default=None)
+    parser.add_argument('--data-dir', default='.')
+    args = parser.parse_args(argv)
+
+    vault = Vault(args.data_dir, args.backend)
+    try:
+        if args.command == 'new-key':
+            version = vault.keyring.rotate()
+            print(f"Key {version} is now primary; run `python -m vault.rotate run` to move records over")
+        elif args.command == 'retire':
+            if args.version is None:
+                parser.error("retire needs a key version")
+            if args.version == vault.keyring.primary:
+                parser.error("The primary key cannot be retired")
+            _, records = vault.store.load()
+            if any(record.get('key_version', 1) == args.version for record in records.values()):
+                parser.error(f"Records still use key {args.version}; finish `run` first")
+            vault.keyring.retire(args.version)
+            print(f"Key {args.version} retired")
+        elif args.command == 'status':
+            job = RotationJob(vault)
+            progress = job.progress()
+            progress['still_pending'] = len(job.pending())
+            print(progress)
+        else:
+            job = RotationJob(vault, args.batch_size, args.rate)
+            job.start()
+            try:
+                while job._thread.is_alive():
+                    job._thread.join(1.0)
+                    progress = job.progress()
+                    print(f"\rkey {progress['target']}: {progress['done']}/{progress['total']} "
+                          f"({progress['percent']:.1f}%)", end='', flush=True)
+            except KeyboardInterrupt:
+                job.stop()
+                print("\nStopped; run again to resume")
+            print()
+            failed = job.progress()['failed']
+            if failed:
+                print(f"{len(failed)} records could not be rotated and stay under their old key:")
+                for data_id, error in sorted(failed.items()):
+                    print(f"  {data_id}: {error}")
+    finally:
+        vault.close()
+
+
+if __name__ == '__main__':
+    main()
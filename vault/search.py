@@ -0,0 +1,67 @@
+from bisect import bisect_left
+
+from vault.model import created_key
+
+PAGE_SIZE = 25
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+# --- Name Index ---
+class NameIndex:
+    """Prefix and substring lookup over one user's record names.
+
+    Queries of one or two characters match name prefixes, found by bisecting
+    the sorted names. Longer queries match anywhere in the name: each name's
+    trigrams point back at its records, so only names sharing every trigram
+    of the query are checked. Record ids are also kept in created_at order
+    for pagination.
+    """
+
+    def __init__(self, records):
+        # records: {data_id: record} for one user.
+        self.by_created = sorted(records, key=lambda data_id: created_key(records[data_id]))
+        self.names = {data_id: record.get('data_name', '').lower() for data_id, record in records.items()}
+        self.sorted_names = sorted((name, data_id) for data_id, name in self.names.items())
+        self.grams = {}
+        for data_id, name in self.names.items():
+            for gram in trigrams(name):
+                self.grams.setdefault(gram, set()).add(data_id)
+
+    def prefix(self, query):
+        query = query.lower()
+        start = bisect_left(self.sorted_names, (query, ''))
+        matches = set()
+        for name, data_id in self.sorted_names[start:]:
+            if not name.startswith(query):
+                break
+            matches.add(data_id)
+        return matches
+
+    def substring(self, query):
+        query = query.lower()
+        candidates = None
+        for gram in trigrams(query):
+            postings = self.grams.get(gram, set())
+            candidates = postings if candidates is None else candidates & postings
+            if not candidates:
+                return set()
+        return {data_id for data_id in candidates if query in self.names[data_id]}
+
+    def page(self, query='', page=1, page_size=PAGE_SIZE, newest_first=True):
+        """Return (data_ids on this page, total matches); pages count from 1."""
+        start = (max(page, 1) - 1) * page_size
+        if not query:
+            # Slice without copying the whole list: cost is one page.
+            total = len(self.by_created)
+            if not newest_first:
+                return self.by_created[start:start + page_size], total
+            end = max(total - start, 0)
+            return self.by_created[max(end - page_size, 0):end][::-1], total
+        matches = self.prefix(query) if len(query) < 3 else self.substring(query)
+        ordered = [data_id for data_id in self.by_created if data_id in matches]
+        if newest_first:
+            ordered.reverse()
+        return ordered[start:start + page_size], len(ordered)
@@ -0,0 +1,252 @@
+"""Sharded vault layout: users in one partition, records split by owner.
+
+Layout of the shard directory:
+    layout.json          {"version": 1, "buckets": N}; N = 0 means one shard per user
+    users.json/.journal  every user
+    <shard>.json/.journal the records of one user ('u-<hash>') or of one
+                         hash bucket of users ('b-0042')
+
+Each partition is a journaled store of its own, with its own locks, journal
+and compaction, so saving a record only appends to its owner's shard and
+listing a user's records only reads that shard.
+
+Split the single-file vault, change the bucket count, or join back with:
+    python -m vault.shards split     [--buckets N] [--data-dir .]
+    python -m vault.shards rebalance --buckets N [--data-dir .]
+    python -m vault.shards join      [--data-dir .]
+Stop the servers first; these rewrite the files they read.
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import threading
+import time
+import zlib
+
+from vault.storage import (DATA_FILE, JOURNAL_FILE, RECORDS, SHARD_DIR, USERS, USERS_FILE,
+                           JournalStore, Store, read_json, write_json)
+
+LAYOUT_FILE = 'layout.json'
+LAYOUT_VERSION = 1
+USERS_PARTITION = 'users'
+# Shard layout used when a sharded vault is first created: 0 gives every user
+# a shard, N > 0 hashes users into N buckets (better past a few thousand users).
+DEFAULT_BUCKETS = int(os.environ.get('VAULT_SHARD_BUCKETS', 0))
+
+
+def shard_name(username, buckets):
+    if buckets:
+        return f"b-{zlib.crc32(username.encode()) % buckets:04d}"
+    return f"u-{hashlib.sha256(username.encode()).hexdigest()[:20]}"
+
+
+# --- Partitions ---
+class Partition(JournalStore):
+    """JournalStore whose snapshot holds a single table."""
+
+    def __init__(self, snapshot_file, table, keep_open=True, **kwargs):
+        super().__init__(None, None, f"{snapshot_file[:-len('.json')]}.journal", **kwargs)
+        self.snapshot_file = snapshot_file
+        self.table = table
+        self.keep_open = keep_open
+
+    def read_snapshot(self):
+        data = read_json(self.snapshot_file)
+        return (data, {}) if self.table == USERS else ({}, data)
+
+    def write_snapshot(self, users, records):
+        write_json(self.snapshot_file, users if self.table == USERS else records)
+
+    def snapshot_files(self):
+        return [self.snapshot_file]
+
+    def _append(self, lines):
+        super()._append(lines)
+        if not self.keep_open:
+            # A vault with thousands of shards must not pin a descriptor each.
+            self.close()
+
+
+# --- Sharded Store ---
+class ShardedStore(Store):
+    """Users in one partition and records in per-user or hash-bucket shards.
+
+    load() still returns everything, but SharedVault uses load_users() and
+    load_shard() instead so a process only reads the shards it needs.
+    """
+
+    def __init__(self, shard_dir, buckets=None):
+        self.shard_dir = shard_dir
+        os.makedirs(shard_dir, exist_ok=True)
+        layout = read_json(self.path(LAYOUT_FILE))
+        if layout:
+            self.buckets = layout['buckets']
+        else:
+            self.buckets = DEFAULT_BUCKETS if buckets is None else buckets
+        self._lock = threading.Lock()
+        self._partitions = {}
+        self.users = self.partition(USERS_PARTITION)
+
+    def path(self, name):
+        return os.path.join(self.shard_dir, name)
+
+    @property
+    def initialized(self):
+        return os.path.exists(self.path(LAYOUT_FILE))
+
+    def shard_for(self, username):
+        return shard_name(username, self.buckets)
+
+    def shards(self):
+        """Names of every record shard on disk."""
+        names = set()
+        for entry in os.listdir(self.shard_dir):
+            # A rotated journal may be all there is if a first fold was cut short.
+            name, ext = os.path.splitext(entry[:-len('.old')] if entry.endswith('.journal.old') else entry)
+            if ext in ('.json', '.journal') and name not in (USERS_PARTITION, 'layout'):
+                names.add(name)
+        return sorted(names)
+
+    def partition(self, name):
+        with self._lock:
+            part = self._partitions.get(name)
+            if part is None:
+                table = USERS if name == USERS_PARTITION else RECORDS
+                part = Partition(self.path(f"{name}.json"), table,
+                                 keep_open=name == USERS_PARTITION)
+                self._partitions[name] = part
+            return part
+
+    def load_users(self):
+        return self.users.load()[0]
+
+    def load_shard(self, shard):
+        return self.partition(shard).load()[1]
+
+    def users_token(self):
+        return self.users.version_token()
+
+    def shard_token(self, shard):
+        return self.partition(shard).version_token()
+
+    def load(self):
+        records = {}
+        for shard in self.shards():
+            records.update(self.load_shard(shard))
+        return self.load_users(), records
+
+    def commit(self, users=None, records=None):
+        # Each partition commits on its own; a call touching several is not
+        # atomic across them (the app never mixes users and records anyway).
+        if users:
+            self.users.commit(users=users)
+        by_shard = {}
+        for data_id, record in (records or {}).items():
+            if record is None:
+                for shard in self._shards_for_id(data_id):
+                    by_shard.setdefault(shard, {})[data_id] = None
+            else:
+                by_shard.setdefault(self.shard_for(record.get('username', '')), {})[data_id] = record
+        for shard, changes in by_shard.items():
+            self.partition(shard).commit(records=changes)
+
+    def user_records(self, username, records=None):
+        shard = self.load_shard(self.shard_for(username))
+        owned = [(k, v) for k, v in shard.items() if v.get('username') == username]
+        return dict(sorted(owned, key=lambda item: item[1].get('created_at', '')))
+
+    def version_token(self):
+        return (self.users_token(),) + tuple(self.shard_token(s) for s in self.shards())
+
+    def compact(self):
+        with self._lock:
+            partitions = list(self._partitions.values())
+        for part in partitions:
+            part.compact()
+
+    def close(self):
+        with self._lock:
+            partitions = list(self._partitions.values())
+        for part in partitions:
+            part.close()
+
+    def write_all(self, users, records):
+        """Write complete snapshots for every partition, then the layout file."""
+        by_shard = {}
+        for data_id, record in records.items():
+            by_shard.setdefault(self.shard_for(record.get('username', '')), {})[data_id] = record
+        self.partition(USERS_PARTITION).write_snapshot(users, {})
+        for shard, shard_records in by_shard.items():
+            self.partition(shard).write_snapshot({}, shard_records)
+        # Written last: a split interrupted before this point is simply redone.
+        write_json(self.path(LAYOUT_FILE), {'version': LAYOUT_VERSION, 'buckets': self.buckets})
+
+    def migrate_from(self, other):
+        """Split another store into shards if this layout does not exist yet."""
+        if not self.initialized:
+            self.write_all(*other.load())
+
+    def _shards_for_id(self, data_id):
+        # Deletes carry no record; ids start with '<username>_', and usernames
+        # may contain '_' themselves, so try every possible prefix. Legacy
+        # records without an owner all live in the shard of ''.
+        return {self.shard_for(data_id[:i]) for i, c in enumerate(data_id) if c == '_'} | \
+            {self.shard_for('')}
+
+
+# --- Migration Tool ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m vault.shards', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['split', 'rebalance', 'join'])
+    parser.add_argument('--buckets', type=int, default=None,
+                        help="0 for one shard per user, N for N hash buckets")
+    parser.add_argument('--data-dir', default='.')
+    args = parser.parse_args(argv)
+
+    def path(name):
+        return os.path.join(args.data_dir, name)
+
+    shard_dir = path(SHARD_DIR)
+    single = JournalStore(path(USERS_FILE), path(DATA_FILE), path(JOURNAL_FILE))
+    started = time.perf_counter()
+
+    if args.command == 'split':
+        if os.path.exists(os.path.join(shard_dir, LAYOUT_FILE)):
+            parser.error(f"{shard_dir} already exists; use rebalance")
+        store = ShardedStore(shard_dir, buckets=args.buckets)
+        users, records = single.load()
+        store.write_all(users, records)
+    elif args.command == 'rebalance':
+        if args.buckets is None:
+            parser.error("rebalance needs --buckets")
+        users, records = ShardedStore(shard_dir).load()
+        # Build the new layout next to the old one and swap directories, so an
+        # interrupted rebalance leaves the old layout untouched.
+        new_dir = f"{shard_dir}.new"
+        shutil.rmtree(new_dir, ignore_errors=True)
+        store = ShardedStore(new_dir, buckets=args.buckets)
+        store.write_all(users, records)
+        old_dir = f"{shard_dir}.old"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        os.replace(shard_dir, old_dir)
+        os.replace(new_dir, shard_dir)
+        shutil.rmtree(old_dir)
+        store = ShardedStore(shard_dir)
+    else:
+        store = ShardedStore(shard_dir)
+        users, records = store.load()
+        single.write_snapshot(users, records)
+        for stale in (single.journal_file, single.rotated_file):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+    seconds = time.perf_counter() - started
+    layout = 'per-user shards' if not store.buckets else f"{store.buckets} hash buckets"
+    print(f"{args.command}: {len(users)} users, {len(records)} records, {layout}, "
+          f"{len(store.shards())} shards on disk ({seconds * 1000:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+import threading
+
+from vault.model import Record, User, compact_rows
+from vault.search import PAGE_SIZE, NameIndex
+
+
+# --- Shared Vault Cache ---
+class SharedVault:
+    """One in-memory copy of users and records shared by every session in a process.
+
+    Writes go through to the store immediately. Users and records are held
+    as compact slotted User/Record objects; reads hand out plain dict copies,
+    so a session can mutate what it got back without touching the shared
+    state. `refresh()` reloads when another process has written to the same
+    store.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.version = 0
+        self._generation = 0
+        self._seq = 0
+        self._lock = threading.RLock()
+        self._token = None
+        self.reload()
+
+    def reload(self):
+        with self._lock:
+            # Read the token first: a write racing with load() just causes one
+            # more reload on the next refresh().
+            token = self.store.version_token()
+            users, records = self.store.load()
+            compact_rows(User, users)
+            compact_rows(Record, records)
+            by_user = {}
+            for data_id, record in records.items():
+                by_user.setdefault(record.get('username'), []).append(data_id)
+            self._users = users
+            self._records = records
+            self._by_user = by_user
+            self._reset_user_state()
+            self._token = token
+            self.version += 1
+
+    def refresh(self):
+        """Reload if the store was changed by someone other than this process."""
+        if self.store.version_token() != self._token:
+            self.reload()
+
+    def get_user(self, username):
+        with self._lock:
+            user = self._users.get(username)
+            return dict(user) if user is not None else None
+
+    def has_user(self, username):
+        with self._lock:
+            return username in self._users
+
+    def get_record(self, data_id, username=None):
+        with self._lock:
+            record = self._records.get(data_id)
+            return dict(record) if record is not None else None
+
+    def user_records(self, username):
+        """Return {data_id: record} copies for one user, oldest first."""
+        with self._lock:
+            return {data_id: dict(self._records[data_id])
+                    for data_id in self._by_user.get(username, ())}
+
+    def search(self, username, query='', page=1, page_size=PAGE_SIZE, newest_first=True):
+        """Return ({data_id: record} copies for one page, total matches)."""
+        with self._lock:
+            index = self._indexes.get(username)
+            if index is None:
+                # Built on first use and dropped whenever the user's records change.
+                index = self._indexes[username] = NameIndex(
+                    {data_id: self._records[data_id] for data_id in self._by_user.get(username, ())})
+            data_ids, total = index.page(query, page, page_size, newest_first)
+            return {data_id: dict(self._records[data_id]) for data_id in data_ids}, total
+
+    def records_version(self, username):
+        """Opaque value that changes whenever one user's records do."""
+        with self._lock:
+            return self._generation, self._user_seq.get(username, 0), len(self._by_user.get(username, ()))
+
+    def records_since(self, username, version):
+        """{data_id: record} copies a user added since `version`, oldest first.
+
+        Returns None when records were also changed or removed since then, or
+        the cache was reloaded; the caller should start over.
+        """
+        with self._lock:
+            generation, seq, length = version
+            if generation != self._generation or self._user_rewrite.get(username, 0) > seq:
+                return None
+            return {data_id: dict(self._records[data_id])
+                    for data_id in self._by_user.get(username, [])[length:]}
+
+    def commit(self, users=None, records=None):
+        """Apply changes in memory and write them through; None deletes a key."""
+        users = {name: dict(user) if user is not None else None
+                 for name, user in (users or {}).items()}
+        records = {data_id: dict(record) if record is not None else None
+                   for data_id, record in (records or {}).items()}
+        # Write outside the lock so concurrent sessions can share a group
+        # commit; memory is only updated once the change is durable. The
+        # store's version token ignores our own writes, so _token stays put
+        # and a refresh() still sees anything another process wrote meanwhile.
+        self.store.commit(users=users, records=records)
+        with self._lock:
+            for name, user in users.items():
+                if user is None:
+                    self._users.pop(name, None)
+                else:
+                    self._users[name] = User(user)
+            for data_id, record in records.items():
+                self._put_record(data_id, Record.from_dict(record))
+            self.version += 1
+
+    def _reset_user_state(self):
+        # Per-user derived state: name indexes and change sequence numbers.
+        self._indexes = {}
+        self._user_seq = {}
+        self._user_rewrite = {}
+        self._generation += 1
+
+    def _touch_user(self, username, rewrite):
+        self._seq += 1
+        self._user_seq[username] = self._seq
+        if rewrite:
+            self._user_rewrite[username] = self._seq
+        self._indexes.pop(username, None)
+
+    def _put_record(self, data_id, record):
+        old = self._records.get(data_id)
+        if old is not None and record is not None and old.get('username') == record.get('username'):
+            # An edit keeps the record's place, so user_records stays oldest first.
+            self._records[data_id] = record
+            self._touch_user(record.get('username'), rewrite=True)
+            return
+        self._records.pop(data_id, None)
+        if old is not None:
+            self._by_user[old.get('username')].remove(data_id)
+            self._touch_user(old.get('username'), rewrite=True)
+        if record is not None:
+            self._records[data_id] = record
+            self._by_user.setdefault(record.get('username'), []).append(data_id)
+            self._touch_user(record.get('username'), rewrite=False)
+
+
+# --- Sharded Vault Cache ---
+class ShardedVault(SharedVault):
+    """SharedVault over a ShardedStore: users up front, record shards on first use.
+
+    Listing a user's records reads only that user's shard, and refresh()
+    checks only the shards this process has already loaded.
+    """
+
+    def reload(self):
+        with self._lock:
+            token = self.store.users_token()
+            self._users = compact_rows(User, self.store.load_users())
+            self._records = {}
+            self._by_user = {}
+            self._reset_user_state()
+            self._shards = {}
+            self._token = token
+            self.version += 1
+
+    def refresh(self):
+        with self._lock:
+            token = self.store.users_token()
+            if token != self._token:
+                self._token = token
+                self._users = compact_rows(User, self.store.load_users())
+                self.version += 1
+            for shard, token in list(self._shards.items()):
+                if self.store.shard_token(shard) != token:
+                    self._drop_shard(shard)
+                    self._load_shard(shard)
+
+    def get_record(self, data_id, username=None):
+        with self._lock:
+            if username is not None:
+                self._ensure_shard(self.store.shard_for(username))
+            elif data_id not in self._records:
+                # Without an owner the record could be in any shard.
+                for shard in self.store.shards():
+                    self._ensure_shard(shard)
+            return super().get_record(data_id)
+
+    def user_records(self, username):
+        with self._lock:
+            self._ensure_shard(self.store.shard_for(username))
+            return super().user_records(username)
+
+    def search(self, username, *args, **kwargs):
+        with self._lock:
+            self._ensure_shard(self.store.shard_for(username))
+            return super().search(username, *args, **kwargs)
+
+    def records_version(self, username):
+        with self._lock:
+            self._ensure_shard(self.store.shard_for(username))
+            return super().records_version(username)
+
+    def commit(self, users=None, records=None):
+        users = {name: dict(user) if user is not None else None
+                 for name, user in (users or {}).items()}
+        records = {data_id: dict(record) if record is not None else None
+                   for data_id, record in (records or {}).items()}
+        self.store.commit(users=users, records=records)
+        with self._lock:
+            for name, user in users.items():
+                if user is None:
+                    self._users.pop(name, None)
+                else:
+                    self._users[name] = User(user)
+            # As in SharedVault.commit, tokens are left alone: they only move
+            # for other processes' writes, which refresh() must still load.
+            for data_id, record in records.items():
+                owner = record if record is not None else self._records.get(data_id)
+                if owner is None:
+                    continue
+                # Shards not loaded yet will read this change from disk.
+                if self.store.shard_for(owner.get('username', '')) in self._shards:
+                    self._put_record(data_id, Record.from_dict(record))
+            self.version += 1
+
+    def _ensure_shard(self, shard):
+        if shard not in self._shards:
+            self._load_shard(shard)
+
+    def _load_shard(self, shard):
+        token = self.store.shard_token(shard)
+        for data_id, record in compact_rows(Record, self.store.load_shard(shard)).items():
+            self._put_record(data_id, record)
+        self._shards[shard] = token
+        self.version += 1
+
+    def _drop_shard(self, shard):
+        for username in [u for u in self._by_user if self.store.shard_for(u or '') == shard]:
+            for data_id in self._by_user.pop(username):
+                self._records.pop(data_id, None)
+            self._touch_user(username, rewrite=True)
+        del self._shards[shard]
@@ -0,0 +1,554 @@
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+USERS = 'users'
+RECORDS = 'records'
+
+# --- File Names ---
+USERS_FILE = 'users.json'
+DATA_FILE = 'encrypted_data.json'
+JOURNAL_FILE = 'vault.journal'
+DB_FILE = 'vault.db'
+BINARY_FILE = 'vault.bin'
+INDEX_FILE = 'vault.idx'
+BLOB_FILE = 'vault.blobs'
+SHARD_DIR = 'vault_shards'
+
+# Commits arriving within this window of each other share one write + fsync.
+GROUP_COMMIT_WINDOW = 0.002
+
+
+class StorageError(Exception):
+    """Raised when a vault file exists but cannot be read."""
+
+
+# --- File Locking ---
+@contextmanager
+def file_lock(path):
+    """Exclusive advisory lock on `path`, held across processes."""
+    with open(path, 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def fsync_dir(path):
+    # Make a rename durable; directories cannot be opened for fsync on Windows.
+    if fcntl is None:
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# --- JSON Helpers ---
+def json_default(value):
+    # Binary vaults keep encrypted_text as raw ciphertext; JSON gets the token.
+    if isinstance(value, bytes):
+        return base64.urlsafe_b64encode(value).decode()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def read_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        text = f.read()
+    if not text.strip():
+        return {}
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        # Files are only ever replaced by atomic rename, so a parse error means
+        # real damage; refuse to start rather than treat the vault as empty.
+        raise StorageError(f"{path} is corrupt: {e}") from e
+
+def write_json(path, obj):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f, default=json_default)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(path)
+
+def replay_journal(path, users, records):
+    """Apply every entry of a journal file to users/records; returns the entry count."""
+    if not os.path.exists(path):
+        return 0
+    tables = {USERS: users, RECORDS: records}
+    count = 0
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn write can only be the last line; everything before it is intact.
+                break
+            table = tables[entry['t']]
+            if entry['v'] is None:
+                table.pop(entry['k'], None)
+            else:
+                table[entry['k']] = entry['v']
+            count += 1
+    return count
+
+
+# --- Group Commit ---
+class _Batch:
+    __slots__ = ('items', 'done', 'error')
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+
+class GroupCommitter:
+    """Coalesces concurrent commits into one call to `flush(items)`.
+
+    The first committer to arrive becomes the leader: it waits `window`
+    seconds for others to join, then flushes everything queued so far while
+    later arrivals collect into the next batch. Every caller returns only
+    once its own items are durable (or re-raises the flush error).
+    """
+
+    def __init__(self, flush, window=GROUP_COMMIT_WINDOW):
+        self.flush = flush
+        self.window = window
+        self._cond = threading.Condition()
+        self._batch = _Batch()
+        self._flushing = False
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, items):
+        if not items:
+            return
+        with self._cond:
+            batch = self._batch
+            batch.items.extend(items)
+            while not batch.done:
+                if not self._flushing:
+                    self._flushing = True
+                    break
+                self._cond.wait()
+            else:
+                if batch.error is not None:
+                    raise batch.error
+                return
+
+        if self.window:
+            time.sleep(self.window)
+        with self._cond:
+            # Only a leader swaps batches, so this is still the batch we joined.
+            self._batch = _Batch()
+        try:
+            self.flush(batch.items)
+        except Exception as e:
+            batch.error = e
+        with self._cond:
+            batch.done = True
+            self._flushing = False
+            self.batches += 1
+            self.items += len(batch.items)
+            self._cond.notify_all()
+        if batch.error is not None:
+            raise batch.error
+
+
+# --- Store Interface ---
+class Store:
+    """Persistence backend for the users and records dictionaries."""
+
+    def load(self):
+        raise NotImplementedError
+
+    def commit(self, users=None, records=None):
+        """Persist changed entries; a value of None deletes the key."""
+        raise NotImplementedError
+
+    def user_records(self, username, records):
+        """Return {data_id: record} for one user, oldest first."""
+        return {k: v for k, v in records.items()
+                if 'username' in v and v['username'] == username}
+
+    def version_token(self):
+        """Cheap value that changes when another writer modifies the store."""
+        return None
+
+    def fetch_ciphertext(self, record):
+        """Return the ciphertext of a record whose load() left it out."""
+        raise StorageError("This store keeps ciphertexts inline")
+
+    def close(self):
+        pass
+
+
+# --- Journaled Store ---
+class JournalStore(Store):
+    """Snapshot JSON files plus an append-only journal of mutations.
+
+    Each commit appends one line per changed user or record, so write cost is
+    proportional to the change. Once `compact_every` entries have accumulated
+    the journal is rotated and folded into the snapshot on a background thread.
+
+    Several server processes may share the files: appends and rotation hold
+    an advisory lock on `<journal>.lock`, snapshot folds and loads hold one on
+    `<journal>.snapshot.lock`, and concurrent commits are group-committed.
+    """
+
+    def __init__(self, users_file, data_file, journal_file, compact_every=1000,
+                 group_commit_window=GROUP_COMMIT_WINDOW):
+        self.users_file = users_file
+        self.data_file = data_file
+        self.journal_file = journal_file
+        self.rotated_file = f"{journal_file}.old"
+        self.lock_file = f"{journal_file}.lock"
+        self.snapshot_lock_file = f"{journal_file}.snapshot.lock"
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._log = None
+        self._pending = 0
+        self._compacting = False
+        self._seen_stats = None
+        self._foreign_writes = 0
+        self._committer = GroupCommitter(self._append, group_commit_window)
+
+    def load(self):
+        with self._lock, self._snapshot_lock, file_lock(self.snapshot_lock_file):
+            if os.path.exists(self.rotated_file) and not self._compacting:
+                # A compaction was interrupted (or another process has yet to
+                # start it); folding is idempotent, so finish it here.
+                self._fold(self.rotated_file)
+            users, records = self.read_snapshot()
+            replay_journal(self.rotated_file, users, records)
+            self._pending = replay_journal(self.journal_file, users, records)
+        return users, records
+
+    def commit(self, users=None, records=None):
+        lines = []
+        for table, changes in ((USERS, users), (RECORDS, records)):
+            for key, value in (changes or {}).items():
+                lines.append(json.dumps({'t': table, 'k': key, 'v': value}, default=json_default) + '\n')
+        self._committer.submit(lines)
+
+    def read_snapshot(self):
+        return read_json(self.users_file), read_json(self.data_file)
+
+    def write_snapshot(self, users, records):
+        write_json(self.data_file, records)
+        write_json(self.users_file, users)
+
+    def snapshot_files(self):
+        return [self.users_file, self.data_file]
+
+    def version_token(self):
+        # Our own appends are noted as they happen (under the journal lock), so
+        # only other processes' writes move this counter.
+        with self._lock:
+            self._note_foreign_writes()
+            return self._foreign_writes
+
+    def _file_stats(self):
+        stats = []
+        for path in self.snapshot_files() + [self.journal_file, self.rotated_file]:
+            try:
+                stat = os.stat(path)
+                stats.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                stats.append(None)
+        return tuple(stats)
+
+    def _note_foreign_writes(self):
+        # Called with self._lock held.
+        stats = self._file_stats()
+        if self._seen_stats is not None and stats != self._seen_stats:
+            self._foreign_writes += 1
+        self._seen_stats = stats
+
+    def compact(self):
+        """Fold the journal into the snapshot files synchronously."""
+        with self._lock, file_lock(self.lock_file):
+            if (self._compacting or not os.path.exists(self.journal_file)
+                    or os.path.exists(self.rotated_file)):
+                return
+            self._rotate(background=False)
+        self._run_compaction()
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+    def _append(self, lines):
+        # One write and one fsync for a whole group-commit batch.
+        with self._lock, file_lock(self.lock_file):
+            # Nobody else can append while we hold the lock: whatever changed
+            # before this point was another writer, whatever changes now is us.
+            self._note_foreign_writes()
+            self._reopen_if_rotated()
+            self._trim_torn_tail()
+            self._log.write(''.join(lines))
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._pending += len(lines)
+            if (self._pending >= self.compact_every and not self._compacting
+                    and not os.path.exists(self.rotated_file)):
+                self._rotate()
+            self._seen_stats = self._file_stats()
+
+    def _reopen_if_rotated(self):
+        # Another process may have rotated the journal since we opened it;
+        # appending to the old inode would lose the write.
+        if self._log is not None:
+            try:
+                current = os.stat(self.journal_file)
+                if os.fstat(self._log.fileno()).st_ino == current.st_ino:
+                    return
+            except FileNotFoundError:
+                pass
+            self._log.close()
+        # Readable too, so _trim_torn_tail can look at the end of the file.
+        self._log = open(self.journal_file, 'a+')
+
+    def _trim_torn_tail(self):
+        # A writer that died mid-append leaves a partial last line; replay
+        # stops there, so anything appended after it would be lost. Called
+        # with the journal lock held, so no append is in progress.
+        fd = self._log.fileno()
+        end = os.fstat(fd).st_size
+        if not end or os.pread(fd, 1, end - 1) == b'\n':
+            return
+        keep = end
+        while keep > 0:
+            start = max(keep - 65536, 0)
+            newline = os.pread(fd, keep - start, start).rfind(b'\n')
+            if newline >= 0:
+                keep = start + newline + 1
+                break
+            keep = start
+        os.ftruncate(fd, keep)
+
+    def _rotate(self, background=True):
+        # Called with self._lock and the journal file lock held: new commits
+        # go to a fresh journal while the rotated one is folded into the snapshot.
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        os.replace(self.journal_file, self.rotated_file)
+        self._pending = 0
+        self._compacting = True
+        if background:
+            threading.Thread(target=self._run_compaction, daemon=True).start()
+
+    def _run_compaction(self):
+        try:
+            with self._snapshot_lock, file_lock(self.snapshot_lock_file):
+                self._fold(self.rotated_file)
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _fold(self, journal_path):
+        if not os.path.exists(journal_path):
+            return
+        users, records = self.read_snapshot()
+        replay_journal(journal_path, users, records)
+        self.write_snapshot(users, records)
+        try:
+            os.remove(journal_path)
+        except FileNotFoundError:
+            pass
+
+
+# --- SQLite Store ---
+# Legacy records from before accounts have no owner, name or timestamp, so
+# those columns are nullable; such records live only in body.
+SQLITE_RECORDS_TABLE = """
+CREATE TABLE IF NOT EXISTS {name} (
+    id TEXT PRIMARY KEY,
+    username TEXT,
+    data_name TEXT,
+    created_at TEXT,
+    body TEXT NOT NULL
+);
+"""
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    body TEXT NOT NULL
+);
+""" + SQLITE_RECORDS_TABLE.format(name='records') + """
+CREATE INDEX IF NOT EXISTS records_user_created ON records (username, created_at);
+CREATE INDEX IF NOT EXISTS records_user_name ON records (username, data_name);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+class SqliteStore(Store):
+    """Users and records in SQLite, with per-user indexes for record listings.
+
+    SQLite does its own cross-process locking; commits from concurrent
+    sessions are grouped into a single durable transaction.
+    """
+
+    def __init__(self, db_file, group_commit_window=GROUP_COMMIT_WINDOW):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=FULL')
+        self._conn.executescript(SQLITE_SCHEMA)
+        self._relax_record_columns()
+        self._committer = GroupCommitter(self._write, group_commit_window)
+
+    def _relax_record_columns(self):
+        # Databases from before legacy records were allowed declare the
+        # metadata columns NOT NULL; SQLite cannot alter that, so copy once.
+        columns = self._conn.execute('PRAGMA table_info(records)').fetchall()
+        if not any(column[1] == 'username' and column[3] for column in columns):
+            return
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._conn.execute(SQLITE_RECORDS_TABLE.format(name='records_new'))
+            self._conn.execute('INSERT INTO records_new SELECT id, username, data_name, created_at, body '
+                               'FROM records ORDER BY rowid')
+            self._conn.execute('DROP TABLE records')
+            self._conn.execute('ALTER TABLE records_new RENAME TO records')
+            self._conn.execute('COMMIT')
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.executescript(SQLITE_SCHEMA)  # the indexes went with the old table
+
+    def load(self):
+        with self._lock:
+            users = {name: json.loads(body) for name, body in
+                     self._conn.execute('SELECT username, body FROM users')}
+            records = {data_id: json.loads(body) for data_id, body in
+                       self._conn.execute('SELECT id, body FROM records ORDER BY rowid')}
+        return users, records
+
+    def commit(self, users=None, records=None):
+        items = [(USERS, name, user) for name, user in (users or {}).items()]
+        items += [(RECORDS, data_id, record) for data_id, record in (records or {}).items()]
+        self._committer.submit(items)
+
+    def _write(self, items):
+        with self._lock, self._conn:
+            for table, key, value in items:
+                if table == USERS and value is None:
+                    self._conn.execute('DELETE FROM users WHERE username = ?', (key,))
+                elif table == USERS:
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO users (username, body) VALUES (?, ?)',
+                        (key, json.dumps(value, default=json_default)))
+                elif value is None:
+                    self._conn.execute('DELETE FROM records WHERE id = ?', (key,))
+                else:
+                    # An upsert, not INSERT OR REPLACE: that deletes the row and
+                    # re-adds it under a new rowid, moving an edited record to
+                    # the end of the insertion order load() returns.
+                    self._conn.execute(
+                        'INSERT INTO records (id, username, data_name, created_at, body) '
+                        'VALUES (?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET '
+                        'username = excluded.username, data_name = excluded.data_name, '
+                        'created_at = excluded.created_at, body = excluded.body',
+                        (key, value.get('username'), value.get('data_name'),
+                         value.get('created_at'), json.dumps(value, default=json_default)))
+
+    def user_records(self, username, records=None):
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id, body FROM records WHERE username = ? ORDER BY created_at',
+                (username,)).fetchall()
+        return {data_id: json.loads(body) for data_id, body in rows}
+
+    def version_token(self):
+        # data_version only changes when another connection commits.
+        with self._lock:
+            return self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def migrate_from(self, other):
+        """Copy everything from another store once, the first time this database is opened."""
+        with self._lock:
+            done = self._conn.execute(
+                "SELECT 1 FROM meta WHERE key = 'migrated_from'").fetchone()
+        if done:
+            return
+        users, records = other.load()
+        self.commit(users=users, records=records)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)",
+                (type(other).__name__,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# --- Backend Selection ---
+BACKENDS = ('sqlite', 'journal', 'binary', 'lazy', 'sharded')
+
+def open_store(backend, data_dir='.'):
+    """Open one of BACKENDS in data_dir.
+
+    'journal' is the JSON snapshot plus journal. 'lazy' loads only record
+    metadata and reads ciphertexts from a memory-mapped blob file on demand.
+    'sharded' keeps each user's records in a shard of their own (or in one of
+    VAULT_SHARD_BUCKETS hash buckets). The others copy an existing JSON vault
+    in the first time they are opened.
+    """
+    def path(name):
+        return os.path.join(data_dir, name)
+
+    journal = JournalStore(path(USERS_FILE), path(DATA_FILE), path(JOURNAL_FILE))
+    if backend == 'journal':
+        return journal
+    if backend == 'binary':
+        # Imported here so msgpack is only needed by deployments that use it.
+        from vault.binfmt import BinaryStore
+        store = BinaryStore(path(BINARY_FILE), path(f"{BINARY_FILE}.journal"))
+        store.migrate_from(journal)
+        return store
+    if backend == 'lazy':
+        from vault.lazystore import LazyStore
+        store = LazyStore(path(INDEX_FILE), path(f"{INDEX_FILE}.journal"), path(BLOB_FILE))
+        store.migrate_from(journal)
+        return store
+    if backend == 'sharded':
+        from vault.shards import ShardedStore
+        store = ShardedStore(path(SHARD_DIR))
+        store.migrate_from(journal)
+        return store
+    if backend != 'sqlite':
+        raise ValueError(f"Unknown storage backend {backend!r}; expected one of {BACKENDS}")
+    store = SqliteStore(path(DB_FILE))
+    store.migrate_from(journal)
+    return store
@@ -0,0 +1,142 @@
+import base64
+import os
+import struct
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# Layout: header (magic, chunk size, per-file salt) followed by fixed-size
+# AES-GCM chunks. Chunk i sits at HEADER_SIZE + i * (chunk_size + TAG_SIZE),
+# is authenticated with its index and a final-chunk flag, and can be
+# decrypted on its own; reordering, truncation and extension all fail the tag.
+MAGIC = b'SVS1'
+HEADER = struct.Struct('>4sI16s')
+HEADER_SIZE = HEADER.size
+TAG_SIZE = 16
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+class StreamError(Exception):
+    """Raised when a stream is malformed or fails authentication."""
+
+
+def _file_cipher(fernet_key, salt):
+    # A fresh key per file lets the chunk index serve as the GCM nonce.
+    master = base64.urlsafe_b64decode(fernet_key)
+    key = HKDF(algorithm=hashes.SHA256(), length=32, salt=salt,
+               info=b'securevault-stream').derive(master)
+    return AESGCM(key)
+
+def _nonce(index):
+    return index.to_bytes(12, 'big')
+
+def _aad(index, last):
+    return struct.pack('>QB', index, 1 if last else 0)
+
+def _read_header(src):
+    header = src.read(HEADER_SIZE)
+    if len(header) != HEADER_SIZE:
+        raise StreamError("Truncated stream header")
+    magic, chunk_size, salt = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise StreamError("Not a SecureVault stream")
+    return chunk_size, salt
+
+
+# --- Streaming Encryption ---
+def encrypt_stream(fernet_key, src, dst, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Encrypt file-like `src` into `dst`; returns the plaintext size.
+
+    Only one chunk is held in memory at a time: the reader looks one chunk
+    ahead so the final chunk can be flagged.
+    """
+    salt = os.urandom(16)
+    cipher = _file_cipher(fernet_key, salt)
+    dst.write(HEADER.pack(MAGIC, chunk_size, salt))
+
+    total = 0
+    index = 0
+    chunk = src.read(chunk_size)
+    while True:
+        following = src.read(chunk_size)
+        last = not following
+        dst.write(cipher.encrypt(_nonce(index), chunk, _aad(index, last)))
+        total += len(chunk)
+        if last:
+            return total
+        chunk = following
+        index += 1
+
+def decrypt_stream(fernet_key, src):
+    """Yield plaintext chunks from file-like `src`, verifying each one."""
+    chunk_size, salt = _read_header(src)
+    cipher = _file_cipher(fernet_key, salt)
+    sealed_size = chunk_size + TAG_SIZE
+
+    index = 0
+    sealed = src.read(sealed_size)
+    while True:
+        following = src.read(sealed_size)
+        last = not following
+        try:
+            yield cipher.decrypt(_nonce(index), sealed, _aad(index, last))
+        except InvalidTag:
+            raise StreamError(f"Chunk {index} failed authentication") from None
+        if last:
+            return
+        sealed = following
+        index += 1
+
+def rekey_stream(old_key, new_key, src, dst):
+    """Re-encrypt stream `src` under `new_key` into `dst`, one chunk at a time."""
+    chunk_size, _ = _read_header(src)
+    salt = os.urandom(16)
+    cipher = _file_cipher(new_key, salt)
+    dst.write(HEADER.pack(MAGIC, chunk_size, salt))
+    src.seek(0)
+    chunks = decrypt_stream(old_key, src)
+    chunk = next(chunks)
+    index = 0
+    for following in chunks:
+        dst.write(cipher.encrypt(_nonce(index), chunk, _aad(index, False)))
+        chunk = following
+        index += 1
+    dst.write(cipher.encrypt(_nonce(index), chunk, _aad(index, True)))
+
+
+# --- Range Reads ---
+def plaintext_size(src):
+    """Plaintext length of a seekable stream, from its size alone."""
+    src.seek(0)
+    chunk_size, _ = _read_header(src)
+    body = src.seek(0, os.SEEK_END) - HEADER_SIZE
+    chunks, rest = divmod(body, chunk_size + TAG_SIZE)
+    return chunks * chunk_size + max(rest - TAG_SIZE, 0)
+
+def read_range(fernet_key, src, offset, length):
+    """Decrypt `length` bytes starting at `offset`, touching only the chunks involved."""
+    src.seek(0)
+    chunk_size, salt = _read_header(src)
+    cipher = _file_cipher(fernet_key, salt)
+    sealed_size = chunk_size + TAG_SIZE
+    body = src.seek(0, os.SEEK_END) - HEADER_SIZE
+    last_index = max((body - 1) // sealed_size, 0)
+
+    out = bytearray()
+    index = offset // chunk_size
+    skip = offset - index * chunk_size
+    while length > 0 and index <= last_index:
+        src.seek(HEADER_SIZE + index * sealed_size)
+        sealed = src.read(sealed_size)
+        try:
+            chunk = cipher.decrypt(_nonce(index), sealed, _aad(index, index == last_index))
+        except InvalidTag:
+            raise StreamError(f"Chunk {index} failed authentication") from None
+        piece = chunk[skip:skip + length]
+        out += piece
+        length -= len(piece)
+        skip = 0
+        index += 1
+    return bytes(out)
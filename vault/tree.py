@@ -0,0 +1,279 @@
+"""Encrypt whole directory trees into the vault, and restore them, in parallel.
+
+Usage:
+    python -m vault.tree encrypt --user alice /etc/ssl/private [--prefix ssl/]
+    python -m vault.tree restore --user alice -o ./restored [--prefix ssl/]
+
+Every regular file becomes a file record like one uploaded on the encrypt
+page: the relative path (after --prefix) is its data name, and its blob is
+encrypted under its own data key. Files are encrypted on a process pool of
+--workers processes and committed in batches of --batch-size records.
+
+Both commands resume. `encrypt` skips paths the user already has a record
+for, and clears out blobs from a batch that was interrupted before it
+committed. `restore` skips output files that already have the recorded
+size. The passkey is asked for unless --passkey is given; one passkey
+protects every record of a run.
+"""
+import argparse
+import getpass
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+from vault.core import BLOB_DIR, Vault
+from vault.kdf import KdfBusy
+from vault.storage import read_json, write_json
+from vault.stream import StreamError, decrypt_stream, encrypt_stream
+
+CHECKPOINT_FILE = 'tree_import.json'
+BATCH_SIZE = 200
+
+
+# --- Workers ---
+# Module-level so the process pool can pickle them; each handles one file.
+def encrypt_file(src_path, blob_path, data_key):
+    with open(src_path, 'rb') as src, open(blob_path, 'wb') as dst:
+        size = encrypt_stream(data_key, src, dst)
+        dst.flush()
+        # The record that points here is committed only after this returns.
+        os.fsync(dst.fileno())
+    return size
+
+def restore_file(blob_path, data_key, out_path):
+    partial = f"{out_path}.partial"
+    try:
+        with open(blob_path, 'rb') as src, open(partial, 'wb') as dst:
+            for chunk in decrypt_stream(data_key, src):
+                dst.write(chunk)
+    except BaseException:
+        try:
+            os.remove(partial)
+        except FileNotFoundError:
+            pass
+        raise
+    os.replace(partial, out_path)
+    return os.path.getsize(out_path)
+
+
+def walk_files(root):
+    """(path, relative posix path) of every regular file under root, sorted."""
+    found = []
+    for directory, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path) and not os.path.islink(path):
+                found.append((path, os.path.relpath(path, root).replace(os.sep, '/')))
+    return found
+
+def run_pool(jobs, fn, workers, on_done):
+    """Run fn(*args) for (key, args) in jobs with at most 4 * workers in flight."""
+    window = (workers or os.cpu_count() or 1) * 4
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        jobs = iter(jobs)
+        while True:
+            for key, args in jobs:
+                running[pool.submit(fn, *args)] = key
+                if len(running) >= window:
+                    break
+            if not running:
+                return
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                on_done(running.pop(future), future)
+
+
+# --- Encrypt ---
+class TreeImport:
+    """Encrypts the files under `root` into file records for `username`."""
+
+    def __init__(self, vault, username, root, prefix='', batch_size=BATCH_SIZE, workers=None):
+        self.vault = vault
+        self.username = username
+        self.root = root
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.workers = workers
+        self.blob_dir = vault.path(BLOB_DIR)
+        self.checkpoint_file = vault.path(CHECKPOINT_FILE)
+        self.report = {'files': 0, 'bytes': 0, 'skipped': 0, 'failed': 0}
+
+    def run(self, passkey):
+        started = time.perf_counter()
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._clear_interrupted()
+        existing = {record['data_name'] for record in self.vault.user_records(self.username).values()}
+        todo = []
+        for path, relative in walk_files(self.root):
+            if self.prefix + relative in existing:
+                self.report['skipped'] += 1
+            else:
+                todo.append((path, relative))
+        if todo:
+            # One KDF run for the whole tree: every record shares the passkey.
+            self.passkey_hash = self.vault.hash_passkey(passkey)
+        for start in range(0, len(todo), self.batch_size):
+            self._run_batch(todo[start:start + self.batch_size])
+        write_json(self.checkpoint_file, {})
+        self.report['seconds'] = time.perf_counter() - started
+        return self.report
+
+    def _run_batch(self, batch):
+        jobs = {}
+        for path, relative in batch:
+            data_key, wrapped_key = self.vault.keyring.new_data_key()
+            jobs[relative] = (path, f"{uuid.uuid4().hex}.svs", data_key, wrapped_key)
+        # Noted before any blob is written, so an interrupted batch can be cleaned up.
+        write_json(self.checkpoint_file, {'blobs': [job[1] for job in jobs.values()]})
+
+        records = {}
+        index = len(self.vault.user_records(self.username))
+
+        def done(relative, future):
+            nonlocal index
+            path, blob_name, _, wrapped_key = jobs[relative]
+            try:
+                size = future.result()
+            except OSError as e:
+                self.report['failed'] += 1
+                print(f"{path}: {e}", file=sys.stderr)
+                # No record will point at a partly written blob.
+                try:
+                    os.remove(os.path.join(self.blob_dir, blob_name))
+                except FileNotFoundError:
+                    pass
+                return
+            now = datetime.now()
+            data_name = self.prefix + relative
+            index += 1
+            records[f"{self.username}_{data_name}_{now.timestamp()}_{index}"] = {
+                'username': self.username,
+                'data_name': data_name,
+                'passkey_hash': self.passkey_hash,
+                'created_at': now.isoformat(),
+                'kind': 'file',
+                'file_name': os.path.basename(path),
+                'blob': blob_name,
+                'size': size,
+                'key_version': self.vault.keyring.primary,
+                'wrapped_key': wrapped_key,
+            }
+            self.report['files'] += 1
+            self.report['bytes'] += size
+
+        run_pool(((relative, (path, os.path.join(self.blob_dir, blob_name), data_key))
+                  for relative, (path, blob_name, data_key, _) in jobs.items()),
+                 encrypt_file, self.workers, done)
+        self.vault.commit(records=records)
+        write_json(self.checkpoint_file, {})
+
+    def _clear_interrupted(self):
+        # Blobs of a batch that never committed are referenced by no record.
+        blobs = read_json(self.checkpoint_file).get('blobs', [])
+        if not blobs:
+            return
+        referenced = {record.get('blob') for record in self.vault.user_records(self.username).values()}
+        for blob_name in blobs:
+            if blob_name not in referenced:
+                try:
+                    os.remove(os.path.join(self.blob_dir, blob_name))
+                except FileNotFoundError:
+                    pass
+        write_json(self.checkpoint_file, {})
+
+
+# --- Restore ---
+def restore_tree(vault, username, passkey, out_dir, prefix='', workers=None):
+    """Decrypt the user's file records under `prefix` into out_dir; returns a report."""
+    started = time.perf_counter()
+    report = {'files': 0, 'bytes': 0, 'skipped': 0, 'failed': 0}
+    out_root = os.path.realpath(out_dir)
+    verified = {}
+    jobs = []
+    for record in vault.user_records(username).values():
+        if record.get('kind') != 'file' or not record['data_name'].startswith(prefix):
+            continue
+        out_path = os.path.realpath(os.path.join(out_root, record['data_name'][len(prefix):]))
+        if not out_path.startswith(out_root + os.sep):
+            report['failed'] += 1  # a data name like '../x' must not escape out_dir
+            continue
+        if os.path.exists(out_path) and os.path.getsize(out_path) == record['size']:
+            report['skipped'] += 1
+            continue
+        # Trees share one passkey hash, so this is usually a single KDF run.
+        if record['passkey_hash'] not in verified:
+            verified[record['passkey_hash']] = vault.verify_password(record['passkey_hash'], passkey)
+            if not verified[record['passkey_hash']]:
+                print(f"{record['data_name']}: wrong passkey (and for every record sharing it)",
+                      file=sys.stderr)
+        if not verified[record['passkey_hash']]:
+            report['failed'] += 1
+            continue
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        jobs.append((out_path, (os.path.join(vault.path(BLOB_DIR), record['blob']),
+                                vault.record_key(record), out_path)))
+
+    def done(out_path, future):
+        try:
+            report['bytes'] += future.result()
+            report['files'] += 1
+        except (OSError, StreamError) as e:
+            report['failed'] += 1
+            print(f"{out_path}: {e}", file=sys.stderr)
+
+    run_pool(jobs, restore_file, workers, done)
+    report['seconds'] = time.perf_counter() - started
+    return report
+
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m vault.tree', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['encrypt', 'restore'])
+    parser.add_argument('source', nargs='?', help="Directory to encrypt")
+    parser.add_argument('--user', required=True)
+    parser.add_argument('--passkey', help="Passkey for every record (default: prompt)")
+    parser.add_argument('--prefix', default='', help="Data name prefix, e.g. ssl/")
+    parser.add_argument('-o', '--output', help="Restore destination directory")
+    parser.add_argument('--workers', type=int, default=None, help="Processes (default: CPU count)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--backend', default=None)
+    parser.add_argument('--data-dir', default='.')
+    args = parser.parse_intermixed_args(argv)
+
+    if args.command == 'encrypt' and (not args.source or not os.path.isdir(args.source)):
+        parser.error("encrypt needs a source directory")
+    if args.command == 'restore' and not args.output:
+        parser.error("restore needs -o/--output")
+    vault = Vault(args.data_dir, args.backend)
+    try:
+        if not vault.has_user(args.user):
+            parser.error(f"Unknown user {args.user!r}")
+        passkey = args.passkey or getpass.getpass("Passkey: ")
+        try:
+            if args.command == 'encrypt':
+                job = TreeImport(vault, args.user, args.source, args.prefix, args.batch_size, args.workers)
+                report = job.run(passkey)
+            else:
+                report = restore_tree(vault, args.user, passkey, args.output, args.prefix, args.workers)
+        except KdfBusy:
+            parser.exit(1, "Password hashing is busy; try again\n")
+    finally:
+        vault.close()
+
+    seconds = report['seconds']
+    print(f"{args.command}: {report['files']} files, {report['bytes'] / 2**20:.1f} MiB in {seconds:.2f}s "
+          f"({report['bytes'] / 2**20 / seconds if seconds else 0:.1f} MiB/s); "
+          f"{report['skipped']} skipped, {report['failed']} failed", file=sys.stderr)
+    if report['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
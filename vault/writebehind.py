@@ -0,0 +1,179 @@
+import atexit
+import threading
+import time
+
+from vault.storage import RECORDS, USERS, Store
+
+# Mutations are flushed every FLUSH_INTERVAL seconds or once MAX_BATCH keys are
+# pending. A commit waits if the oldest unflushed change is older than
+# MAX_LOSS_WINDOW, which bounds what a crash can lose.
+FLUSH_INTERVAL = 0.2
+MAX_BATCH = 500
+MAX_LOSS_WINDOW = 1.0
+
+
+# --- Write-Behind Store ---
+class WriteBehindStore(Store):
+    """Acknowledges commits from memory and persists them on a background thread.
+
+    Repeated updates to the same user or record between flushes are coalesced
+    into one write (login churn on last_login and failed_attempts, mostly).
+    Reads see pending changes. close() flushes everything, and is also run at
+    interpreter exit.
+    """
+
+    def __init__(self, store, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH,
+                 max_loss_window=MAX_LOSS_WINDOW):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_loss_window = max(max_loss_window, flush_interval)
+        self.submitted = 0
+        self.flushed = 0
+        self.flushes = 0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._inflight = {}
+        self._oldest = None
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='vault-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def __getattr__(self, name):
+        # Backend extras (compact, migrate_from, fetch_ciphertext, ...) pass through.
+        return getattr(self.store, name)
+
+    def commit(self, users=None, records=None):
+        with self._cond:
+            # Back-pressure: never acknowledge more than the loss window allows.
+            while (self._oldest is not None and not self._closed and self._error is None
+                   and time.monotonic() - self._oldest > self.max_loss_window):
+                self._cond.wait(self.flush_interval)
+            if self._error is not None:
+                error, self._error = self._error, None
+                raise error
+            for table, changes in ((USERS, users), (RECORDS, records)):
+                for key, value in (changes or {}).items():
+                    # Copies: the store may rewrite what it is given in place
+                    # while other threads are reading the caller's dicts.
+                    self._pending[table, key] = dict(value) if value is not None else None
+                    self.submitted += 1
+            if self._pending and self._oldest is None:
+                self._oldest = time.monotonic()
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+
+    def load(self):
+        users, records = self.store.load()
+        return self._overlay(users, records)
+
+    def load_users(self):
+        return self._overlay(self.store.load_users(), {})[0]
+
+    def load_shard(self, shard):
+        records = self.store.load_shard(shard)
+        with self._cond:
+            for (table, key), value in self._unflushed():
+                if table != RECORDS:
+                    continue
+                if value is None:
+                    records.pop(key, None)
+                elif self.store.shard_for(value.get('username', '')) == shard:
+                    records[key] = dict(value)
+        return records
+
+    def fetch_ciphertext(self, record):
+        return self.store.fetch_ciphertext(record)
+
+    # Stated rather than left to __getattr__: the caches compare these to
+    # decide what to reload. Backend tokens only move for other processes'
+    # writes, so our own flushes never cause a reload, and every foreign
+    # write (even one landing mid-flush) still does.
+    def version_token(self):
+        return self.store.version_token()
+
+    def users_token(self):
+        return self.store.users_token()
+
+    def shard_token(self, shard):
+        return self.store.shard_token(shard)
+
+    def flush(self):
+        """Write every pending change now; returns once it is durable."""
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        # Serialized by _flush_lock, so batches reach the store in order.
+        with self._cond:
+            pending, self._pending = self._pending, {}
+            self._inflight = pending
+            self._oldest = None
+            if not pending:
+                return
+        users = {key: value for (table, key), value in pending.items() if table == USERS}
+        records = {key: value for (table, key), value in pending.items() if table == RECORDS}
+        try:
+            self.store.commit(users=users, records=records)
+        except Exception:
+            with self._cond:
+                # Put the batch back behind anything newer that arrived meanwhile.
+                pending.update(self._pending)
+                self._pending = pending
+                self._inflight = {}
+                self._oldest = time.monotonic()
+            raise
+        with self._cond:
+            self._inflight = {}
+            self.flushed += len(pending)
+            self.flushes += 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {'pending': len(self._pending), 'submitted': self.submitted,
+                    'flushed': self.flushed, 'flushes': self.flushes}
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.flush()
+        self.store.close()
+        atexit.unregister(self.close)
+
+    def _unflushed(self):
+        # Called with _cond held. A batch being written is not on disk yet
+        # either, so loads must still see it.
+        return list(self._inflight.items()) + list(self._pending.items())
+
+    def _overlay(self, users, records):
+        with self._cond:
+            for (table, key), value in self._unflushed():
+                target = users if table == USERS else records
+                if value is None:
+                    target.pop(key, None)
+                else:
+                    target[key] = dict(value)
+        return users, records
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                self._cond.wait(self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                with self._cond:
+                    # Surfaced to the next commit(); the batch stays queued.
+                    self._error = e